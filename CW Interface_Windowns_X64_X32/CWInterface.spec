@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['serial', 'serial.tools.list_ports'],  # importados sob demanda em cwcore.serial_link
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,11 +1,17 @@
 /*
   CW Interface Controlada por PC
   Autor: Lucas (Adaptado para Protocolo Serial)
+
+  Manipulacao sem delay(): o loop() le a serial o tempo todo e a
+  temporizacao dos elementos e feita com millis() numa maquina de estados.
+  Assim o ESC (byte 0x18) solta o rele na hora e o /wpm vale a partir do
+  proximo caractere, mesmo no meio de uma mensagem.
 */
 
 const int RELAY_PIN = 8;
 int wpm = 20;       // Velocidade inicial padrao
 int UNIT = 60;      // Sera calculado no setup
+int pendingWpm = 0; // /wpm recebido durante a manipulacao
 
 struct MorseMap { char c; const char* pattern; };
 
@@ -20,7 +26,10 @@ MorseMap morseTable[] = {
   { '0', "-----" }, { '1', ".----" }, { '2', "..---" }, { '3', "...--" },
   { '4', "....-" }, { '5', "....." }, { '6', "-...." }, { '7', "--..." },
   { '8', "---.." }, { '9', "----." },
-  { '.', ".-.-.-" }, { ',', "--..--" }, { '?', "..--.." }, { '/', "-..-." }, { '=', "-...-" }
+  { '.', ".-.-.-" }, { ',', "--..--" }, { '?', "..--.." }, { '/', "-..-." }, { '=', "-...-" },
+  { '+', ".-.-." }, { '-', "-....-" }, { '@', ".--.-." }, { '\'', ".----." }, { '!', "-.-.--" },
+  { '(', "-.--." }, { ')', "-.--.-" }, { '&', ".-..." }, { ':', "---..." }, { ';', "-.-.-." },
+  { '"', ".-..-." }, { '$', "...-..-" }, { '_', "..--.-" }
 };
 
 const int MORSE_TABLE_SIZE = sizeof(morseTable) / sizeof(MorseMap);
@@ -39,11 +48,6 @@ void updateSpeed(int newWpm) {
   }
 }
 
-void sendDit() { relayOn(); delay(UNIT); relayOff(); delay(UNIT); }
-void sendDah() { relayOn(); delay(3 * UNIT); relayOff(); delay(UNIT); }
-void letterSpace() { delay(2 * UNIT); }
-void wordSpace() { delay(6 * UNIT); }
-
 const char* getMorsePattern(char c) {
   if (c >= 'a' && c <= 'z') c = c - 'a' + 'A';
   for (int i = 0; i < MORSE_TABLE_SIZE; i++) {
@@ -52,19 +56,274 @@ const char* getMorsePattern(char c) {
   return NULL;
 }
 
-void sendMorseString(String text) {
-  int len = text.length();
+// ================== FILA DE TRANSMISSAO ==================
+// Caracteres a manipular. Marcadores: '\n' = fim de linha (gera DONE),
+// MARK_FRAME = tocar o quadro binario recebido.
+const int TX_SIZE = 128;
+const char MARK_FRAME = 0x01;
+char txBuf[TX_SIZE];
+int txHead = 0, txTail = 0;
+
+int txCount() { return (txHead - txTail + TX_SIZE) % TX_SIZE; }
+int txFree() { return TX_SIZE - 1 - txCount(); }
+void txPush(char c) { txBuf[txHead] = c; txHead = (txHead + 1) % TX_SIZE; }
+char txPeek() { return txBuf[txTail]; }
+char txPop() { char c = txBuf[txTail]; txTail = (txTail + 1) % TX_SIZE; return c; }
+void txClear() { txHead = txTail = 0; }
+
+// ================== PROTOCOLO BINARIO ==================
+// O PC compila o texto numa linha do tempo liga/desliga e envia
+// SOF(0xFE) | tamanho (2 bytes, LE) | payload | CRC-8 (poly 0x07).
+// Cada trecho do payload e um varint com (ms << 1) | ligado.
+const byte FRAME_SOF = 0xFE;
+const byte ABORT_BYTE = 0x18;
+const int MAX_FRAME = 256;
+byte frameBuf[MAX_FRAME];
+unsigned int frameLen = 0;
+bool frameQueued = false;  // quadro valido aguardando/em reproducao
+int framePos = 0;
+
+byte crc8(const byte* data, int len) {
+  byte crc = 0;
   for (int i = 0; i < len; i++) {
-    char c = text.charAt(i);
-    if (c == ' ') { wordSpace(); continue; }
-    const char* pattern = getMorsePattern(c);
-    if (pattern == NULL) continue;
-    
-    for (int j = 0; pattern[j] != '\0'; j++) {
-      if (pattern[j] == '.') sendDit();
-      else if (pattern[j] == '-') sendDah();
+    crc ^= data[i];
+    for (int b = 0; b < 8; b++) crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : (crc << 1);
+  }
+  return crc;
+}
+
+// ================== MANIPULADOR (maquina de estados) ==================
+enum KeyState { K_IDLE, K_ON, K_GAP, K_SPACE, K_RUN };
+KeyState kstate = K_IDLE;
+unsigned long nextAt = 0;        // millis() em que o estado atual termina
+const char* curPattern = NULL;   // caractere em andamento
+byte curEl = 0;
+bool letterGapDue = false;       // proximo caractere precisa de +2U de espaco
+unsigned long charEndAt = 0;
+
+void reportStatus() {
+  Serial.print("STATUS: ");
+  Serial.print(kstate == K_IDLE ? "IDLE" : "KEYING");
+  Serial.print(" WPM=");
+  Serial.print(wpm);
+  Serial.print(" FILA=");
+  Serial.println(txCount());
+}
+
+void setIdle() {
+  bool wasKeying = (kstate != K_IDLE);
+  relayOff();
+  kstate = K_IDLE;
+  curPattern = NULL;
+  if (wasKeying) reportStatus();
+}
+
+void abortKeying() {
+  relayOff();
+  txClear();
+  frameQueued = false;
+  letterGapDue = false;
+  Serial.println("ABORT");
+  setIdle();
+}
+
+void keyElement(unsigned long now) {
+  char el = curPattern[curEl++];
+  relayOn();
+  kstate = K_ON;
+  nextAt = now + (el == '-' ? 3UL * UNIT : (unsigned long)UNIT);
+}
+
+bool nextRun(unsigned long now) {
+  // Decodifica o proximo varint do quadro; false no fim
+  unsigned long v = 0;
+  byte shift = 0;
+  while (framePos < (int)frameLen) {
+    byte b = frameBuf[framePos++];
+    v |= (unsigned long)(b & 0x7F) << shift;
+    shift += 7;
+    if (!(b & 0x80)) {
+      if (v & 1) relayOn(); else relayOff();
+      kstate = K_RUN;
+      nextAt = now + (v >> 1);
+      return true;
+    }
+  }
+  return false;
+}
+
+// Limite de caractere: aplica /wpm pendente e pega o proximo da fila
+void startNext(unsigned long now) {
+  if (pendingWpm > 0) { updateSpeed(pendingWpm); pendingWpm = 0; }
+  while (txCount() > 0) {
+    char c = txPeek();
+    // o espaco entre letras vale tambem entre linhas (texto continuo)
+    if (c == '\n') { txPop(); Serial.println("DONE"); continue; }
+    if (c == ' ') {
+      txPop();
+      letterGapDue = false;
+      kstate = K_SPACE;
+      nextAt = now + 6UL * UNIT;
+      return;
+    }
+    if (c == MARK_FRAME) {
+      txPop();
+      framePos = 0;
+      if (frameQueued && nextRun(now)) return;
+      frameQueued = false;
+      Serial.println("DONE");
+      continue;
     }
-    if (i < len - 1 && text.charAt(i + 1) != ' ') letterSpace();
+    const char* p = getMorsePattern(c);
+    if (p == NULL) { txPop(); continue; }
+    if (letterGapDue) {
+      // espaco entre letras: 1U ja passou no fim do caractere anterior
+      unsigned long start = charEndAt + 2UL * UNIT;
+      if ((long)(now - start) < 0) { kstate = K_SPACE; nextAt = start; letterGapDue = false; return; }
+      letterGapDue = false;
+    }
+    txPop();
+    curPattern = p;
+    curEl = 0;
+    keyElement(now);
+    return;
+  }
+  setIdle();
+}
+
+void updateKeyer() {
+  unsigned long now = millis();
+  if (kstate == K_IDLE) {
+    if (txCount() > 0) {
+      startNext(now);
+      if (kstate != K_IDLE) reportStatus();
+    }
+    return;
+  }
+  if ((long)(now - nextAt) < 0) return;
+  now = nextAt; // mantem a temporizacao sem acumular atraso do loop()
+
+  switch (kstate) {
+    case K_ON:
+      relayOff();
+      kstate = K_GAP;
+      nextAt = now + UNIT;
+      break;
+    case K_GAP:
+      if (curPattern[curEl] != '\0') { keyElement(now); break; }
+      curPattern = NULL;
+      letterGapDue = true;
+      charEndAt = now;
+      startNext(now);
+      break;
+    case K_RUN:
+      if (nextRun(now)) break;
+      relayOff();
+      frameQueued = false;
+      Serial.println("DONE");
+      startNext(now);
+      break;
+    case K_SPACE:
+      startNext(now);
+      break;
+    default:
+      break;
+  }
+}
+
+// ================== ENTRADA SERIAL ==================
+// Linhas de texto: ate 95 caracteres; mais que isso responde ERR: LONG
+// (o PC divide as mensagens longas antes de enviar)
+enum RxState { RX_LINE, RX_LEN0, RX_LEN1, RX_DATA, RX_CRC, RX_SKIP };
+RxState rxState = RX_LINE;
+char lineBuf[96];
+int lineLen = 0;
+bool lineLong = false;
+unsigned int rxLen = 0, rxPos = 0;
+unsigned long rxSkip = 0;   // bytes de um quadro recusado ainda a descartar
+unsigned long rxFrameAt = 0;
+
+void handleLine() {
+  lineBuf[lineLen] = '\0';
+  int n = lineLen;
+  lineLen = 0;
+  if (lineLong) { lineLong = false; Serial.println("ERR: LONG"); return; }
+
+  // "~texto": modo continuo do PC. Sem eco e sem trim: os espacos
+  // digitados viram espaco entre palavras. DONE ao fim de cada pedaco.
+  if (lineBuf[0] == '~') {
+    if (n > txFree()) { Serial.println("ERR: FULL"); return; }
+    for (int i = 1; i < n; i++) txPush(lineBuf[i]);
+    txPush('\n');
+    return;
+  }
+
+  String line = String(lineBuf);
+  line.trim();
+  if (line.length() == 0) return;
+
+  // PROTOCOLO: Se começar com "/", é comando de configuração
+  if (line.startsWith("/wpm")) {
+    int val = line.substring(5).toInt(); // Pega o numero depois de "/wpm "
+    if (val <= 0) return;
+    if (kstate == K_IDLE) updateSpeed(val);
+    else pendingWpm = val; // vale a partir do proximo caractere
+  }
+  else if (line.startsWith("/status")) {
+    reportStatus();
+  }
+  else {
+    // Caso contrário, é texto para transmitir
+    if ((int)line.length() + 1 > txFree()) { Serial.println("ERR: FULL"); return; }
+    Serial.print("TX: ");
+    Serial.println(line);
+    for (unsigned int i = 0; i < line.length(); i++) txPush(line.charAt(i));
+    txPush('\n');
+  }
+}
+
+void handleByte(byte b) {
+  if (b == ABORT_BYTE && rxState == RX_LINE) { lineLen = 0; lineLong = false; abortKeying(); return; }
+
+  switch (rxState) {
+    case RX_LINE:
+      if (b == FRAME_SOF && lineLen == 0) { rxState = RX_LEN0; rxFrameAt = millis(); return; }
+      if (b == '\n') { handleLine(); return; }
+      if (b == '\r') return;
+      if (lineLen < (int)sizeof(lineBuf) - 1) lineBuf[lineLen++] = (char)b;
+      else lineLong = true;
+      return;
+    case RX_LEN0:
+      rxLen = b; rxState = RX_LEN1; return;
+    case RX_LEN1:
+      rxLen |= (unsigned int)b << 8;
+      rxPos = 0;
+      if (rxLen > MAX_FRAME || frameQueued) {
+        Serial.println(frameQueued ? "ERR: BUSY" : "ERR: FRAME");
+        // descarta payload e CRC, senao viram texto na proxima linha
+        rxSkip = (unsigned long)rxLen + 1;
+        rxState = RX_SKIP;
+        return;
+      }
+      rxState = rxLen ? RX_DATA : RX_CRC;
+      return;
+    case RX_DATA:
+      frameBuf[rxPos++] = b;
+      if (rxPos >= rxLen) rxState = RX_CRC;
+      return;
+    case RX_CRC:
+      rxState = RX_LINE;
+      if (b != crc8(frameBuf, rxLen)) { Serial.println("ERR: CRC"); return; }
+      if (txFree() < 1) { Serial.println("ERR: FULL"); return; }
+      frameLen = rxLen;
+      frameQueued = true;
+      Serial.print("TX: BIN ");
+      Serial.println(frameLen);
+      txPush(MARK_FRAME);
+      return;
+    case RX_SKIP:
+      if (--rxSkip == 0) rxState = RX_LINE;
+      return;
   }
 }
 
@@ -76,22 +335,12 @@ void setup() {
 }
 
 void loop() {
-  if (Serial.available() > 0) {
-    String line = Serial.readStringUntil('\n');
-    line.trim();
-    if (line.length() == 0) return;
-
-    // PROTOCOLO: Se começar com "/wpm", é comando de configuração
-    if (line.startsWith("/wpm")) {
-      String valStr = line.substring(5); // Pega o numero depois de "/wpm "
-      updateSpeed(valStr.toInt());
-    } 
-    else {
-      // Caso contrário, é texto para transmitir
-      Serial.print("TX: ");
-      Serial.println(line);
-      sendMorseString(line);
-      Serial.println("DONE");
-    }
+  while (Serial.available() > 0) handleByte(Serial.read());
+  // quadro incompleto ha mais de 1 s: descarta (mesmo timeout do readBytes)
+  if (rxState != RX_LINE && millis() - rxFrameAt > 1000) {
+    // o descarte ja respondeu ERR: so volta a ler linhas
+    if (rxState != RX_SKIP) Serial.println("ERR: FRAME");
+    rxState = RX_LINE;
   }
-}
\ No newline at end of file
+  updateKeyer();
+}
@@ -1,52 +1,205 @@
+import time
+_T0 = time.perf_counter()  # início do processo, para medir a partida a frio
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
-import serial
-import serial.tools.list_ports
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
 import json
 import os
+import tempfile
 import datetime
-import re 
+import logging
+import logging.handlers
+from cwcore.autocq import AutoCQ, parse_rotation
+from cwcore.dictionary import CW_DICTIONARY, filter_dictionary
+from cwcore.adif import format_record, freq_mhz, import_adif, qso_fields, qso_key
+from cwcore.keyer import SETTINGS_FILE, build_payloads, load_settings
+from cwcore.latency import LatencyMeter
+from cwcore.macros import CUT_DIGITS, DEFAULT_MACROS, compile_macro, compile_macros, macro_values
+from cwcore.morse import compile_timeline, duration_ms, unknown_chars
+from cwcore.radios import RadioManager
+from cwcore.serial_link import list_ports
+from cwcore.worked import WorkedIndex
+from cwcore.dxcc import DxccResolver
+from cwcore.export import export_log, record_filter
+from cwcore.stats import LogStats
+from cwcore.logwriter import LogWriter
+from cwcore.logbook import LogbookIndex, insert_sorted, COL_DATE, COL_TIME, COL_CALL, COL_BAND, COL_FREQ, COL_MODE
 
-SETTINGS_FILE = "settings.json"
 LOGBOOK_FILE = "logbook.adi"
+CTY_FILE = "cty.dat"  # lista de países do country-files.com (AD1C)
+SERIAL_POLL_MS = 50  # cadência com que a fila do leitor serial é drenada
+STREAM_MODES = ("Enter", "Palavra", "Caractere")  # envio do texto livre
+RX_LINE_CHARS = 60  # texto decodificado ([RX]) é quebrado em linhas deste tamanho
+STARTUP_TARGET_MS = 1000  # meta: janela pronta em até 1 s, com qualquer tamanho de logbook
+
+class VirtualTreeview:
+    """Treeview "virtual": só as linhas visíveis (mais uma pequena margem)
+    existem no Tk. As linhas vêm de `fetch(chave)` sob demanda e a barra de
+    rolagem é controlada aqui, não pela Treeview."""
+    MARGIN = 3
+
+    def __init__(self, parent, columns, fetch, sort_key=None):
+        self.fetch = fetch
+        self.sort_key = sort_key or (lambda key, col: key)
+        self.columns = columns
+        self.keys = []        # chaves na ordem de exibição (crescente)
+        self.reverse = False  # exibe de trás para frente sem reordenar a lista
+        self.sort_col = None
+        self.top = 0
+        self.visible = 20
+        self.row_h = 0
+
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", selectmode="browse")
+        for col in columns:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+        self.sb = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-1, "units"))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(1, "units"))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(len(self.keys)))
+
+    def set_keys(self, keys, reverse=False):
+        self.keys = list(keys)
+        self.reverse = reverse
+        if self.sort_col is not None: self.keys.sort(key=self._key_for(self.sort_col))
+        self.top = 0
+        self.render()
+
+    def add_keys(self, keys):
+        if self.sort_col is None: self.keys.extend(keys)
+        else: insert_sorted(self.keys, keys, self._key_for(self.sort_col))
+        self.render()
+
+    def sort_by(self, col):
+        if self.sort_col == col:
+            self.reverse = not self.reverse
+        else:
+            self.sort_col = col
+            self.keys.sort(key=self._key_for(col))
+            self.reverse = False
+        for c in self.columns:
+            mark = (" ▼" if self.reverse else " ▲") if c == col else ""
+            self.tree.heading(c, text=c + mark)
+        self.top = 0
+        self.render()
+
+    def _key_for(self, col):
+        return lambda key: self.sort_key(key, col)
+
+    # --- Rolagem ---
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * len(self.keys)))
+        elif action == "scroll":
+            self.scroll(int(args[0]), args[1])
+
+    def scroll(self, n, what):
+        step = self.visible - 1 if what == "pages" else 3
+        self.scroll_to(self.top + n * max(1, step))
+        return "break"
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.keys) - self.visible))
+        if top != self.top:
+            self.top = top
+            self.render()
+        return "break"
+
+    def move_selection(self, d):
+        kids = self.tree.get_children()
+        if not kids: return "break"
+        sel = self.tree.selection()
+        pos = kids.index(sel[0]) + d if sel else 0
+        if pos < 0: self.scroll_to(self.top - 1); pos = 0
+        elif pos >= min(self.visible, len(kids)): self.scroll_to(self.top + 1); pos = min(self.visible, len(kids)) - 1
+        self.tree.selection_set(kids[pos]); self.tree.focus(kids[pos])
+        return "break"
+
+    def on_resize(self, event=None):
+        if not self.row_h:
+            # A altura da linha só é conhecida depois que uma linha é desenhada
+            kids = self.tree.get_children()
+            box = self.tree.bbox(kids[0]) if kids else None
+            if not box: return
+            self.row_h, self.header_h = box[3], box[1]
+        visible = max(1, (self.tree.winfo_height() - self.header_h) // self.row_h)
+        if visible != self.visible:
+            self.visible = visible
+            self.top = max(0, min(self.top, len(self.keys) - visible))
+            self.render()
+
+    # --- Desenho ---
+    def render(self):
+        total = len(self.keys)
+        want = max(0, min(self.visible + self.MARGIN, total - self.top))
+        kids = list(self.tree.get_children())
+        for iid in kids[want:]: self.tree.delete(iid)
+        for _ in range(len(kids), want): kids.append(self.tree.insert("", tk.END))
+        for n in range(want):
+            i = self.top + n
+            key = self.keys[total - 1 - i] if self.reverse else self.keys[i]
+            self.tree.item(kids[n], values=self.fetch(key))
+        self.tree.yview_moveto(0)
+        if total:
+            self.sb.set(self.top / total, min(1.0, (self.top + self.visible) / total))
+        else:
+            self.sb.set(0, 1)
+        if not self.row_h and want: self.tree.after_idle(self.on_resize)
+
+
+class TerminalLog:
+    """Terminal com limite de linhas (buffer circular).
+
+    Mensagens que chegam no mesmo quadro são juntadas num único insert, as
+    tags de cor são criadas uma vez e, opcionalmente, todo o histórico vai
+    para um arquivo de log rotativo em disco."""
+    FRAME_MS = 16
+    COLORS = ("gray", "blue", "green", "red")
+
+    def __init__(self, parent, max_lines=2000, log_file=None, **kw):
+        self.max_lines = max(100, int(max_lines))
+        self.text = scrolledtext.ScrolledText(parent, state='disabled', **kw)
+        for c in self.COLORS: self.text.tag_config(c, foreground=c)
+        self.pending = []
+        self.flush_job = None
+        self.file_log = None
+        if log_file:
+            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=1_000_000, backupCount=5, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.file_log = logging.getLogger("cwinterface.terminal")
+            self.file_log.setLevel(logging.INFO)
+            self.file_log.propagate = False
+            self.file_log.addHandler(handler)
+
+    def append(self, text, color):
+        if color not in self.COLORS:
+            self.text.tag_config(color, foreground=color); self.COLORS += (color,)
+        self.pending.append((text, color))
+        if self.flush_job is None:
+            self.flush_job = self.text.after(self.FRAME_MS, self.flush)
+
+    def flush(self):
+        self.flush_job = None
+        if not self.pending: return
+        lines, self.pending = self.pending, []
+        if self.file_log:
+            # o arquivo recebe todas; só o widget fica com as últimas max_lines
+            self.file_log.info("\n".join(t for t, _ in lines))
+        batch = lines[-self.max_lines:]
+        at_bottom = self.text.yview()[1] >= 0.999
+        args = []
+        for text, color in batch: args += [text + "\n", color]
+        self.text.config(state='normal')
+        self.text.insert(tk.END, *args)
+        excess = int(self.text.index("end-1c").split(".")[0]) - 1 - self.max_lines
+        if excess > 0: self.text.delete("1.0", f"{excess + 1}.0")
+        self.text.config(state='disabled')
+        if at_bottom: self.text.see(tk.END)
 
-# --- Macros Padrão ---
-DEFAULT_MACROS = [
-    {"label": "F1 CQ", "template": "CQ CQ CQ DE {call} {call} {grid} K"},
-    {"label": "F2 ANS", "template": "{target} DE {call} {call} KN"},
-    {"label": "F3 RST", "template": "{target} DE {call} R RST {rst} {rst} BK"},
-    {"label": "F4 TU", "template": "TU FB QSO 73 SK E E"},
-    {"label": "F5 NAME", "template": "NAME {name} {name} BK"},
-    {"label": "F6 QTH", "template": "QTH {grid} {grid} BK"},
-    {"label": "F7 QRZ?", "template": "QRZ? DE {call}"},
-    {"label": "F8 QRL?", "template": "QRL? DE {call}"},
-    {"label": "F9 AGN?", "template": "AGN? AGN?"},
-    {"label": "F10 HW?", "template": "HW? BK"},
-    {"label": "F11 CALL", "template": "{call} {call}"},
-    {"label": "F12 73", "template": "73 TU"},
-]
-
-CW_DICTIONARY = [
-    ("ABT", "Cerca de / Sobre"), ("AGN", "Novamente"), ("ANT", "Antena"),
-    ("AR", "Fim da mensagem"), ("AS", "Aguarde"), ("BK", "Break / Devolvo"),
-    ("BN", "Entre"), ("C", "Sim / Confirmado"), ("CL", "Fechando estação"),
-    ("CQ", "Chamada Geral"), ("DE", "De"), ("DX", "Estação distante"),
-    ("ES", "E (conjunção)"), ("FB", "Excelente"), ("GA", "Boa tarde"),
-    ("GM", "Bom dia"), ("GN", "Boa noite"), ("HI", "Risada"),
-    ("HW", "Como copiou?"), ("K", "Convite"), ("KN", "Convite específico"),
-    ("LID", "Operador ruim"), ("N", "Não"), ("NW", "Agora"),
-    ("OM", "Amigo / Homem"), ("PSE", "Por favor"), ("PWR", "Potência"),
-    ("R", "Recebido"), ("RST", "Reportagem"), ("RPT", "Repita"),
-    ("RX", "Receptor"), ("SK", "Fim do contato"), ("SRI", "Desculpe"),
-    ("TNX", "Obrigado"), ("TU", "Obrigado"), ("TX", "Transmissor"),
-    ("UR", "Seu / Você é"), ("VY", "Muito"), ("WX", "Clima"),
-    ("73", "Abraços"), ("88", "Beijos"), ("QRL", "Freq. ocupada?"),
-    ("QRM", "Interferência"), ("QRN", "Estática"), ("QRO", "Aumentar pot."),
-    ("QRP", "Baixa pot."), ("QRT", "Desligar"), ("QRV", "Pronto"),
-    ("QRZ", "Quem chama?"), ("QSB", "Fading"), ("QSL", "Confirmado"),
-    ("QSO", "Contato"), ("QSY", "Mudar freq."), ("QTH", "Localização")
-]
 
 class CWInterfaceApp:
     def __init__(self, root):
@@ -54,14 +207,39 @@ class CWInterfaceApp:
         self.root.title("PP2LA CW Interface - v1.0.000.1")
         self.root.geometry("700x700")
         
-        self.ser = None
-        self.is_connected = False
-        self.auto_cq_active = False
-        self.auto_cq_timer = None
         self.settings = self.load_settings()
+        # Núcleo sem Tk: um keyer (porta, WPM, fila de TX) por rádio, todos num só laço de E/S
+        radio_cfg = self.settings.get("radios") or [{"name": "R1"}, {"name": "R2"}]
+        self.radios = RadioManager([r["name"] for r in radio_cfg], self.settings.get("wpm", 20))
+        for r in radio_cfg: self.radios.get(r["name"]).wpm = r.get("wpm", self.settings.get("wpm", 20))
+        self.radio_ports = {r["name"]: r.get("port", "") for r in radio_cfg}
+        self.keyer_status = {}  # rádio -> (texto, cor) do último STATUS
+        self.autocq = AutoCQ()
+        self.cq_radio = None    # rádio em que o Auto CQ está rodando
+        self.cq_countdown = None
+        self.rx_line = ""       # texto decodificado ([RX]) que ainda não fechou uma linha
+        self.latency = LatencyMeter()  # tecla -> macro -> serial -> eco TX: -> DONE (aba DIAGNÓSTICO)
+        self.poll_due = None
+        self.logbook = LogbookIndex(LOGBOOK_FILE)
+        self.log_synced = 0
+        self.log_ready = False  # logbook, dupes, DXCC e estatísticas carregam em segundo plano
+        self.log_view = None
+        self.export_cancel = None  # threading.Event da exportação em curso
+        self.worked = WorkedIndex()
+        self.logwriter = LogWriter(LOGBOOK_FILE, self.settings.get("journal_file") or None,
+                                   self.settings.get("log_fsync", "batch"), self.settings.get("log_fsync_interval", 5.0))
+        self.log_backlog = 0
+        self.logwriter.start()
+        self.dxcc = DxccResolver()
+        self.stats = LogStats(self.dxcc_name)
+        self.stats_shown = -1
         
         if "macros" not in self.settings:
             self.settings["macros"] = DEFAULT_MACROS
+        self.macros, self.macro_errors = compile_macros(self.settings["macros"])
+        self.macro_values = {}  # variáveis das macros, atualizadas quando um campo muda (watch_macro_fields)
+        self.last_call = ""
+        self.saved_serial = self.settings.get("serial", 1)
 
         # --- SETUP DAS ABAS ---
         self.notebook = ttk.Notebook(root)
@@ -73,17 +251,105 @@ class CWInterfaceApp:
         self.tab_log = tk.Frame(self.notebook)
         self.notebook.add(self.tab_log, text="   LOGBOOK   ")
 
+        self.tab_stats = tk.Frame(self.notebook)
+        self.notebook.add(self.tab_stats, text="   ESTATÍSTICAS   ")
+
         self.tab_dict = tk.Frame(self.notebook)
         self.notebook.add(self.tab_dict, text="   DICIONÁRIO   ")
         
+        self.tab_diag = tk.Frame(self.notebook)
+        self.notebook.add(self.tab_diag, text="   DIAGNÓSTICO   ")
+
         self.tab_help = tk.Frame(self.notebook)
         self.notebook.add(self.tab_help, text="   AJUDA / MANUAL   ")
 
+        # Só a aba de operação é montada agora; as outras, ao serem abertas
         self.setup_operation_tab()
-        self.setup_logbook_tab()
-        self.setup_dictionary_tab()
-        self.setup_help_tab() # Nova aba de ajuda
+        self.tab_builders = {str(self.tab_log): self.setup_logbook_tab, str(self.tab_stats): self.setup_stats_tab,
+                             str(self.tab_dict): self.setup_dictionary_tab, str(self.tab_help): self.setup_help_tab,
+                             str(self.tab_diag): self.setup_diag_tab}
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         self.setup_hotkeys() 
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.schedule_poll()
+        self.root.after_idle(self.report_startup)
+        self.load_in_background()
+
+    # O rádio em foco recebe o texto livre, as macros sem rádio e o WPM da tela
+    @property
+    def keyer(self): return self.radios.current
+    @property
+    def link(self): return self.radios.current.link
+    @property
+    def tx(self): return self.radios.current.tx
+    @property
+    def is_connected(self): return self.link.is_open
+
+    def on_tab_changed(self, event=None):
+        build = self.tab_builders.pop(self.notebook.select(), None)
+        if build: build()
+        self.render_stats()
+        self.render_diag()
+
+    def report_startup(self):
+        # Tempo do início do processo até a janela desenhada pela primeira vez
+        self.root.update_idletasks()
+        ms = (time.perf_counter() - _T0) * 1000
+        self.startup_ms = ms
+        note = "" if ms <= STARTUP_TARGET_MS else f" (acima da meta de {STARTUP_TARGET_MS} ms)"
+        self.log_system(f"Janela pronta em {ms:.0f} ms{note}")
+        for i, err in self.macro_errors.items(): self.log_system(f"Macro F{i + 1} inválida: {err}")
+
+    def load_in_background(self):
+        # Índice do logbook, journal, DXCC, dupes e estatísticas fora da thread do Tk
+        t0 = time.perf_counter()
+
+        def worker():
+            try:
+                msgs = [self.load_dxcc()]
+                self.logbook.refresh()
+                rows = self.logbook.rows
+                recovered = self.logwriter.recover((r[COL_CALL], r[COL_DATE], r[COL_TIME], r[COL_BAND], r[COL_MODE])
+                                                   for r in rows)
+                if recovered:
+                    msgs.append(f"{recovered} QSO(s) recuperados do journal e gravados no logbook")
+                    self.logbook.refresh(); rows = self.logbook.rows
+                worked = WorkedIndex()
+                worked.build((r[COL_CALL], r[COL_BAND], r[COL_MODE]) for r in rows)
+                stats = LogStats(self.dxcc_name).rebuild(rows)
+                msgs.append(f"Logbook: {len(rows)} QSOs carregados em {(time.perf_counter() - t0) * 1000:.0f} ms")
+                res = (worked, stats, len(rows), msgs)
+            except Exception as e:
+                res = e
+            self.root.after(0, self.background_loaded, res)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def background_loaded(self, res):
+        if isinstance(res, Exception):
+            self.log_system(f"Erro ao carregar o logbook: {res}")
+            self.logbook = LogbookIndex(LOGBOOK_FILE)  # nova tentativa no próximo refresh
+            res = (self.worked, self.stats, 0, [])
+        self.worked, self.stats, self.log_synced, msgs = res
+        self.log_ready = True
+        for m in msgs:
+            if m: self.log_system(m)
+        # QSOs gravados durante a carga entram pelo caminho incremental; se a
+        # aba já foi aberta, a lista ficou vazia e é montada inteira agora
+        if self.log_view is not None: self.load_logbook()
+        else: self.sync_logbook()
+        self.check_worked()
+        self.render_stats()
+
+    def on_close(self):
+        # Espera o gravador esvaziar a fila (o journal cobre o que não der tempo)
+        self.logwriter.close()
+        if self.settings.get("serial", 1) != self.saved_serial:
+            # o número de série continua de onde parou na próxima execução
+            try:
+                with open(SETTINGS_FILE, "w") as f: json.dump(self.settings, f)
+            except OSError: pass
+        self.radios.close()
+        self.root.destroy()
 
     # ================== ABA OPERAÇÃO ==================
     def setup_operation_tab(self):
@@ -94,21 +360,30 @@ class CWInterfaceApp:
         # -- Conexão --
         conn_frame = tk.LabelFrame(top_frame, text="Conexão", padx=5, pady=5)
         conn_frame.pack(side="left", fill="both", expand=True, padx=5)
+        # Rádio em foco (SO2R): Alt+1, Alt+2...; a cor mostra quem está manipulando
+        self.radio_var = tk.StringVar(value=self.radios.focus)
+        self.radio_buttons = {}
+        for name in self.radios.keyers:
+            b = tk.Radiobutton(conn_frame, text=name, value=name, variable=self.radio_var, indicatoron=0, width=3,
+                               selectcolor="#aaddff", command=lambda n=name: self.set_focus(n))
+            b.pack(side="left"); self.radio_buttons[name] = b
         self.port_combo = ttk.Combobox(conn_frame, width=15)
         self.port_combo.pack(side="left", padx=5)
         tk.Button(conn_frame, text="⟳", command=self.refresh_ports).pack(side="left", padx=2)
         self.btn_connect = tk.Button(conn_frame, text="Conectar", command=self.toggle_connection, bg="#dddddd")
         self.btn_connect.pack(side="left", padx=5)
-        self.refresh_ports()
 
         # -- Velocidade (WPM) --
         wpm_frame = tk.LabelFrame(top_frame, text="Velocidade (1-50 WPM)", padx=5, pady=5)
         wpm_frame.pack(side="left", fill="both", padx=5)
-        self.wpm_var = tk.IntVar(value=self.settings.get("wpm", 20))
+        self.wpm_var = tk.IntVar(value=self.keyer.wpm)
         # Spinbox para WPM
         self.spin_wpm = tk.Spinbox(wpm_frame, from_=1, to=50, textvariable=self.wpm_var, width=5, font=("Arial", 12, "bold"), command=self.send_wpm)
         self.spin_wpm.pack(side="left", padx=10, pady=2)
         self.spin_wpm.bind("<Return>", lambda e: self.send_wpm())
+        # Modo binário: o PC compila o texto e o Arduino só reproduz a linha do tempo
+        self.binary_var = tk.BooleanVar(value=self.settings.get("binary_protocol", False))
+        tk.Checkbutton(wpm_frame, text="Timeline", variable=self.binary_var).pack(side="left")
 
         # 2. DADOS DA ESTAÇÃO
         st_frame = tk.LabelFrame(self.tab_op, text="Dados da Estação", padx=5, pady=5)
@@ -141,12 +416,19 @@ class CWInterfaceApp:
         tk.Label(row1, text="Freq (kHz):", bg="#f0f8ff").pack(side="left", padx=(10,2))
         self.entry_freq = tk.Entry(row1, width=10); self.entry_freq.pack(side="left")
         self.entry_freq.insert(0, "7000")
+        self.combo_band.bind("<<ComboboxSelected>>", lambda e: self.check_worked())
+
+        self.lbl_worked = tk.Label(row1, text="", bg="#f0f8ff", font=("Arial", 10, "bold"))
+        self.lbl_worked.pack(side="left", padx=10)
 
         # Linha 2: DX Call e RST
         row2 = tk.Frame(qso_frame, bg="#f0f8ff"); row2.pack(fill="x", pady=5)
         tk.Label(row2, text="DX CALL:", font=("Arial", 11, "bold"), bg="#f0f8ff").pack(side="left")
         self.entry_dx = tk.Entry(row2, width=12, font=("Arial", 14, "bold"), bg="white", fg="blue")
         self.entry_dx.pack(side="left", padx=5)
+        self.entry_dx.bind("<KeyRelease>", lambda e: self.check_worked())
+        self.lbl_dxcc = tk.Label(row2, text="", width=24, anchor="w", fg="#004488", bg="#f0f8ff")
+        self.lbl_dxcc.pack(side="left")
 
         tk.Label(row2, text="RST(S):", bg="#f0f8ff").pack(side="left", padx=(10,2))
         self.entry_rst_sent = tk.Entry(row2, width=4, justify="center"); self.entry_rst_sent.pack(side="left"); self.entry_rst_sent.insert(0, "599")
@@ -154,8 +436,13 @@ class CWInterfaceApp:
         tk.Label(row2, text="RST(R):", bg="#f0f8ff").pack(side="left", padx=(10,2))
         self.entry_rst_rcvd = tk.Entry(row2, width=4, justify="center"); self.entry_rst_rcvd.pack(side="left"); self.entry_rst_rcvd.insert(0, "599")
 
+        tk.Label(row2, text="NR:", bg="#f0f8ff").pack(side="left", padx=(10,2))  # próximo número de série ({nr})
+        self.entry_nr = tk.Entry(row2, width=5, justify="center"); self.entry_nr.pack(side="left"); self.entry_nr.insert(0, str(self.settings.get("serial", 1)))
+
         tk.Button(row2, text="LOGAR (Ctrl+Enter)", bg="#aaffaa", command=self.log_contact).pack(side="left", padx=20)
         tk.Button(row2, text="X", command=self.clear_qso_fields, bg="#ffcccc").pack(side="left")
+        self.lbl_log_backlog = tk.Label(row2, text="", fg="#aa5500", bg="#f0f8ff")
+        self.lbl_log_backlog.pack(side="left", padx=10)
 
         self.lbl_log_status = tk.Label(qso_frame, text="", fg="green", bg="#f0f8ff")
         self.lbl_log_status.pack(fill="x", pady=5)
@@ -173,6 +460,12 @@ class CWInterfaceApp:
         self.entry_cq_interval = tk.Entry(cq_frame, width=4)
         self.entry_cq_interval.pack(side="left", padx=2)
         self.entry_cq_interval.insert(0, self.settings.get("cq_interval", "15"))
+        tk.Label(cq_frame, text="Macros:").pack(side="left")
+        self.entry_cq_macros = tk.Entry(cq_frame, width=6)  # rodízio, ex.: "1,5"
+        self.entry_cq_macros.pack(side="left", padx=2)
+        self.entry_cq_macros.insert(0, self.settings.get("cq_macros", "1"))
+        self.lbl_cq_countdown = tk.Label(cq_frame, text="", width=9, fg="#aa5500")
+        self.lbl_cq_countdown.pack(side="left")
         
         self.btn_auto_cq = tk.Button(cq_frame, text="AUTO CQ (OFF)", bg="#ffcccc", command=self.toggle_auto_cq)
         self.btn_auto_cq.pack(side="left", padx=5)
@@ -183,11 +476,31 @@ class CWInterfaceApp:
         # 5. TERMINAL
         main_frame = tk.LabelFrame(self.tab_op, text="Terminal (TEXTO LIVRE)", padx=5, pady=5)
         main_frame.pack(fill="both", expand=True, padx=10, pady=5)
-        self.txt_input = tk.Entry(main_frame, font=("Courier", 12))
-        self.txt_input.pack(fill="x", padx=5); self.txt_input.bind("<Return>", lambda e: self.send_text())
+        input_row = tk.Frame(main_frame); input_row.pack(fill="x", padx=5)
+        self.stream_var = tk.StringVar(value=self.settings.get("stream_mode", STREAM_MODES[0]))
+        tk.OptionMenu(input_row, self.stream_var, *STREAM_MODES).pack(side="left")
+        # Text de 1 linha (e não Entry) para marcar o que já foi enviado
+        self.txt_input = tk.Text(input_row, height=1, font=("Courier", 12), wrap="none", undo=False)
+        self.txt_input.pack(side="left", fill="x", expand=True)
+        self.txt_input.tag_configure("sent", foreground="#888888", background="#e8e8e8")
+        self.txt_input.mark_set("sent_end", "1.0"); self.txt_input.mark_gravity("sent_end", "left")
+        self.txt_input.bind("<Return>", lambda e: self.send_text() or "break")
+        self.txt_input.bind("<Control-Return>", lambda e: self.log_contact() or "break")
+        self.txt_input.bind("<KeyPress>", self.on_input_key)
+        tk.Button(input_row, text="RX WAV", command=self.decode_wav_file).pack(side="left", padx=(5, 0))
+        txq_row = tk.Frame(main_frame); txq_row.pack(fill="x", padx=5)
+        self.lbl_txq = tk.Label(txq_row, text="Fila TX: vazia", fg="gray", anchor="w")
+        self.lbl_txq.pack(side="left", fill="x", expand=True)
+        self.lbl_keyer = tk.Label(txq_row, text="Keyer: --", fg="gray", anchor="e")
+        self.lbl_keyer.pack(side="right")
         
-        self.log_area = scrolledtext.ScrolledText(main_frame, height=6, state='disabled', font=("Courier", 10))
+        self.terminal = TerminalLog(main_frame, max_lines=self.settings.get("terminal_max_lines", 2000),
+                                    log_file=self.settings.get("terminal_log_file") or None,
+                                    height=6, font=("Courier", 10))
+        self.log_area = self.terminal.text
         self.log_area.pack(fill="both", expand=True, padx=5, pady=5)
+        self.refresh_ports()
+        self.watch_macro_fields()
 
     # ================== ABA LOGBOOK ==================
     def setup_logbook_tab(self):
@@ -196,55 +509,192 @@ class CWInterfaceApp:
         filter_frame.pack(fill="x", padx=10, pady=10)
         
         tk.Button(filter_frame, text="Atualizar Lista", command=self.load_logbook).pack(side="left")
+        self.btn_import = tk.Button(filter_frame, text="Importar ADIF", command=self.import_logbook)
+        self.btn_import.pack(side="right")
+        self.btn_export = tk.Button(filter_frame, text="Exportar...", command=self.export_logbook)
+        self.btn_export.pack(side="right", padx=5)
         tk.Label(filter_frame, text="   |   Filtrar por Banda:").pack(side="left")
         self.filter_band = ttk.Combobox(filter_frame, values=["TODAS", "80m","40m","20m","15m","10m"], width=8)
         self.filter_band.pack(side="left", padx=5); self.filter_band.current(0)
         self.filter_band.bind("<<ComboboxSelected>>", lambda e: self.load_logbook())
 
-        # Tabela Treeview
+        # Tabela Treeview (virtual: só as linhas visíveis ficam no Tk)
         cols = ("Data", "Hora", "Call", "Banda", "Freq", "Modo", "RST(S)", "RST(R)", "Grid")
-        self.log_tree = ttk.Treeview(self.tab_log, columns=cols, show="headings")
-        
+        self.log_view = VirtualTreeview(self.tab_log, cols, fetch=lambda i: self.format_log_row(self.logbook.rows[i]),
+                                        sort_key=self.log_sort_key)
+        self.log_tree = self.log_view.tree
+
         for col in cols:
-            self.log_tree.heading(col, text=col)
             w = 80 if col in ["Freq", "Grid"] else 60
             if col == "Data": w = 90
             if col == "Call": w = 100
             self.log_tree.column(col, width=w, anchor="center")
 
-        sb = ttk.Scrollbar(self.tab_log, orient=tk.VERTICAL, command=self.log_tree.yview)
-        self.log_tree.configure(yscroll=sb.set)
-        sb.pack(side="right", fill="y")
+        self.log_view.sb.pack(side="right", fill="y")
         self.log_tree.pack(fill="both", expand=True, padx=10, pady=5)
         
         self.load_logbook()
 
+    def sync_logbook(self):
+        # Atualiza o índice do ADIF e as estruturas em memória derivadas dele.
+        # Retorna (reconstruído, primeira linha nova).
+        if not self.log_ready: return False, len(self.logbook.rows)
+        start = self.logbook.refresh()
+        rows = self.logbook.rows
+        rebuilt = start < self.log_synced or self.log_synced == 0
+        if rebuilt:
+            self.worked.build((r[COL_CALL], r[COL_BAND], r[COL_MODE]) for r in rows)
+            self.stats.rebuild(rows)
+            start = 0
+        else:
+            for r in rows[start:]: self.worked.add(r[COL_CALL], r[COL_BAND], r[COL_MODE])
+            self.stats.add_rows(rows[start:])
+        self.log_synced = len(rows)
+        return rebuilt, start
+
     def load_logbook(self):
-        for i in self.log_tree.get_children(): self.log_tree.delete(i)
-        if not os.path.exists(LOGBOOK_FILE): return
+        # Redesenha a lista a partir do índice (só o trecho novo do ADIF é lido)
+        if not self.log_ready: return
+        self.sync_logbook()
+        # Ordem do arquivo, exibida de trás para frente (QSO mais recente no topo)
+        self.log_view.set_keys(self.logbook.band_rows(self.filter_band.get()), reverse=True)
+
+    def refresh_logbook(self):
+        # Após um novo QSO: acrescenta só os registros novos à lista
+        rebuilt, start = self.sync_logbook()
+        if self.log_view is None: return  # aba ainda não aberta
+        if rebuilt:
+            return self.log_view.set_keys(self.logbook.band_rows(self.filter_band.get()), reverse=True)
         target_band = self.filter_band.get()
-        
-        with open(LOGBOOK_FILE, "r", encoding="utf-8", errors="ignore") as f: content = f.read()
-        records = content.split("<EOR>")
-        for rec in records:
-            if not rec.strip(): continue
-            def get_tag(tag, text):
-                m = re.search(f"<{tag}:\d+>([^<]+)", text, re.IGNORECASE)
-                return m.group(1).strip() if m else ""
-
-            dx = get_tag("CALL", rec)
-            if not dx: continue
-            band = get_tag("BAND", rec)
-            if target_band != "TODAS" and band.upper() != target_band.upper(): continue
-
-            date = get_tag("QSO_DATE", rec)
-            time = get_tag("TIME_ON", rec)
-            fmt_date = f"{date[6:8]}/{date[4:6]}/{date[0:4]}" if len(date)==8 else date
-            fmt_time = f"{time[0:2]}:{time[2:4]}" if len(time)==4 else time
-
-            self.log_tree.insert("", 0, values=(fmt_date, fmt_time, dx, band, get_tag("FREQ", rec), 
-                                                get_tag("MODE", rec), get_tag("RST_SENT", rec), 
-                                                get_tag("RST_RCVD", rec), get_tag("MY_GRIDSQUARE", rec)))
+        rows = self.logbook.rows
+        self.log_view.add_keys(i for i in range(start, len(rows))
+                               if target_band == "TODAS" or rows[i][COL_BAND].upper() == target_band.upper())
+
+    def log_sort_key(self, i, col):
+        row = self.logbook.rows[i]
+        c = self.log_view.columns.index(col)
+        if c == COL_DATE: return (row[COL_DATE], row[COL_TIME], i)
+        if c == COL_TIME: return (row[COL_TIME], row[COL_DATE], i)
+        if c == COL_FREQ:
+            mhz = freq_mhz(row[COL_FREQ], row[COL_BAND])  # registros antigos em kHz
+            return (0.0 if mhz is None else mhz, i)
+        return (row[c].upper(), i)
+
+    def import_logbook(self):
+        src = filedialog.askopenfilename(title="Importar ADIF", filetypes=[("ADIF", "*.adi *.adif"), ("Todos", "*.*")])
+        if not src: return
+        if not self.log_ready: return messagebox.showinfo("Importar ADIF", "Aguarde o logbook terminar de carregar.")
+        known = {qso_key(r[COL_CALL], r[COL_DATE], r[COL_TIME], r[COL_BAND], r[COL_MODE]) for r in self.logbook.rows}
+        self.btn_import.config(state="disabled", text="Importando...")
+
+        def worker():
+            try:
+                with self.logwriter.lock:  # não intercala com os QSOs em gravação
+                    res = import_adif(src, LOGBOOK_FILE, known)
+            except Exception as e:
+                res = e
+            self.root.after(0, self.import_done, src, res)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def import_done(self, src, res):
+        self.btn_import.config(state="normal", text="Importar ADIF")
+        if isinstance(res, Exception):
+            return messagebox.showerror("Erro ao Importar", str(res))
+        self.refresh_logbook()
+        messagebox.showinfo("Importar ADIF", f"{os.path.basename(src)}:\n{res[0]} QSOs importados, {res[1]} ignorados (duplicados ou sem indicativo).")
+
+    def export_logbook(self):
+        # Durante uma exportação o mesmo botão a cancela
+        if self.export_cancel is not None: return self.export_cancel.set()
+        ed = tk.Toplevel(self.root); ed.title("Exportar logbook"); ed.resizable(False, False)
+        fields = {}
+        for label, key, value in (("De (AAAA-MM-DD):", "date_from", ""), ("Até:", "date_to", ""),
+                                  ("Banda:", "band", self.filter_band.get() if self.log_view else "TODAS"),
+                                  ("Indicativo (PY*, ...):", "call", ""), ("Concurso (Cabrillo):", "contest", ""),
+                                  ("Troca enviada:", "exchange", "")):
+            row = tk.Frame(ed); row.pack(fill="x", padx=10, pady=2)
+            tk.Label(row, text=label, width=20, anchor="w").pack(side="left")
+            e = tk.Entry(row, width=20); e.insert(0, value); e.pack(side="left")
+            fields[key] = e
+        row = tk.Frame(ed); row.pack(fill="x", padx=10, pady=2)
+        tk.Label(row, text="Formato:", width=20, anchor="w").pack(side="left")
+        fmt = ttk.Combobox(row, values=["Cabrillo", "CSV", "ADIF"], width=17, state="readonly")
+        fmt.current(0); fmt.pack(side="left")
+
+        def start():
+            kind = fmt.get().lower()
+            ext = {"cabrillo": ".cbr", "csv": ".csv", "adif": ".adi"}[kind]
+            dest = filedialog.asksaveasfilename(title="Exportar logbook", defaultextension=ext,
+                                                filetypes=[(fmt.get(), "*" + ext), ("Todos", "*.*")], parent=ed)
+            if not dest: return
+            opts = {k: e.get().strip() for k, e in fields.items()}
+            ed.destroy()
+            self.start_export(dest, kind, opts)
+        tk.Button(ed, text="EXPORTAR", bg="#aaffaa", command=start).pack(fill="x", padx=10, pady=10)
+
+    def start_export(self, dest, kind, opts):
+        # Em fluxo numa thread: a memória não cresce com o log e a janela continua respondendo
+        keep = record_filter(opts["date_from"], opts["date_to"], opts["band"], opts["call"])
+        header = dict(call=self.entry_call.get(), name=self.entry_name.get(), grid=self.entry_grid.get(),
+                      contest=opts["contest"], band=opts["band"], exchange=opts["exchange"])
+        cancel = self.export_cancel = threading.Event()
+        self.btn_export.config(text="Cancelar (0%)")
+
+        def progress(f):
+            self.root.after(0, lambda: self.export_cancel is cancel and self.btn_export.config(text=f"Cancelar ({f:.0%})"))
+
+        def worker():
+            try:
+                res = export_log(LOGBOOK_FILE, dest, kind, keep, progress, cancel, **header)
+            except Exception as e:
+                res = e
+            self.root.after(0, self.export_done, dest, res)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def export_done(self, dest, res):
+        self.export_cancel = None
+        self.btn_export.config(text="Exportar...")
+        if isinstance(res, Exception):
+            return messagebox.showerror("Erro ao Exportar", str(res))
+        if res is None: return self.log_system("Exportação cancelada")
+        backlog = f" ({self.logwriter.backlog} QSO(s) ainda gravando ficaram de fora)" if self.logwriter.backlog else ""
+        self.log_system(f"{res[0]} de {res[1]} QSOs exportados para {dest}{backlog}")
+
+    def load_dxcc(self):
+        path = self.settings.get("cty_file") or CTY_FILE
+        if not os.path.exists(path): return None
+        try:
+            self.dxcc.load(path)
+            return f"{len(self.dxcc)} entidades DXCC carregadas de {path}"
+        except Exception as e:
+            return f"Erro ao ler {path}: {e}"
+
+    def check_worked(self):
+        # Consulta só o índice em memória: nunca relê o logbook.adi
+        call = self.entry_dx.get().strip().upper()
+        d = self.dxcc.lookup(call)
+        self.lbl_dxcc.config(text=f"{d.name} ({d.cont}) CQ{d.cq} ITU{d.itu}" if d else "")
+        if not call:
+            self.entry_dx.config(bg="white"); self.lbl_worked.config(text="")
+            return
+        band = self.combo_band.get()
+        e = self.worked.get(call)
+        if e is not None and (band.upper(), "CW") in e.pairs:
+            self.entry_dx.config(bg="#ff9999")
+            self.lbl_worked.config(text=f"DUPE {band} CW", fg="red")
+        elif e is not None:
+            self.entry_dx.config(bg="#ffff99")
+            self.lbl_worked.config(text="Já trabalhado: " + " ".join(sorted(e.bands)), fg="#aa6600")
+        else:
+            self.entry_dx.config(bg="white")
+            similar = self.worked.prefix(call, 5)
+            self.lbl_worked.config(text=("Parecidos: " + " ".join(similar)) if similar else "Novo", fg="gray")
+
+    def format_log_row(self, row):
+        date, time = row[COL_DATE], row[COL_TIME]
+        fmt_date = f"{date[6:8]}/{date[4:6]}/{date[0:4]}" if len(date)==8 else date
+        fmt_time = f"{time[0:2]}:{time[2:4]}" if len(time)==4 else time
+        return (fmt_date, fmt_time) + tuple(row[COL_CALL:])
 
     # ================== ABA AJUDA / MANUAL ==================
     def setup_help_tab(self):
@@ -276,6 +726,9 @@ class CWInterfaceApp:
      {grid}   -> Seu Grid Locator
      {target} -> Indicativo do DX (campo DX CALL)
      {rst}    -> RST Enviado (converte 599 para 5NN automaticamente)
+     {nr}     -> Número de série do concurso (campo NR, ex.: 007; soma 1 a cada QSO logado)
+     {cut}    -> O mesmo número com números cortados (007 -> TT7)
+     {last}   -> Último indicativo logado
 
 5. AUTO CQ (CHAMADA AUTOMÁTICA)
    - O sistema envia a Macro F1 (CQ) repetidamente.
@@ -320,6 +773,114 @@ class CWInterfaceApp:
 
         st.configure(state='disabled') # Apenas leitura
 
+    # ================== ABA ESTATÍSTICAS ==================
+    def setup_stats_tab(self):
+        top = tk.Frame(self.tab_stats); top.pack(fill="x", padx=10, pady=10)
+        self.lbl_stats_total = tk.Label(top, text="", font=("Arial", 11, "bold"), anchor="w")
+        self.lbl_stats_total.pack(fill="x")
+        self.lbl_stats_rate = tk.Label(top, text="", font=("Arial", 11), fg="#0055aa", anchor="w")
+        self.lbl_stats_rate.pack(fill="x")
+
+        body = tk.Frame(self.tab_stats); body.pack(fill="both", expand=True, padx=10, pady=5)
+        left = tk.LabelFrame(body, text="Bandas x Modos"); left.pack(side="left", fill="both", expand=True)
+        self.stats_band_tree = ttk.Treeview(left, show="headings", height=10)
+        self.stats_band_tree.pack(fill="both", expand=True)
+        mid = tk.LabelFrame(body, text="QSOs por hora (UTC)"); mid.pack(side="left", fill="both", expand=True, padx=5)
+        self.stats_hour_tree = ttk.Treeview(mid, columns=("Hora", "QSOs"), show="headings", height=10)
+        for col, w in (("Hora", 120), ("QSOs", 50)): self.stats_hour_tree.heading(col, text=col); self.stats_hour_tree.column(col, width=w, anchor="center")
+        self.stats_hour_tree.pack(fill="both", expand=True)
+        right = tk.LabelFrame(body, text="Entidades DXCC"); right.pack(side="left", fill="both", expand=True)
+        self.stats_dxcc_tree = ttk.Treeview(right, columns=("Entidade", "QSOs"), show="headings", height=10)
+        for col, w in (("Entidade", 140), ("QSOs", 50)): self.stats_dxcc_tree.heading(col, text=col); self.stats_dxcc_tree.column(col, width=w, anchor="center")
+        self.stats_dxcc_tree.pack(fill="both", expand=True)
+
+        # Só redesenha com a aba visível (on_tab_changed); a taxa é recalculada a cada 15 s
+        self.root.after(15000, self.tick_stats)
+
+    def dxcc_name(self, call):
+        d = self.dxcc.lookup(call)
+        return d.name if d else None
+
+    def stats_visible(self):
+        return self.notebook.select() == str(self.tab_stats)
+
+    def tick_stats(self):
+        if self.stats_visible(): self.render_rate()
+        self.root.after(15000, self.tick_stats)
+
+    def render_rate(self):
+        r10, r60 = self.stats.rate(10), self.stats.rate(60)
+        self.lbl_stats_rate.config(text=f"Taxa: {r10} QSOs em 10 min ({r10 * 6}/h)   |   {r60} QSOs na última hora")
+
+    def render_stats(self):
+        if not self.stats_visible(): return
+        self.render_rate()
+        st = self.stats
+        if st.version == self.stats_shown: return
+        self.stats_shown = st.version
+        dx = f"   |   Entidades DXCC: {len(st.entities)}" if len(self.dxcc) else "   |   Entidades DXCC: (sem cty.dat)"
+        self.lbl_stats_total.config(text=f"QSOs: {st.total}   |   Indicativos únicos: {len(st.calls)}{dx}")
+
+        modes = st.modes()
+        tree = self.stats_band_tree
+        cols = ("Banda",) + tuple(modes) + ("Total",)
+        tree.config(columns=cols)
+        for col in cols: tree.heading(col, text=col); tree.column(col, width=60, anchor="center")
+        tree.delete(*tree.get_children())
+        for band, total in sorted(st.bands().items()):
+            tree.insert("", "end", values=(band,) + tuple(st.band_mode.get((band, m), 0) for m in modes) + (total,))
+
+        self.stats_hour_tree.delete(*self.stats_hour_tree.get_children())
+        for hour, n in st.last_hours(24): self.stats_hour_tree.insert("", "end", values=(hour, n))
+        self.stats_dxcc_tree.delete(*self.stats_dxcc_tree.get_children())
+        for name, n in st.entities.most_common(50): self.stats_dxcc_tree.insert("", "end", values=(name, n))
+
+    # ================== ABA DIAGNÓSTICO ==================
+    def setup_diag_tab(self):
+        top = tk.Frame(self.tab_diag); top.pack(fill="x", padx=10, pady=10)
+        self.lbl_diag = tk.Label(top, text="Latência do caminho de manipulação (ms)", font=("Arial", 11, "bold"), anchor="w")
+        self.lbl_diag.pack(side="left", fill="x", expand=True)
+        tk.Button(top, text="Exportar JSON", command=lambda: self.export_latency("json")).pack(side="left", padx=2)
+        tk.Button(top, text="Exportar CSV", command=lambda: self.export_latency("csv")).pack(side="left", padx=2)
+        tk.Button(top, text="Zerar", command=self.reset_latency).pack(side="left", padx=2)
+        cols = ("Etapa", "N", "p50", "p95", "p99", "Máx")
+        self.diag_tree = ttk.Treeview(self.tab_diag, columns=cols, show="headings", height=12)
+        for col, w in zip(cols, (280, 60, 70, 70, 70, 70)):
+            self.diag_tree.heading(col, text=col); self.diag_tree.column(col, width=w, anchor="w" if col == "Etapa" else "center")
+        self.diag_tree.pack(fill="both", expand=True, padx=10, pady=5)
+        tk.Label(self.tab_diag, fg="gray", justify="left", anchor="w",
+                 text="Tecla = F-key, botão ou Enter. Eco = linha \"TX:\" do Arduino (chegou e vai manipular).\n"
+                      "Fila do leitor e after() do Tk medem atrasos da própria interface.").pack(fill="x", padx=10, pady=5)
+        self.root.after(1000, self.tick_diag)
+
+    def diag_visible(self):
+        return self.notebook.select() == str(self.tab_diag) and str(self.tab_diag) not in self.tab_builders
+
+    def tick_diag(self):
+        self.render_diag()
+        self.root.after(1000, self.tick_diag)
+
+    def render_diag(self):
+        if not self.diag_visible(): return
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"
+        tree = self.diag_tree
+        tree.delete(*tree.get_children())
+        for st in self.latency.snapshot():
+            tree.insert("", "end", values=(st["label"], st["n"], fmt(st["p50"]), fmt(st["p95"]), fmt(st["p99"]), fmt(st["max"])))
+
+    def export_latency(self, fmt):
+        path = filedialog.asksaveasfilename(defaultextension=f".{fmt}", initialfile=f"latencia.{fmt}",
+                                            filetypes=[(fmt.upper(), f"*.{fmt}")])
+        if not path: return
+        try:
+            (self.latency.export_json if fmt == "json" else self.latency.export_csv)(path)
+            self.log_system(f"Latências exportadas em {path}")
+        except OSError as e:
+            self.log_system(f"Erro ao exportar: {e}")
+
+    def reset_latency(self):
+        self.latency.reset(); self.render_diag()
+
     # ================== DICIONÁRIO ==================
     def setup_dictionary_tab(self):
         frame = tk.Frame(self.tab_dict); frame.pack(fill="x", padx=10, pady=10)
@@ -340,30 +901,48 @@ class CWInterfaceApp:
         for item in data: self.tree.insert("", tk.END, values=item)
 
     def filter_dictionary(self, *args):
-        q = self.search_var.get().lower()
-        data = [(a, m) for a, m in CW_DICTIONARY if q in a.lower() or q in m.lower()]
-        self.populate_tree(data)
+        self.populate_tree(filter_dictionary(self.search_var.get()))
 
     # ================== LÓGICA GERAL ==================
-    def get_formatted_rst(self):
-        val = self.entry_rst_sent.get().strip().upper()
-        return "5NN" if val == "599" else val
-
-    def send_macro(self, template):
-        call = self.entry_call.get().upper()
-        name = self.entry_name.get().upper()
-        grid = self.entry_grid.get().upper()
-        target = self.entry_dx.get().upper().strip() or "DX"
-        rst = self.get_formatted_rst()
-        msg = template.format(call=call, name=name, grid=grid, target=target, rst=rst)
-        self.send_raw(msg)
+    def user_trace(self):
+        # Início do trace de latência: o instante da tecla/clique
+        return self.latency.trace(hotkey=self.latency.clock())
+
+    def watch_macro_fields(self):
+        # Os campos usados pelas macros passam a ter StringVar: cada edição
+        # refaz macro_values uma vez, e a tecla F só lê o resultado pronto
+        self.macro_vars = []
+        for e in (self.entry_call, self.entry_name, self.entry_grid, self.entry_dx, self.entry_rst_sent, self.entry_nr):
+            var = tk.StringVar(value=e.get()); e.config(textvariable=var)
+            var.trace_add("write", self.update_macro_values)
+            self.macro_vars.append(var)
+        self.update_macro_values()
+
+    def update_macro_values(self, *args):
+        call, name, grid, dx, rst, nr = (v.get() for v in self.macro_vars)
+        try: nr = max(0, int(nr))
+        except ValueError: nr = self.settings.get("serial", 1)
+        self.macro_values = macro_values(call, name, grid, dx, rst, nr, self.last_call,
+                                         self.settings.get("cut_digits", CUT_DIGITS))
+
+    def uses_serial(self):
+        # Número de série só conta (e vai para o ADIF como STX) se alguma macro usa {nr}/{cut}
+        return any(m is not None and ("nr" in m.fields or "cut" in m.fields) for m in self.macros)
+
+    def send_macro(self, index, radio=None, trace=None):
+        # Texto e bytes vêm prontos do cache da macro enquanto as variáveis que ela usa não mudarem.
+        # Retorna True se a mensagem entrou na fila de TX
+        m = self.macros[index]
+        if m is None:
+            self.log_system(f"Macro F{index + 1} inválida: {self.macro_errors[index]}"); return False
+        k = self.radios.get(radio)
+        text, payloads, ms = m.payloads(self.macro_values, k.wpm, self.binary_var.get(),
+                                        self.settings.get("weight", 50), self.settings.get("farnsworth", 0))
+        if trace is not None: trace["render"] = self.latency.clock()
+        return self.send_raw(text, radio, trace, (payloads, ms))
 
     def load_settings(self):
-        if os.path.exists(SETTINGS_FILE):
-            try:
-                with open(SETTINGS_FILE, "r") as f: return json.load(f)
-            except: pass
-        return {"callsign": "PP2LA", "name": "LUCAS", "grid": "GH63", "wpm": 20, "macros": DEFAULT_MACROS}
+        return load_settings(SETTINGS_FILE)
 
     def save_station_data(self):
         try:
@@ -375,14 +954,21 @@ class CWInterfaceApp:
             "name": self.entry_name.get().upper(),
             "grid": self.entry_grid.get().upper(),
             "wpm": self.wpm_var.get(),
-            "cq_interval": cq_int
+            "radios": [{"name": k.name, "port": k.link.port or self.radio_ports.get(k.name, ""), "wpm": k.wpm}
+                       for k in self.radios.keyers.values()],
+            "cq_interval": cq_int,
+            "cq_macros": self.entry_cq_macros.get().strip() or "1",
+            "binary_protocol": self.binary_var.get(),
+            "stream_mode": self.stream_var.get(),
+            "serial": int(self.macro_values["nr"]),
         })
         with open(SETTINGS_FILE, "w") as f: json.dump(self.settings, f)
+        self.saved_serial = self.settings["serial"]
         self.log_system("Dados salvos!")
 
     def open_editor(self):
         ed = tk.Toplevel(self.root); ed.title("Editor"); ed.geometry("700x500")
-        tk.Label(ed, text="{call}, {name}, {grid}, {target}, {rst}", fg="gray").pack()
+        tk.Label(ed, text="{call}, {name}, {grid}, {target}, {rst}, {nr}, {cut}, {last}  |  Rádio: vazio = o rádio em foco", fg="gray").pack()
         cv = tk.Canvas(ed); sb = tk.Scrollbar(ed, orient="vertical", command=cv.yview)
         fr = tk.Frame(cv); fr.bind("<Configure>", lambda e: cv.configure(scrollregion=cv.bbox("all")))
         cv.create_window((0,0), window=fr, anchor="nw"); cv.configure(yscrollcommand=sb.set)
@@ -392,112 +978,331 @@ class CWInterfaceApp:
             row = tk.Frame(fr); row.pack(fill="x", pady=2)
             l = tk.Entry(row, width=15); l.insert(0, m["label"]); l.pack(side="left")
             t = tk.Entry(row, width=60); t.insert(0, m["template"]); t.pack(side="left")
-            entries.append((l, t))
+            r = tk.Entry(row, width=4); r.insert(0, m.get("radio", "")); r.pack(side="left")
+            tk.Button(row, text="▶", command=lambda t=t: self.preview_macro(t.get())).pack(side="left")
+            entries.append((l, t, r))
         def add_blank():
-            row = tk.Frame(fr); row.pack(fill="x", pady=2); l = tk.Entry(row, width=15); l.pack(side="left"); t = tk.Entry(row, width=60); t.pack(side="left"); entries.append((l, t))
+            row = tk.Frame(fr); row.pack(fill="x", pady=2); l = tk.Entry(row, width=15); l.pack(side="left"); t = tk.Entry(row, width=60); t.pack(side="left")
+            r = tk.Entry(row, width=4); r.pack(side="left"); entries.append((l, t, r))
         tk.Button(ed, text="+ Linha", command=add_blank).pack(fill="x")
         def save():
             new_m = []
-            for l, t in entries:
-                if l.get().strip(): new_m.append({"label": l.get().strip(), "template": t.get().strip()})
-            self.settings["macros"] = new_m; self.save_station_data(); self.render_macro_buttons(); ed.destroy()
+            for l, t, r in entries:
+                if not l.get().strip(): continue
+                m = {"label": l.get().strip(), "template": t.get().strip()}
+                if r.get().strip(): m["radio"] = r.get().strip().upper()
+                new_m.append(m)
+            # Valida antes de salvar: um template com erro não chega às teclas F
+            macros, errors = compile_macros(new_m)
+            if errors:
+                msg = "\n".join(f"F{i + 1} ({new_m[i]['label']}): {err}" for i, err in errors.items())
+                return messagebox.showerror("Macro inválida", msg, parent=ed)
+            self.settings["macros"] = new_m; self.macros, self.macro_errors = macros, errors
+            self.save_station_data(); self.render_macro_buttons(); ed.destroy()
         tk.Button(ed, text="SALVAR", bg="#aaffaa", command=save).pack(fill="x", padx=10, pady=10)
 
+    def preview_macro(self, template):
+        # Ouve a macro sem transmitir: áudio gerado com a temporização do keyer
+        try:
+            from cwcore.sidetone import Sidetone
+        except ImportError:
+            return self.log_system("A prévia de áudio precisa do numpy (pip install numpy)")
+        try:
+            text = compile_macro(template).render(self.macro_values)
+        except ValueError as e:
+            return self.log_system(f"Macro inválida: {e}")
+        path = os.path.join(tempfile.gettempdir(), "cwinterface_preview.wav")
+        runs = compile_timeline(text, self.keyer.wpm, self.settings.get("weight", 50), self.settings.get("farnsworth", 0))
+        Sidetone(freq=self.settings.get("sidetone_hz", 700)).write_wav(path, runs)
+        try:
+            import winsound
+            winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+        except ImportError:
+            self.log_system(f"Prévia de '{text}' gravada em {path}")
+
     def render_macro_buttons(self):
         for w in self.buttons_container.winfo_children(): w.destroy()
         r=0; c=0
         for i, m in enumerate(self.settings["macros"]):
             # Deixa claro qual é o F-key
             key_label = f"F{i+1}"
-            btn_text = f"[{key_label}] {m['label']}"
-            tk.Button(self.buttons_container, text=btn_text, width=15, height=2,
-                      command=lambda t=m["template"]: self.send_macro(t)).grid(row=r, column=c, padx=3, pady=3)
+            btn_text = f"[{key_label}] {m['label']}" + (f" >{m['radio']}" if m.get("radio") else "")
+            tk.Button(self.buttons_container, text=btn_text, width=15, height=2, fg="red" if i in self.macro_errors else "black",
+                      command=lambda i=i, m=m: self.send_macro(i, m.get("radio"), self.user_trace())).grid(row=r, column=c, padx=3, pady=3)
             c+=1; 
             if c>3: c=0; r+=1
 
     # --- Serial ---
     def refresh_ports(self):
-        self.port_combo['values'] = [p.device for p in serial.tools.list_ports.comports()]
-        if self.port_combo['values']: self.port_combo.current(0)
+        try:
+            self.port_combo['values'] = list_ports()
+        except Exception as e:
+            self.port_combo['values'] = []; self.log_system(f"Erro ao listar portas: {e}")
+        self.show_radio_port()
+
+    def show_radio_port(self):
+        # Porta do rádio em foco: a aberta, a salva ou a primeira da lista
+        port = self.link.port if self.is_connected else self.radio_ports.get(self.keyer.name, "")
+        if port: self.port_combo.set(port)
+        elif self.port_combo['values']: self.port_combo.current(0)
+
+    def radio_tag(self, k):
+        # Prefixo das mensagens quando há mais de um rádio
+        return f"{k.name}: " if len(self.radios.keyers) > 1 else ""
+
+    def set_focus(self, name):
+        k = self.radios.set_focus(name)
+        self.radio_var.set(k.name)
+        self.wpm_var.set(k.wpm)
+        self.show_radio_port()
+        self.btn_connect.config(text="Desconectar" if self.is_connected else "Conectar",
+                                bg="#ffaaaa" if self.is_connected else "#dddddd")
+        text, color = self.keyer_status.get(k.name, ("Keyer: --", "gray"))
+        self.lbl_keyer.config(text=text, fg=color)
+        self.update_txq_ui()
 
     def toggle_connection(self):
-        if not self.is_connected:
+        k = self.keyer
+        if not k.link.is_open:
+            port = self.port_combo.get()
+            if any(o.link.port == port and o.link.is_open for o in self.radios.keyers.values()):
+                return self.log_system(f"{port} já está em uso por outro rádio")
             try:
-                self.ser = serial.Serial(self.port_combo.get(), 9600); self.is_connected=True
+                k.connect(port); self.radio_ports[k.name] = port
                 self.btn_connect.config(text="Desconectar", bg="#ffaaaa")
-                self.log_system(f"Conectado: {self.port_combo.get()}")
-                threading.Thread(target=self.read_serial, daemon=True).start()
-                self.root.after(500, self.send_wpm)
-            except Exception as e: self.log_system(f"Erro: {e}")
+                self.log_system(f"{self.radio_tag(k)}Conectado: {port}")
+                self.root.after(500, self.send_wpm, k)
+                self.root.after(700, self.request_status, k)
+            except Exception as e: self.log_system(f"Erro ao conectar em {port or '?'}: {e}")
         else:
-            self.is_connected=False; 
-            if self.ser: self.ser.close()
-            self.btn_connect.config(text="Conectar", bg="#dddddd"); self.log_system("Desconectado")
-            self.auto_cq_active = False; self.update_auto_cq_ui()
-
-    def send_wpm(self):
-        if self.is_connected: 
+            self.disconnect("Desconectado", k)
+
+    def disconnect(self, msg, k=None):
+        k = k or self.keyer
+        k.close(); self.update_txq_ui()
+        self.log_system(f"{self.radio_tag(k)}{msg}")
+        self.keyer_status.pop(k.name, None)
+        self.radio_buttons[k.name].config(fg="black")
+        if k is self.keyer:
+            self.btn_connect.config(text="Conectar", bg="#dddddd")
+            self.lbl_keyer.config(text="Keyer: --", fg="gray")
+        if self.cq_radio == k.name:
+            self.autocq.stop(); self.update_auto_cq_ui()
+
+    def send_wpm(self, k=None):
+        # Sem `k`: o WPM da tela vale para o rádio em foco
+        if k is None:
+            k = self.keyer
+            try: k.wpm = int(self.wpm_var.get())
+            except Exception: return
+        if k.link.is_open:
             try:
-                val = int(self.wpm_var.get())
-                self.ser.write(f"/wpm {val}\n".encode())
-                self.log_system(f"WPM definido: {val}")
-            except: pass
+                k.set_wpm(k.wpm)
+                self.log_system(f"{self.radio_tag(k)}WPM definido: {k.wpm}")
+            except Exception: pass  # erro de porta chega pela fila do leitor
 
-    def send_text(self):
-        if self.txt_input.get(): self.send_raw(self.txt_input.get()); self.txt_input.delete(0, tk.END)
+    def request_status(self, k=None):
+        k = k or self.keyer
+        if k.link.is_open:
+            try: k.link.write(b"/status\n")
+            except Exception: pass  # erro de porta chega pela fila do leitor
 
-    def send_raw(self, t):
-        if self.is_connected: 
-            self.ser.write((t+"\n").encode())
-            self.log_user(f"TX: {t}")
-        else: self.log_system("Erro: Não conectado")
+    def send_text(self):
+        text = self.txt_input.get("1.0", "end-1c")
+        if self.stream_var.get() == STREAM_MODES[0]:
+            if text: self.send_raw(text, trace=self.user_trace())
+        elif not self.is_connected:
+            if text: self.log_system("Erro: Não conectado")
+        else:
+            self.stream_input(final=True)
+            if text.strip(): self.log_user(f"TX~: {text.strip()}")
+        self.txt_input.delete("1.0", "end"); self.txt_input.mark_set("sent_end", "1.0")
+
+    def on_input_key(self, event):
+        # O que já foi para o keyer não pode ser apagado nem editado
+        t = self.txt_input
+        if event.keysym in ("Return", "Left", "Right", "Home", "End") or event.state & 0x4: return
+        if t.compare("sent_end", ">", "1.0"):
+            if t.tag_ranges("sel") and t.compare("sel.first", "<", "sent_end"): return "break"
+            if event.keysym == "BackSpace" and t.compare("insert", "<=", "sent_end"): return "break"
+            if t.compare("insert", "<", "sent_end"): t.mark_set("insert", "end-1c")
+        if self.stream_var.get() != STREAM_MODES[0]: self.root.after_idle(self.stream_input)
+
+    def stream_input(self, final=False):
+        """Modo contínuo: envia cada palavra (ao digitar o espaço) ou cada
+        caractere ao keyer enquanto o operador continua digitando."""
+        mode = self.stream_var.get()
+        if mode == STREAM_MODES[0] or not self.is_connected: return
+        t = self.txt_input
+        pending = t.get("sent_end", "end-1c")
+        if not final and mode == STREAM_MODES[1]:
+            pending = pending[:pending.rfind(" ") + 1]  # só palavras completas
+        full = t.get("1.0", "end-1c")
+        if final and full and not full.endswith(" "):
+            pending += " "  # fecha a palavra: o próximo texto não emenda nela
+        if not pending: return
+        self.tx.stream(pending, duration_ms(compile_timeline(pending, self.wpm_var.get())))
+        t.mark_set("sent_end", f"sent_end + {len(pending)} chars")
+        t.tag_add("sent", "1.0", "sent_end")
+        if len(t.get("1.0", "sent_end")) > 60:
+            t.delete("1.0", "sent_end - 40 chars")  # mantém só o fim do texto enviado
+        self.update_txq_ui()
+
+    def send_raw(self, t, radio=None, trace=None, encoded=None):
+        # `radio`: o rádio da macro; sem ele, o rádio em foco. `encoded`: (payloads, ms) já prontos.
+        # Retorna True se a mensagem entrou na fila de TX
+        k = self.radios.get(radio)
+        if not k.link.is_open:
+            self.log_system(f"Erro: {self.radio_tag(k)}Não conectado"); return False
+        binary = self.binary_var.get()
+        # Modo timeline: o PC compila; mensagens longas viram vários quadros
+        payloads, ms = encoded or build_payloads(t, k.wpm, binary, self.settings.get("weight", 50), self.settings.get("farnsworth", 0))
+        if binary:
+            bad = unknown_chars(t)
+            if bad: self.log_system(f"Ignorados (sem código Morse): {' '.join(bad)}")
+        self.handle_tx_events(k.tx.submit(t, payloads, ms, trace if trace is not None else self.latency.trace()), k)
+        return k.tx.busy or bool(k.tx.pending)  # falha na escrita esvazia a fila
+
+    def handle_tx_events(self, events, k=None):
+        if not events: return
+        k = k or self.keyer
+        tag = self.radio_tag(k)
+        for kind, item, info in events:
+            if kind == "sent":
+                suffix = f" ({item.est_ms / 1000:.1f} s)" if self.binary_var.get() else ""
+                self.log_user(f"{tag}TX: {item.text}{suffix}")
+            elif kind == "error":
+                self.log_system(f"{tag}Arduino recusou '{item.text}': {info}")
+            elif kind == "timeout":
+                self.log_system(f"{tag}Sem DONE para '{item.text}', liberando a fila")
+            if kind in ("done", "timeout", "error"):
+                self.latency.finish(item.trace)
+                if k.name == self.cq_radio: self.autocq.finished(item, kind)
+            elif kind == "abort":
+                if info is None: self.log_system(f"{tag}ABORT sem confirmação do Arduino (firmware antigo?)")
+                else: self.log_system(f"{tag}ABORT confirmado: relé solto em {info * 1000:.0f} ms")
+        self.update_txq_ui()
+
+    def update_txq_ui(self):
+        n = len(self.tx)
+        label = f"Fila TX {self.keyer.name}" if len(self.radios.keyers) > 1 else "Fila TX"
+        if not n: return self.lbl_txq.config(text=f"{label}: vazia", fg="gray")
+        items = " | ".join(t[:20] for t in self.tx.preview(3))
+        self.lbl_txq.config(text=f"{label}: {n}  [{items}{' | ...' if n > 3 else ''}]", fg="#0055aa")
 
     def toggle_auto_cq(self):
-        if not self.is_connected: return self.log_system("Conecte primeiro!")
-        
-        self.auto_cq_active = not self.auto_cq_active
-        self.update_auto_cq_ui()
-
-        if self.auto_cq_active:
-            self.log_system(">>> AUTO CQ INICIADO <<<")
-            self.loop_auto_cq() 
+        if not self.autocq.active:
+            try: interval_sec = int(self.entry_cq_interval.get())
+            except: interval_sec = 15
+            rotation = parse_rotation(self.entry_cq_macros.get(), len(self.settings["macros"]))
+            # Roda no rádio da primeira macro do rodízio ou, se ela não tem rádio, no rádio em foco
+            k = self.radios.get(self.settings["macros"][rotation[0]].get("radio") if self.settings["macros"] else None)
+            if not k.link.is_open: return self.log_system(f"{self.radio_tag(k)}Conecte primeiro!")
+            self.cq_radio = k.name
+            self.autocq.start(interval_sec, rotation)
+            self.log_system(f">>> {self.radio_tag(k)}AUTO CQ INICIADO ({interval_sec} s de escuta, F{', F'.join(str(i+1) for i in rotation)}) <<<")
+            self.tick_auto_cq()
         else:
+            self.autocq.stop()
             self.log_system(">>> AUTO CQ PARADO <<<")
-            if self.auto_cq_timer:
-                self.root.after_cancel(self.auto_cq_timer)
-                self.auto_cq_timer = None
+        self.update_auto_cq_ui()
 
     def update_auto_cq_ui(self):
-        state = "PARAR" if self.auto_cq_active else "AUTO CQ (OFF)"
-        color = "#ff5555" if self.auto_cq_active else "#ffcccc"
+        active = self.autocq.active
+        state = "PARAR" if active else "AUTO CQ (OFF)"
+        color = "#ff5555" if active else "#ffcccc"
         self.btn_auto_cq.config(text=state, bg=color)
+        if not active: self.cq_countdown = None; self.cq_radio = None; self.lbl_cq_countdown.config(text="")
+
+    def tick_auto_cq(self):
+        # Chamado a cada poll_serial: dispara o próximo CQ e atualiza a contagem
+        if not self.autocq.active: return
+        k = self.radios.get(self.cq_radio)
+        if not (k.link.is_open and self.settings["macros"]): return self.toggle_auto_cq()
+        if self.autocq.due(len(k.tx) > 0):
+            idx = self.autocq.next_macro()
+            if idx < len(self.settings["macros"]):
+                # só passa a esperar o DONE se a macro foi mesmo para a fila;
+                # senão volta a escutar e tenta de novo após o intervalo
+                if self.send_macro(idx, k.name): self.autocq.sent()
+                else: self.autocq.finished(None, "error")
+        left = self.autocq.remaining()
+        text = "TX..." if left is None or len(k.tx) else f"CQ em {left:.0f}s"
+        if text != self.cq_countdown:
+            self.cq_countdown = text; self.lbl_cq_countdown.config(text=text)
+
+    def schedule_poll(self):
+        self.poll_due = self.latency.clock() + SERIAL_POLL_MS / 1000
+        self.root.after(SERIAL_POLL_MS, self.poll_serial)
+
+    def poll_serial(self):
+        # Drena as filas de todos os rádios em lote, numa cadência fixa
+        now = self.latency.clock()
+        self.latency.record("tk_after", max(0.0, now - self.poll_due) * 1000)
+        for k in self.radios.keyers.values():
+            lags = k.link.flush_lags
+            while lags: self.latency.record("io_flush", lags.popleft() * 1000)
+            for kind, data, t in k.link.drain():
+                if kind == "line":
+                    self.latency.record("reader_lag", max(0.0, now - t) * 1000)
+                    if data.startswith("STATUS:"): self.update_keyer_status(data, k); continue
+                    events = k.tx.on_line(data, t)
+                    # DONE de cada pedaço do texto contínuo não polui o terminal
+                    if not (events and events[0][0] == "streamed"): self.log_device(f"{self.radio_tag(k)}{data}")
+                    self.handle_tx_events(events, k)
+                elif kind == "error":
+                    self.disconnect(f"Erro: {data}", k)
+            if k.link.is_open: self.handle_tx_events(k.tx.tick(), k)
+        self.tick_auto_cq()
+        self.drain_logwriter()
+        self.schedule_poll()
+
+    def update_keyer_status(self, line, k=None):
+        # "STATUS: KEYING WPM=20 FILA=5", enviado pelo firmware a cada mudança de estado
+        k = k or self.keyer
+        parts = line.split()[1:]
+        if not parts: return
+        keying = parts[0] == "KEYING"
+        color = "#cc0000" if keying else "#007700"
+        self.keyer_status[k.name] = ("Keyer: " + " ".join(parts), color)
+        self.radio_buttons[k.name].config(fg=color)
+        if k is self.keyer: self.lbl_keyer.config(text=self.keyer_status[k.name][0], fg=color)
+
+    # --- Recepção (decodificador de CW) ---
+    def decode_wav_file(self):
+        path = filedialog.askopenfilename(title="Decodificar CW de um WAV", filetypes=[("WAV", "*.wav"), ("Todos", "*.*")])
+        if not path: return
+        try:
+            from cwcore.decoder import decode_wav
+        except ImportError:
+            return self.log_system("O decodificador precisa do numpy (pip install numpy)")
+        self.log_system(f"Decodificando {os.path.basename(path)}...")
+        tone, wpm = self.settings.get("rx_tone_hz"), self.keyer.wpm
 
-    def loop_auto_cq(self):
-        if self.auto_cq_active and self.is_connected and self.settings["macros"]:
-            self.send_macro(self.settings["macros"][0]["template"])
-            try:
-                interval_sec = int(self.entry_cq_interval.get())
-            except:
-                interval_sec = 15
-            self.auto_cq_timer = self.root.after(interval_sec * 1000, self.loop_auto_cq)
-
-    def read_serial(self):
-        while self.is_connected:
+        def worker():
             try:
-                if self.ser.in_waiting:
-                    line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line: self.root.after(0, self.log_device, line)
-            except: break
+                for text in decode_wav(path, tone, wpm):
+                    self.root.after(0, self.rx_text, text)
+            except Exception as e:
+                self.root.after(0, self.log_system, f"Erro ao decodificar {path}: {e}")
+            self.root.after(0, self.rx_text, None)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def rx_text(self, text):
+        # Texto decodificado entra no terminal em linhas "[RX] ...", quebradas entre palavras
+        if text is not None: self.rx_line += text
+        while len(self.rx_line) > RX_LINE_CHARS:
+            cut = self.rx_line.rfind(" ", 0, RX_LINE_CHARS)
+            if cut <= 0: cut = RX_LINE_CHARS
+            self.log_rx(self.rx_line[:cut]); self.rx_line = self.rx_line[cut:].lstrip()
+        if text is None and self.rx_line.strip():
+            self.log_rx(self.rx_line.strip()); self.rx_line = ""
 
     def log_system(self, msg): self.append_log(f"[SYS] {msg}", "gray")
     def log_user(self, msg): self.append_log(msg, "blue")
     def log_device(self, msg): self.append_log(f"[ARD] {msg}", "green")
-    def append_log(self, text, color):
-        self.log_area.config(state='normal')
-        self.log_area.tag_config(color, foreground=color)
-        self.log_area.insert(tk.END, text + "\n", color)
-        self.log_area.see(tk.END)
-        self.log_area.config(state='disabled')
+    def log_rx(self, msg): self.append_log(f"[RX] {msg}", "purple")
+    def append_log(self, text, color): self.terminal.append(text, color)
 
     # ================== HOTKEYS ==================
     def setup_hotkeys(self):
@@ -507,11 +1312,12 @@ class CWInterfaceApp:
         self.root.bind('<Control-Return>', lambda e: self.log_contact())
         self.root.bind('<Prior>', lambda e: self.change_speed(2)) # PageUp
         self.root.bind('<Next>', lambda e: self.change_speed(-2)) # PageDown
+        for i, name in enumerate(list(self.radios.keyers)[:9]):
+            self.root.bind(f'<Alt-Key-{i+1}>', lambda e, n=name: self.set_focus(n))
 
     def trigger_macro_by_index(self, index):
         if index < len(self.settings["macros"]):
-            template = self.settings["macros"][index]["template"]
-            self.send_macro(template)
+            self.send_macro(index, self.settings["macros"][index].get("radio"), self.user_trace())
 
     def change_speed(self, delta):
         try:
@@ -524,7 +1330,10 @@ class CWInterfaceApp:
 
     def stop_transmission(self):
         self.log_system(">>> PARADA DE EMERGÊNCIA (ESC) <<<")
-        if self.auto_cq_active:
+        # ESC solta o relé de todos os rádios
+        for k in self.radios.connected(): k.abort()
+        self.update_txq_ui()
+        if self.autocq.active:
             self.toggle_auto_cq()
 
     # ================== LOGBOOK SALVAR ==================
@@ -539,44 +1348,54 @@ class CWInterfaceApp:
         time_str = now.strftime("%H%M")
         
         band = self.combo_band.get()
-        freq = self.entry_freq.get().replace(",", ".") 
+        freq = self.entry_freq.get()
         mode = "CW"
         rst_s = self.entry_rst_sent.get().strip() or "599"
         rst_r = self.entry_rst_rcvd.get().strip() or "599"
         my_grid = self.entry_grid.get()
 
-        # ADIF
-        adif_record = (
-            f"<CALL:{len(dx_call)}>{dx_call} "
-            f"<QSO_DATE:8>{date_str} "
-            f"<TIME_ON:4>{time_str} "
-            f"<BAND:{len(band)}>{band} "
-            f"<FREQ:{len(freq)}>{freq} "
-            f"<MODE:2>{mode} "
-            f"<RST_SENT:{len(rst_s)}>{rst_s} "
-            f"<RST_RCVD:{len(rst_r)}>{rst_r} "
-            f"<MY_GRIDSQUARE:{len(my_grid)}>{my_grid} "
-            "<EOR>\n"
-        )
+        # ADIF (FREQ em MHz; o campo do painel é em kHz)
+        fields = qso_fields(dx_call, date_str, time_str, band, freq, mode, rst_s, rst_r, my_grid)
+        d = self.dxcc.lookup(dx_call)
+        if d: fields.update({"COUNTRY": d.name, "CONT": d.cont, "CQZ": d.cq, "ITUZ": d.itu})
+        serial = int(self.macro_values["nr"]) if self.uses_serial() else None
+        if serial is not None: fields["STX"] = serial
+        adif_record = format_record(fields)
 
         try:
-            if not os.path.exists(LOGBOOK_FILE):
-                with open(LOGBOOK_FILE, "w") as f:
-                    f.write("ADIF 2.0 Export\n<PROGRAMID:5>PP2LA\n<EOH>\n\n")
-
-            with open(LOGBOOK_FILE, "a") as f:
-                f.write(adif_record)
-            
-            self.lbl_log_status.config(text=f"QSO {dx_call} Salvo!", fg="green")
-            self.clear_qso_fields()
-            self.load_logbook()
-            self.root.after(3000, lambda: self.lbl_log_status.config(text=""))
-            
+            # Só o journal local é escrito aqui; o logbook é gravado em segundo plano
+            self.logwriter.submit(adif_record)
         except Exception as e:
-            messagebox.showerror("Erro ao Logar", str(e))
+            return messagebox.showerror("Erro ao Logar", str(e))
+
+        self.worked.add(dx_call, band, mode)
+        self.lbl_log_status.config(text=f"QSO {dx_call} Salvo!", fg="green")
+        self.last_call = dx_call
+        if serial is not None:
+            self.settings["serial"] = serial + 1
+            self.entry_nr.delete(0, tk.END); self.entry_nr.insert(0, str(serial + 1))
+        self.clear_qso_fields()
+        self.update_macro_values()
+        self.update_log_backlog()
+        self.root.after(3000, lambda: self.lbl_log_status.config(text=""))
+
+    def drain_logwriter(self):
+        written = False
+        for kind, data, _ in self.logwriter.drain():
+            if kind == "written": written = True
+            elif kind == "error": self.log_system(data)
+        if written: self.refresh_logbook(); self.render_stats()
+        self.update_log_backlog()
+
+    def update_log_backlog(self):
+        n = self.logwriter.backlog
+        if n == self.log_backlog: return
+        self.log_backlog = n
+        self.lbl_log_backlog.config(text=f"Gravando: {n}" if n else "")
 
     def clear_qso_fields(self):
         self.entry_dx.delete(0, tk.END)
+        self.check_worked()
         self.entry_rst_sent.delete(0, tk.END); self.entry_rst_sent.insert(0, "599")
         self.entry_rst_rcvd.delete(0, tk.END); self.entry_rst_rcvd.insert(0, "599")
         self.entry_dx.focus()
@@ -0,0 +1 @@
+# Núcleo do PP2LA CW Interface (sem dependência de Tk)
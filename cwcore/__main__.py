@@ -0,0 +1,154 @@
+"""Linha de comando do PP2LA CW Interface (sem Tk).
+
+    python -m cwcore ports
+    python -m cwcore send --port COM3 --wpm 22 "CQ CQ DE PP2LA K"
+    python -m cwcore macro --port COM3 F1 --target PY2XX
+    python -m cwcore macro F1 --wav f1.wav    # prévia em áudio (precisa do numpy)
+    python -m cwcore import outro_log.adi
+    python -m cwcore export logbook.adi concurso.cbr --from 2024-10-26 --to 2024-10-27 --contest CQ-WW-CW
+    python -m cwcore lookup CT/PP2LA"""
+import argparse
+import sys
+import time
+
+from cwcore.keyer import Keyer, SETTINGS_FILE, load_settings
+from cwcore.macros import format_macro
+
+
+def _keyer(args, settings):
+    k = Keyer(wpm=args.wpm or settings.get("wpm", 20), binary=args.timeline,
+              weight=settings.get("weight", 50), farnsworth=settings.get("farnsworth", 0))
+    k.connect(args.port)
+    time.sleep(args.settle)  # o Uno reinicia ao abrir a porta
+    k.set_wpm(k.wpm)
+    return k
+
+
+def _transmit(k, text, timeout):
+    def show(ev):
+        kind, _, info = ev
+        if kind == "line": print(f"[ARD] {info}")
+        elif kind in ("timeout", "error"): print(f"[SYS] {kind}: {info or ''}", file=sys.stderr)
+    try:
+        for ev in k.send(text): show(ev)
+        ok = k.wait_idle(timeout, show)
+    except KeyboardInterrupt:
+        k.abort(); k.wait_idle(2); ok = False
+    k.close()
+    return 0 if ok else 1
+
+
+def cmd_ports(args, settings):
+    from cwcore.serial_link import list_ports
+    for p in list_ports(): print(p)
+    return 0
+
+
+def cmd_send(args, settings):
+    return _transmit(_keyer(args, settings), " ".join(args.text), args.timeout)
+
+
+def cmd_macro(args, settings):
+    macros = settings.get("macros", [])
+    key = args.key.upper().lstrip("F")
+    if not key.isdigit() or not 1 <= int(key) <= len(macros):
+        print(f"Macro inexistente: {args.key}", file=sys.stderr); return 2
+    try:
+        text = format_macro(macros[int(key) - 1]["template"], settings.get("callsign", ""), settings.get("name", ""),
+                            settings.get("grid", ""), args.target, args.rst, args.nr or settings.get("serial", 1))
+    except ValueError as e:
+        print(f"Macro {args.key} inválida: {e}", file=sys.stderr); return 2
+    if args.wav:
+        from cwcore.sidetone import Sidetone, text_runs
+        secs = Sidetone(freq=settings.get("sidetone_hz", 700)).write_wav(
+            args.wav, text_runs(text, args.wpm or settings.get("wpm", 20),
+                                settings.get("weight", 50), settings.get("farnsworth", 0)))
+        print(f"{args.wav}: {text} ({secs:.1f} s)")
+        return 0
+    if not args.port:
+        print("Informe --port (ou --wav para só gerar o áudio)", file=sys.stderr); return 2
+    print(f"TX: {text}")
+    return _transmit(_keyer(args, settings), text, args.timeout)
+
+
+def cmd_import(args, settings):
+    from cwcore.adif import import_adif, qso_key
+    from cwcore.logbook import LogbookIndex, COL_CALL, COL_DATE, COL_TIME, COL_BAND, COL_MODE
+    idx = LogbookIndex(args.log); idx.refresh()
+    known = {qso_key(r[COL_CALL], r[COL_DATE], r[COL_TIME], r[COL_BAND], r[COL_MODE]) for r in idx.rows}
+    imported, skipped = import_adif(args.src, args.log, known)
+    print(f"{imported} QSOs importados, {skipped} ignorados")
+    return 0
+
+
+def cmd_export(args, settings):
+    from cwcore.export import export_log, record_filter
+    keep = record_filter(args.date_from, args.date_to, args.band, args.call)
+    show = (lambda f: print(f"\r{f:4.0%}", end="", file=sys.stderr, flush=True)) if sys.stderr.isatty() else None
+    exported, scanned = export_log(args.log, args.dest, args.format, keep, show,
+                                   call=settings.get("callsign", ""), name=settings.get("name", ""),
+                                   grid=settings.get("grid", ""), contest=args.contest, band=args.band,
+                                   exchange=args.exch, transmitter=args.transmitter)
+    if show: print(file=sys.stderr)
+    print(f"{args.dest}: {exported} de {scanned} QSOs exportados")
+    return 0
+
+
+def cmd_lookup(args, settings):
+    from cwcore.dxcc import DxccResolver
+    r = DxccResolver().load(args.cty or settings.get("cty_file") or "cty.dat")
+    for call in args.calls:
+        d = r.lookup(call)
+        print(f"{call}: {d.name} ({d.cont}) CQ{d.cq} ITU{d.itu}" if d else f"{call}: ?")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m cwcore", description="PP2LA CW Interface sem interface gráfica")
+    ap.add_argument("--settings", default=SETTINGS_FILE)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("ports", help="lista as portas seriais")
+
+    def tx_args(p, port_required=True):
+        p.add_argument("--port", required=port_required)
+        p.add_argument("--wpm", type=int, default=0, help="padrão: o do settings.json")
+        p.add_argument("--timeline", action="store_true", help="envia a linha do tempo compilada (protocolo binário)")
+        p.add_argument("--timeout", type=float, default=120, help="s até desistir do DONE")
+        p.add_argument("--settle", type=float, default=2.0, help="s de espera após abrir a porta")
+
+    p = sub.add_parser("send", help="transmite um texto e espera o DONE"); tx_args(p)
+    p.add_argument("text", nargs="+")
+    p = sub.add_parser("macro", help="transmite uma macro do settings.json (ex.: F1)"); tx_args(p, False)
+    p.add_argument("key")
+    p.add_argument("--wav", default="", help="em vez de transmitir, grava o áudio da macro neste arquivo")
+    p.add_argument("--target", default="")
+    p.add_argument("--rst", default="599")
+    p.add_argument("--nr", type=int, default=0, help="número de série ({nr}); padrão: o do settings.json")
+    p = sub.add_parser("import", help="importa um ADIF no logbook, sem duplicar")
+    p.add_argument("src")
+    p.add_argument("--log", default="logbook.adi")
+    p = sub.add_parser("export", help="exporta o logbook (Cabrillo, CSV ou ADIF), com filtros")
+    p.add_argument("log")
+    p.add_argument("dest", help="arquivo de saída; o formato vem da extensão (.cbr/.log, .csv, .adi)")
+    p.add_argument("--format", choices=("adif", "csv", "cabrillo"), default=None)
+    p.add_argument("--from", dest="date_from", default="", help="data inicial (AAAA-MM-DD)")
+    p.add_argument("--to", dest="date_to", default="", help="data final, inclusive")
+    p.add_argument("--band", default="")
+    p.add_argument("--call", default="", help="indicativo(s), com curingas: \"PY*,PU*\"")
+    p.add_argument("--contest", default="", help="CONTEST: do Cabrillo")
+    p.add_argument("--exch", default="", help="troca enviada, se o registro não tem STX")
+    p.add_argument("--transmitter", default="ONE", choices=("ONE", "TWO", "LIMITED", "UNLIMITED", "SWL"),
+                   help="CATEGORY-TRANSMITTER do Cabrillo (TWO/UNLIMITED: ID do transmissor em cada QSO)")
+    p = sub.add_parser("lookup", help="entidade DXCC de indicativos")
+    p.add_argument("calls", nargs="+")
+    p.add_argument("--cty", default="")
+
+    args = ap.parse_args(argv)
+    settings = load_settings(args.settings)
+    return {"ports": cmd_ports, "send": cmd_send, "macro": cmd_macro,
+            "import": cmd_import, "export": cmd_export, "lookup": cmd_lookup}[args.cmd](args, settings)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import os
+import re
+from operator import getitem, gt
+
+ADIF_HEADER = "ADIF 2.0 Export\n<PROGRAMID:5>PP2LA\n<EOH>\n\n"
+CHUNK_SIZE = 1 << 16
+
+# <NOME:TAMANHO[:TIPO]>valor. O valor capturado vai até o próximo '<'; se o
+# tamanho declarado for maior (valor contém '<'), vale o tamanho declarado.
+_FIELD_RE = re.compile(rb"<([A-Za-z0-9_]+):(\d+)(?::[^>]*)?>([^<]*)")
+_FIELD_STR_RE = re.compile(r"<([A-Za-z0-9_]+):(\d+)(?::[^>]*)?>([^<]*)")
+_TAG_RE = re.compile(rb"<([A-Za-z0-9_]+)(?::(\d+)(?::[^>]*)?)?>")
+_END_RE = re.compile(rb"<(EOR|EOH)>", re.IGNORECASE)
+
+
+class _Names(dict):
+    # Cache de nomes de campo (bytes ou str) -> str em maiúsculas
+    def __missing__(self, raw):
+        name = self[raw] = (raw.decode("ascii") if isinstance(raw, bytes) else raw).upper()
+        return name
+
+
+_NAMES = _Names()
+
+
+def _decode(v):
+    return v.decode("utf-8", errors="ignore")
+
+
+def _fast_fields(chunk):
+    # Caminho rápido: tokeniza o trecho entre dois <EOR> de uma vez, sem laço
+    # em Python por campo. Retorna None se algum valor não bate com o tamanho
+    # declarado (valor contendo '<'), para o chamador usar o caminho estrito.
+    ascii = chunk.isascii()
+    toks = _FIELD_STR_RE.findall(chunk.decode("ascii")) if ascii else _FIELD_RE.findall(chunk)
+    if chunk.count(b"<") != len(toks): return None
+    if not toks: return {}
+    raws, lens, vals = zip(*toks)
+    lens = tuple(map(int, lens))
+    if any(map(gt, lens, map(len, vals))): return None
+    vals = map(getitem, vals, map(slice, lens))
+    if not ascii: vals = map(_decode, vals)
+    return dict(zip(map(_NAMES.__getitem__, raws), vals))
+
+
+def _scan_record(buf, pos, eof):
+    # Caminho estrito: segue os tamanhos declarados tag a tag até o <EOR>.
+    # Retorna (campos, inicio, fim) ou None se faltam dados no buffer.
+    fields = {}
+    rec_start = None
+    while True:
+        m = _TAG_RE.search(buf, pos)
+        if m is None: return None
+        if rec_start is None: rec_start = m.start()
+        raw, length = m.groups()
+        if length is None:
+            name = _NAMES[raw]
+            if name == "EOR": return fields, rec_start, m.end()
+            if name == "EOH": fields, rec_start = {}, None
+            pos = m.end()
+            continue
+        vend = m.end() + int(length)
+        if vend > len(buf) and not eof: return None
+        fields[_NAMES[raw]] = buf[m.end():vend].decode("utf-8", errors="ignore")
+        pos = vend
+
+
+def iter_records(f, start=0, chunk_size=CHUNK_SIZE):
+    """Lê registros ADIF de um arquivo binário, um por vez.
+
+    Segue o tamanho declarado em cada campo (valores podem conter '<').
+    Gera (offset_inicio, offset_fim, campos) com offsets em bytes e os
+    nomes dos campos em maiúsculas. A memória fica limitada a alguns chunks."""
+    f.seek(start)
+    buf = b""
+    base = start      # offset do buf[0] no arquivo
+    eof = False
+
+    while not eof:
+        data = f.read(chunk_size)
+        if not data: eof = True
+        buf += data
+        pos = 0
+        while True:
+            m = _END_RE.search(buf, pos)
+            if m is None: break
+            chunk = buf[pos:m.start()]
+            if m.group(1).upper() == b"EOH":
+                pos = m.end(); continue
+            fields = _fast_fields(chunk)
+            if fields is not None:
+                lt = chunk.find(b"<")
+                rec_start, end = pos + (lt if lt != -1 else len(chunk)), m.end()
+            else:
+                res = _scan_record(buf, pos, eof)
+                if res is None: break
+                fields, rec_start, end = res
+            yield base + rec_start, base + end, fields
+            pos = end
+        buf, base = buf[pos:], base + pos
+
+
+def read_records(path, start=0):
+    with open(path, "rb") as f:
+        yield from iter_records(f, start)
+
+
+def format_record(fields):
+    parts = []
+    for name, value in fields.items():
+        value = str(value)
+        parts.append(f"<{name}:{len(value.encode('utf-8'))}>{value} ")
+    return "".join(parts) + "<EOR>\n"
+
+
+def freq_mhz(value, band=""):
+    """FREQ em MHz (float), ou None se vazia ou inválida. Registros antigos
+    do logbook têm a frequência em kHz (como digitada em "Freq (kHz)"):
+    valores a partir de 1000 são convertidos, exceto nas bandas em cm/mm."""
+    try:
+        f = float(str(value).replace(",", "."))
+    except ValueError:
+        return None
+    return f / 1000 if f >= 1000 and not band.upper().endswith(("CM", "MM")) else f
+
+
+def qso_fields(call, date, time, band, freq_khz, mode, rst_sent, rst_rcvd, grid):
+    """Campos ADIF de um QSO digitado no painel; a frequência vem em kHz e
+    é gravada em MHz, como o ADIF pede (omitida se inválida)."""
+    fields = {"CALL": call, "QSO_DATE": date, "TIME_ON": time, "BAND": band}
+    try:
+        khz = float(str(freq_khz).replace(",", "."))
+        fields["FREQ"] = f"{khz / 1000:.3f}" if khz == round(khz) else f"{khz / 1000:.4f}"
+    except ValueError:
+        pass
+    fields.update({"MODE": mode, "RST_SENT": rst_sent, "RST_RCVD": rst_rcvd, "MY_GRIDSQUARE": grid})
+    return fields
+
+
+def qso_key(call, date, time, band, mode):
+    # Identifica um QSO para evitar duplicatas na importação
+    return (call.strip().upper(), date.strip(), time.strip()[:4], band.strip().upper(), mode.strip().upper())
+
+
+def import_adif(src, dest, known_keys, batch=1000, progress=None):
+    """Anexa a `dest` os registros de `src` que ainda não existem.
+
+    `known_keys` é um conjunto de qso_key() já presentes no logbook (é
+    atualizado). Retorna (importados, ignorados)."""
+    total = os.path.getsize(src) or 1
+    imported = skipped = 0
+    pending = []
+
+    new_file = not os.path.exists(dest)
+    with open(dest, "a", encoding="utf-8") as out:
+        if new_file: out.write(ADIF_HEADER)
+        for _, end, rec in read_records(src):
+            if not rec.get("CALL", "").strip():
+                skipped += 1; continue
+            key = qso_key(rec.get("CALL", ""), rec.get("QSO_DATE", ""), rec.get("TIME_ON", ""),
+                          rec.get("BAND", ""), rec.get("MODE", ""))
+            if key in known_keys:
+                skipped += 1; continue
+            known_keys.add(key)
+            pending.append(format_record(rec))
+            imported += 1
+            if len(pending) >= batch:
+                out.write("".join(pending)); pending = []
+                if progress: progress(end / total)
+        if pending: out.write("".join(pending))
+    if progress: progress(1.0)
+    return imported, skipped
@@ -0,0 +1,69 @@
+import time
+
+
+def parse_rotation(text, n_macros):
+    """"1,3" -> [0, 2]: teclas F das macros de CQ, na ordem de rodízio.
+    Entradas inválidas são ignoradas; sem nenhuma válida, usa F1."""
+    out = []
+    for part in text.replace(";", ",").split(","):
+        part = part.strip().upper().lstrip("F")
+        if part.isdigit() and 1 <= int(part) <= n_macros:
+            out.append(int(part) - 1)
+    return out or [0]
+
+
+class AutoCQ:
+    """Agenda do Auto CQ a partir do fim real da transmissão.
+
+    O intervalo de escuta só começa quando o Arduino termina de manipular
+    (DONE) ou, sem DONE, no fim da duração calculada da mensagem. Qualquer
+    transmissão reinicia a escuta, e nunca há CQ enfileirado atrás de outro.
+    Estados: "idle", "tx" (CQ na fila ou no ar) e "listen"."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.state = "idle"
+        self.interval = 15.0
+        self.rotation = [0]
+        self.pos = 0
+        self.listen_until = 0.0
+
+    @property
+    def active(self):
+        return self.state != "idle"
+
+    def start(self, interval, rotation):
+        self.interval = max(0.0, float(interval))
+        self.rotation = list(rotation) or [0]
+        self.pos = 0
+        self.state = "listen"
+        self.listen_until = self.clock()  # primeiro CQ sai já
+
+    def stop(self):
+        self.state = "idle"
+
+    def next_macro(self):
+        idx = self.rotation[self.pos % len(self.rotation)]
+        self.pos += 1
+        return idx
+
+    def due(self, tx_busy):
+        # Hora de chamar: escuta cumprida e nada na fila de TX
+        return self.state == "listen" and not tx_busy and self.clock() >= self.listen_until
+
+    def sent(self):
+        self.state = "tx"
+
+    def finished(self, item, kind):
+        """Uma mensagem terminou ("done", "timeout" ou "error")."""
+        if self.state == "idle": return
+        end = self.clock()
+        if kind == "timeout" and item.sent_at is not None:
+            # sem DONE: usa o fim calculado da manipulação
+            end = min(end, item.sent_at + item.est_ms / 1000)
+        self.state = "listen"
+        self.listen_until = end + self.interval
+
+    def remaining(self):
+        if self.state != "listen": return None
+        return max(0.0, self.listen_until - self.clock())
@@ -0,0 +1,375 @@
+"""Bancada de desempenho: logbooks sintéticos e porta serial falsa.
+
+Gera logbooks ADIF com indicativos, bandas e datas realistas e mede, em
+um processo novo por tamanho (para o pico de memória de cada um ficar
+separado), os caminhos que a interface usa. A saída é JSON, para comparar
+uma execução com outra.
+
+    python -m cwcore.bench                               # 1k, 100k e 1M QSOs
+    python -m cwcore.bench --sizes 1000 100000 -o hoje.json
+    python -m cwcore.bench --compare ontem.json hoje.json   # aponta regressões
+    python -m cwcore.bench --generate 100000 teste.adi      # só gera o logbook"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from cwcore.adif import ADIF_HEADER, format_record
+from cwcore.dictionary import CW_DICTIONARY, filter_dictionary
+from cwcore.keyer import Keyer
+from cwcore.latency import LatencyMeter
+from cwcore.logbook import LogbookIndex, insert_sorted, COL_BAND, COL_CALL, COL_MODE
+from cwcore.logwriter import LogWriter
+from cwcore.serial_link import READ_TIMEOUT, SerialLink
+from cwcore.stats import LogStats
+from cwcore.txqueue import ABORT_BYTE, STREAM_PREFIX
+from cwcore.worked import WorkedIndex
+
+BENCH_VERSION = 1
+SIZES = (1000, 100000, 1000000)
+APPEND_QSOS = 50        # QSOs gravados um a um no teste de log_contact
+SERIAL_MESSAGES = 2000
+THRESHOLD = 0.20        # --compare: piora relativa que conta como regressão
+# ...e diferença absoluta mínima, por unidade (abaixo disso é ruído de medida)
+NOISE = {"_s": 0.01, "_ms": 1.0, "_us": 5.0, "_mb": 2.0, "_per_s": 0}
+
+# Prefixos com peso aproximado da atividade em CW, para a distribuição de
+# indicativos (e de bandas por QSO) parecer a de um log real
+PREFIXES = (("PY", 12), ("PU", 5), ("PP", 3), ("K", 10), ("W", 10), ("N", 6), ("AA", 2), ("VE", 3),
+            ("DL", 8), ("G", 4), ("F", 3), ("I", 4), ("EA", 4), ("CT", 2), ("ON", 2), ("PA", 2),
+            ("SP", 3), ("OK", 3), ("UA", 4), ("YO", 1), ("HA", 1), ("9A", 1), ("LU", 3), ("CE", 1),
+            ("CX", 1), ("JA", 5), ("VK", 1), ("ZL", 1), ("ZS", 1), ("EA8", 1), ("KP4", 1), ("4X", 1))
+BANDS = (("160M", 1.810, 2), ("80M", 3.510, 6), ("40M", 7.010, 20), ("30M", 10.110, 8), ("20M", 14.020, 25),
+         ("17M", 18.075, 8), ("15M", 21.030, 14), ("12M", 24.900, 5), ("10M", 28.030, 10), ("6M", 50.090, 2))
+MODES = (("CW", 85), ("SSB", 10), ("FT8", 5))
+FIRST_DAY = 733408     # 2009-01-01 (ordinal): o log cobre uns 15 anos
+
+
+# ================== DADOS SINTÉTICOS ==================
+def _weighted(pairs):
+    items = [p[:-1] if len(p) > 2 else p[0] for p in pairs]
+    return items, [p[-1] for p in pairs]
+
+
+def synthetic_calls(n, seed=1):
+    """`n` indicativos distintos (prefixo + algarismo + 1 a 3 letras)."""
+    rng = random.Random(seed)
+    prefixes, weights = _weighted(PREFIXES)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    calls = set()
+    while len(calls) < n:
+        suffix = "".join(rng.choice(letters) for _ in range(rng.choice((1, 2, 2, 3, 3, 3))))
+        calls.add(f"{rng.choices(prefixes, weights)[0]}{rng.randrange(10)}{suffix}")
+    return sorted(calls)
+
+
+def synthetic_records(n, seed=1, grid="GH63"):
+    """Gera `n` QSOs em ordem cronológica, como um logbook de verdade: uns
+    poucos indicativos aparecem muito (amigos, concursos) e a maioria uma
+    vez só."""
+    rng = random.Random(seed)
+    pool = synthetic_calls(max(50, min(n, 200000) // 3), seed)
+    bands, band_w = _weighted(BANDS)
+    modes, mode_w = _weighted(MODES)
+    span = 15 * 365 * 1440                      # minutos cobertos pelo log
+    step = span / max(1, n)
+    minute = 0.0
+    for _ in range(n):
+        minute += rng.expovariate(1 / step)
+        day, m = divmod(int(minute) % span, 1440)
+        date = datetime.date.fromordinal(FIRST_DAY + day).strftime("%Y%m%d")
+        band, mhz = rng.choices(bands, band_w)[0]
+        mode = rng.choices(modes, mode_w)[0]
+        call = pool[min(len(pool) - 1, int(rng.paretovariate(1.2)) - 1)] if rng.random() < 0.3 else rng.choice(pool)
+        rst = "599" if mode == "CW" else ("59" if mode == "SSB" else "-10")
+        yield {"CALL": call, "QSO_DATE": date, "TIME_ON": f"{m // 60:02d}{m % 60:02d}", "BAND": band,
+               "FREQ": f"{mhz + rng.randrange(60) / 1000:.3f}", "MODE": mode,
+               "RST_SENT": rst, "RST_RCVD": rst, "MY_GRIDSQUARE": grid}
+
+
+def generate_logbook(path, n, seed=1):
+    """Grava um logbook ADIF com `n` QSOs sintéticos. Retorna o tamanho em bytes."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(ADIF_HEADER)
+        batch = []
+        for rec in synthetic_records(n, seed):
+            batch.append(format_record(rec))
+            if len(batch) >= 10000: f.write("".join(batch)); batch = []
+        f.write("".join(batch))
+    return os.path.getsize(path)
+
+
+# ================== PORTA FALSA ==================
+class FakeSerial:
+    """Porta serial em memória que responde como o firmware, sem o tempo de
+    manipulação: cada mensagem escrita gera "TX: ..." e "DONE" na hora.
+    Mede só o caminho do PC (fila de TX, escrita, leitor, eventos)."""
+
+    def __init__(self, port="FAKE", timeout=READ_TIMEOUT):
+        self.port = port
+        self.timeout = timeout
+        self.written = 0
+        self.closed = False
+        self._lines = deque()
+        self._cond = threading.Condition()
+
+    def write(self, data):
+        if self.closed: raise IOError("porta fechada")
+        self.written += len(data)
+        if data == ABORT_BYTE: replies = [b"ABORT\n"]
+        elif data.startswith(b"/"): replies = []                      # comandos (/wpm)
+        elif data.startswith(STREAM_PREFIX): replies = [b"DONE\n"]    # texto contínuo: sem eco
+        elif data.endswith(b"\n"): replies = [b"TX: " + data.strip() + b"\n", b"DONE\n"]
+        else: replies = [f"TX: BIN {len(data)}\n".encode(), b"DONE\n"]
+        with self._cond:
+            self._lines.extend(replies); self._cond.notify()
+        return len(data)
+
+    def readline(self):
+        with self._cond:
+            if not self._lines and not self.closed: self._cond.wait(self.timeout)
+            return self._lines.popleft() if self._lines else b""
+
+    def close(self):
+        with self._cond:
+            self.closed = True; self._cond.notify_all()
+
+
+# ================== MEDIDAS ==================
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def bench_logbook(path):
+    """Mede um logbook já gerado (rodar num processo novo: o pico de
+    memória é o do processo inteiro)."""
+    out = {"records": 0, "file_mb": round(os.path.getsize(path) / 1e6, 2)}
+    # Carga: sem o .idx (primeira abertura) e com ele (toda abertura seguinte)
+    t0 = time.perf_counter()
+    LogbookIndex(path).refresh()
+    out["load_cold_s"] = round(time.perf_counter() - t0, 3)
+    t0 = time.perf_counter()
+    log = LogbookIndex(path)
+    log.refresh()
+    out["load_warm_s"] = round(time.perf_counter() - t0, 3)
+    rows = log.rows
+    out["records"] = len(rows)
+
+    t0 = time.perf_counter()
+    worked = WorkedIndex()
+    worked.build((r[COL_CALL], r[COL_BAND], r[COL_MODE]) for r in rows)
+    out["worked_build_s"] = round(time.perf_counter() - t0, 3)
+    t0 = time.perf_counter()
+    stats = LogStats().rebuild(rows)
+    out["stats_build_s"] = round(time.perf_counter() - t0, 3)
+
+    # Filtro por banda (o que a aba LOGBOOK faz ao trocar o combo) e
+    # ordenação por indicativo (clique no cabeçalho)
+    times = []
+    for band in ["TODAS"] + [b for b, _, _ in BANDS]:
+        t0 = time.perf_counter()
+        keys = list(log.band_rows(band))
+        times.append(time.perf_counter() - t0)
+    out["band_filter_ms"] = _ms(statistics.mean(times))
+    out["band_filter_max_ms"] = _ms(max(times))
+    by_call = lambda i: (log.rows[i][COL_CALL].upper(), i)
+    keys = list(log.band_rows("TODAS"))
+    t0 = time.perf_counter()
+    keys.sort(key=by_call)
+    out["sort_call_ms"] = _ms(time.perf_counter() - t0)
+
+    # log_contact: journal -> gravador em segundo plano -> índice
+    # incremental -> dupes/estatísticas -> lista, um QSO por vez
+    writer = LogWriter(path, fsync="never")
+    writer.start()
+    submit, written, refresh, resort = [], [], [], []
+    records = synthetic_records(APPEND_QSOS, seed=7)
+    for rec in records:
+        rec["QSO_DATE"] = "20240601"
+        t0 = time.perf_counter()
+        writer.submit(format_record(rec))
+        t1 = time.perf_counter()
+        while not any(kind == "written" for kind, _, _ in writer.drain()): time.sleep(0.0005)
+        t2 = time.perf_counter()
+        start = log.refresh()
+        rows = log.rows
+        for r in rows[start:]: worked.add(r[COL_CALL], r[COL_BAND], r[COL_MODE])
+        stats.add_rows(rows[start:])
+        t3 = time.perf_counter()
+        # add_keys da lista ordenada por indicativo
+        insert_sorted(keys, range(start, len(rows)), by_call)
+        refresh.append(t3 - t2); resort.append(time.perf_counter() - t3)
+        submit.append(t1 - t0); written.append(t2 - t1)
+    writer.close()
+    out["append_submit_us"] = round(statistics.mean(submit) * 1e6, 1)
+    out["append_written_ms"] = _ms(statistics.median(written))
+    out["append_refresh_ms"] = _ms(statistics.median(refresh))
+    out["append_refresh_max_ms"] = _ms(max(refresh))
+    out["append_resort_ms"] = _ms(statistics.median(resort))
+    out["peak_rss_mb"] = _peak_rss_mb()
+
+    # Memória do índice em si (heap Python), numa carga a mais com tracemalloc
+    # (só conta o que for alocado depois do start())
+    tracemalloc.start()
+    LogbookIndex(path).refresh()
+    out["index_heap_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+    tracemalloc.stop()
+    return out
+
+
+def bench_dictionary(rounds=2000):
+    """Filtro do dicionário a cada tecla: todos os prefixos de algumas buscas."""
+    queries = [w[:i] for w in ("qrz", "obrigado", "73", "fim", "xyz") for i in range(1, len(w) + 1)]
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        for _ in range(rounds): filter_dictionary(q)
+        times.append((time.perf_counter() - t0) / rounds)
+    return {"entries": len(CW_DICTIONARY), "queries": len(queries),
+            "filter_us": round(statistics.mean(times) * 1e6, 2), "filter_max_us": round(max(times) * 1e6, 2)}
+
+
+def bench_serial(messages=SERIAL_MESSAGES, binary=False, text="TEST DE PP2LA 5NN"):
+    """Vazão do envio contra a porta falsa: mensagens até o DONE por
+    segundo, e a ida e volta escrita -> eco TX: pelo leitor."""
+    link = SerialLink()
+    link.attach(FakeSerial())
+    k = Keyer(wpm=40, binary=binary, link=link)
+    meter = LatencyMeter()
+    done = failed = 0
+    t0 = time.perf_counter()
+    for i in range(messages): k.send(f"{text} {i % 1000:03d}", trace=meter.trace())
+    end = time.monotonic() + 60
+    while done + failed < messages and time.monotonic() < end:
+        for kind, item, _ in k.poll(meter):
+            if kind == "done": done += 1; meter.finish(item.trace)
+            elif kind in ("timeout", "error"): failed += 1
+        time.sleep(0)
+    elapsed = time.perf_counter() - t0
+    written = link.ser.written
+    k.close()
+    echo = meter.hists["echo"].summary()
+    return {"messages": done, "failed": messages - done,
+            "msgs_per_s": round(done / elapsed), "kbytes_per_s": round(written / elapsed / 1000, 1),
+            "echo_p50_ms": echo["p50"], "echo_p99_ms": echo["p99"]}
+
+
+# ================== EXECUÇÃO ==================
+def _child(path):
+    # Cada tamanho num interpretador novo: memória e caches não se misturam
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.environ.get("PYTHONPATH")))))
+    res = subprocess.run([sys.executable, "-m", "cwcore.bench", "--child", path],
+                         capture_output=True, text=True, env=env)
+    if res.returncode: raise RuntimeError(res.stderr.strip() or f"bancada falhou ({res.returncode})")
+    return json.loads(res.stdout)
+
+
+def run_all(sizes=SIZES, workdir=None, progress=None):
+    result = {"version": BENCH_VERSION, "when": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(), "platform": platform.platform(),
+              "machine": platform.machine(), "sizes": {}}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for n in sizes:
+            path = os.path.join(tmp, f"logbook_{n}.adi")
+            t0 = time.perf_counter()
+            generate_logbook(path, n)
+            gen_s = time.perf_counter() - t0
+            if progress: progress(f"{n} QSOs gerados em {gen_s:.1f} s")
+            result["sizes"][str(n)] = dict(_child(path), generate_s=round(gen_s, 2))
+            if progress: progress(f"{n} QSOs medidos")
+    result["dictionary"] = bench_dictionary()
+    result["serial_text"] = bench_serial()
+    result["serial_timeline"] = bench_serial(binary=True)
+    return result
+
+
+# ================== COMPARAÇÃO ==================
+def _flatten(d, prefix=""):
+    for key, value in d.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict): yield from _flatten(value, name + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool): yield name, value
+
+
+def _direction(name):
+    # (+1: maior é pior, como tempos e memória; -1: maior é melhor, como a
+    # vazão; 0: não compara, piso de ruído)
+    leaf = name.rsplit(".", 1)[-1]
+    if leaf.startswith("generate") or leaf == "file_mb": return 0, 0
+    for unit in ("_per_s", "_s", "_ms", "_us", "_mb"):
+        if leaf.endswith(unit): return (-1 if unit == "_per_s" else 1), NOISE[unit]
+    return 0, 0
+
+
+def compare(old, new, threshold=THRESHOLD):
+    """Linhas (métrica, antes, depois, variação relativa, regressão?) das
+    métricas presentes nos dois resultados."""
+    before = dict(_flatten(old))
+    rows = []
+    for name, value in _flatten(new):
+        sign, noise = _direction(name)
+        if not sign or name not in before: continue
+        ref = before[name]
+        change = (value - ref) / ref if ref else 0.0
+        rows.append((name, ref, value, change, sign * change > threshold and abs(value - ref) > noise))
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m cwcore.bench", description="Bancada de desempenho do logbook e da serial")
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="tamanhos dos logbooks (QSOs)")
+    ap.add_argument("-o", "--output", help="grava o JSON neste arquivo (além de mostrar)")
+    ap.add_argument("--workdir", help="pasta dos logbooks temporários (padrão: a do sistema)")
+    ap.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"), help="compara dois resultados")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD, help="piora relativa considerada regressão")
+    ap.add_argument("--generate", nargs=2, metavar=("N", "ARQUIVO"), help="só gera um logbook sintético")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(bench_logbook(args.child)))
+        return 0
+    if args.generate:
+        n, path = int(args.generate[0]), args.generate[1]
+        print(f"{path}: {n} QSOs, {generate_logbook(path, n) / 1e6:.1f} MB")
+        return 0
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f: old = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f: new = json.load(f)
+        rows = compare(old, new, args.threshold)
+        for name, a, b, change, bad in rows:
+            print(f"{'REGRESSÃO' if bad else 'ok':9} {name:42} {a:>12g} -> {b:<12g} {change:+.0%}")
+        bad = sum(r[4] for r in rows)
+        print(f"{bad} regressão(ões) acima de {args.threshold:.0%}" if bad else "sem regressões")
+        return 1 if bad else 0
+
+    result = run_all(args.sizes, args.workdir, progress=lambda msg: print(msg, file=sys.stderr))
+    text = json.dumps(result, indent=1)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
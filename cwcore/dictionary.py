@@ -0,0 +1,28 @@
+CW_DICTIONARY = [
+    ("ABT", "Cerca de / Sobre"), ("AGN", "Novamente"), ("ANT", "Antena"),
+    ("AR", "Fim da mensagem"), ("AS", "Aguarde"), ("BK", "Break / Devolvo"),
+    ("BN", "Entre"), ("C", "Sim / Confirmado"), ("CL", "Fechando estação"),
+    ("CQ", "Chamada Geral"), ("DE", "De"), ("DX", "Estação distante"),
+    ("ES", "E (conjunção)"), ("FB", "Excelente"), ("GA", "Boa tarde"),
+    ("GM", "Bom dia"), ("GN", "Boa noite"), ("HI", "Risada"),
+    ("HW", "Como copiou?"), ("K", "Convite"), ("KN", "Convite específico"),
+    ("LID", "Operador ruim"), ("N", "Não"), ("NW", "Agora"),
+    ("OM", "Amigo / Homem"), ("PSE", "Por favor"), ("PWR", "Potência"),
+    ("R", "Recebido"), ("RST", "Reportagem"), ("RPT", "Repita"),
+    ("RX", "Receptor"), ("SK", "Fim do contato"), ("SRI", "Desculpe"),
+    ("TNX", "Obrigado"), ("TU", "Obrigado"), ("TX", "Transmissor"),
+    ("UR", "Seu / Você é"), ("VY", "Muito"), ("WX", "Clima"),
+    ("73", "Abraços"), ("88", "Beijos"), ("QRL", "Freq. ocupada?"),
+    ("QRM", "Interferência"), ("QRN", "Estática"), ("QRO", "Aumentar pot."),
+    ("QRP", "Baixa pot."), ("QRT", "Desligar"), ("QRV", "Pronto"),
+    ("QRZ", "Quem chama?"), ("QSB", "Fading"), ("QSL", "Confirmado"),
+    ("QSO", "Contato"), ("QSY", "Mudar freq."), ("QTH", "Localização")
+]
+
+
+def filter_dictionary(query, entries=CW_DICTIONARY):
+    """Entradas cuja abreviação ou significado contém `query` (sem
+    diferenciar maiúsculas)."""
+    q = query.strip().lower()
+    if not q: return list(entries)
+    return [(a, m) for a, m in entries if q in a.lower() or q in m.lower()]
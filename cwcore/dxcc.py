@@ -0,0 +1,143 @@
+import json
+import os
+import re
+from collections import namedtuple
+
+CACHE_VERSION = 1
+
+# Resultado de uma consulta (zonas/continente já com os overrides do prefixo)
+Dxcc = namedtuple("Dxcc", "name cq itu cont prefix")
+# Tabelas carregadas, trocadas de uma vez (load roda fora da thread do Tk)
+Tables = namedtuple("Tables", "entities prefixes exact maxlen")
+
+# Sufixos que não mudam a entidade (PP2LA/P, /M, /QRP...)
+IGNORED_SUFFIXES = {"P", "M", "QRP", "QRPP", "A", "B", "R", "T", "J", "LH", "LGT", "PM", "1A"}
+NO_ENTITY_SUFFIXES = {"MM", "AM"}  # marítimo/aeronáutico móvel: sem DXCC
+
+_ALIAS_RE = re.compile(r"^(=?)([A-Z0-9/]+)(.*)$")
+_OVR_RE = re.compile(r"\((\d+)\)|\[(\d+)\]|\{(\w+)\}|<[^>]*>|~[^~]*~")
+
+
+def parse_cty(text):
+    """Lê um arquivo no formato cty.dat (AD1C / country-files.com).
+
+    Retorna (entidades, prefixos, chamadas exatas). Cada entidade é
+    [nome, cq, itu, continente, prefixo principal]; prefixos e chamadas
+    apontam para o índice da entidade ou, se o alias tem overrides de zona
+    ou continente, para [índice, cq, itu, continente]."""
+    entities, prefixes, exact = [], {}, {}
+    header, aliases = None, []
+
+    def flush():
+        idx = len(entities)
+        name, cq, itu, cont = header[0].strip(), int(header[1]), int(header[2]), header[3].strip()
+        primary = header[7].strip().lstrip("*")
+        entities.append([name, cq, itu, cont, primary])
+        for alias in "".join(aliases).rstrip(";").split(","):
+            m = _ALIAS_RE.match(alias.strip())
+            if not m: continue
+            is_exact, key, rest = m.groups()
+            value = idx
+            if rest:
+                ocq, oitu, ocont = cq, itu, cont
+                for o in _OVR_RE.finditer(rest):
+                    if o.group(1): ocq = int(o.group(1))
+                    elif o.group(2): oitu = int(o.group(2))
+                    elif o.group(3): ocont = o.group(3)
+                if (ocq, oitu, ocont) != (cq, itu, cont): value = [idx, ocq, oitu, ocont]
+            (exact if is_exact else prefixes)[key] = value
+
+    for line in text.splitlines():
+        if not line.strip(): continue
+        if line[0].isspace():
+            aliases.append(line.strip())
+            if line.rstrip().endswith(";"):
+                flush(); header, aliases = None, []
+        else:
+            header = line.split(":")
+    return entities, prefixes, exact
+
+
+class DxccResolver:
+    """Resolve indicativos em entidades DXCC pelo prefixo mais longo.
+
+    Os prefixos ficam num dict (trie em hash): a consulta testa do prefixo
+    mais longo possível ao mais curto, no máximo `maxlen` acessos ao dict.
+    O arquivo é compilado num cache JSON ao lado dele e recarregado direto
+    do cache enquanto o tamanho/mtime do cty.dat não mudarem.
+
+    As tabelas ficam num único atributo (`tables`): um load() em outra
+    thread publica as novas numa só atribuição, e cada consulta usa um
+    conjunto coerente do começo ao fim."""
+
+    def __init__(self):
+        self.tables = Tables([], {}, {}, 0)
+        self.source = None
+
+    def __len__(self):
+        return len(self.tables.entities)
+
+    def load(self, path, cache_path=None):
+        cache_path = cache_path or path + ".json"
+        st = os.stat(path)
+        sig = [CACHE_VERSION, st.st_size, st.st_mtime_ns]
+        data = None
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("sig") != sig: data = None
+        except (OSError, ValueError):
+            data = None
+        if data is None:
+            with open(path, "r", encoding="latin-1") as f:
+                entities, prefixes, exact = parse_cty(f.read())
+            data = {"sig": sig, "entities": entities, "prefixes": prefixes, "exact": exact}
+            try:
+                with open(cache_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+            except OSError:
+                pass  # sem permissão de escrita: só não há cache
+        prefixes = data["prefixes"]
+        self.tables = Tables(data["entities"], prefixes, data["exact"], max(map(len, prefixes), default=0))
+        self.source = path
+        return self
+
+    @staticmethod
+    def _result(t, value):
+        if isinstance(value, int):
+            name, cq, itu, cont, primary = t.entities[value]
+        else:
+            name, _, _, _, primary = t.entities[value[0]]
+            cq, itu, cont = value[1], value[2], value[3]
+        return Dxcc(name, cq, itu, cont, primary)
+
+    def _longest(self, t, call):
+        prefixes = t.prefixes
+        for n in range(min(len(call), t.maxlen), 0, -1):
+            value = prefixes.get(call[:n])
+            if value is not None: return self._result(t, value)
+        return None
+
+    def lookup(self, call):
+        """Entidade de `call` (Dxcc) ou None se desconhecida."""
+        call = call.strip().upper()
+        if not call: return None
+        t = self.tables
+        value = t.exact.get(call)
+        if value is not None: return self._result(t, value)
+        if "/" not in call: return self._longest(t, call)
+
+        parts = [p for p in call.split("/") if p]
+        if any(p in NO_ENTITY_SUFFIXES for p in parts[1:]): return None
+        parts = [parts[0]] + [p for p in parts[1:] if p not in IGNORED_SUFFIXES]
+        if len(parts) == 1:
+            value = t.exact.get(parts[0])
+            return self._result(t, value) if value is not None else self._longest(t, parts[0])
+        base, other = parts[0], parts[1]
+        if other.isdigit() and len(other) == 1:
+            # PP2LA/5: mesma estação em outra área de chamada
+            m = re.search(r"\d", base)
+            return self._longest(t, base[:m.start()] + other if m else base + other)
+        # CT/PP2LA ou PP2LA/CT3: a parte mais curta é o prefixo do local
+        prefix = base if len(base) <= len(other) else other
+        return self._longest(t, prefix)
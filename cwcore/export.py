@@ -0,0 +1,232 @@
+"""Exportação do logbook: Cabrillo 3.0, CSV e ADIF filtrado.
+
+Os registros vêm do ADIF em fluxo (iter_records) direto para o formato de
+saída, um por vez: a memória não depende do tamanho do log.
+
+    python -m cwcore export logbook.adi concurso.cbr --from 2024-10-26 --to 2024-10-27 --contest CQ-WW-CW
+    python -m cwcore export logbook.adi qsos.csv --band 20m
+    python -m cwcore export logbook.adi py.adi --call "PY*"
+    python -m cwcore.export --selftest   # ida e volta: QSO do painel -> ADIF -> Cabrillo"""
+import argparse
+import csv
+import fnmatch
+import os
+import re
+import sys
+import tempfile
+
+from cwcore.adif import ADIF_HEADER, format_record, freq_mhz, iter_records, qso_fields
+from cwcore.logbook import LOG_FIELDS
+
+PROGRESS_EVERY = 5000   # registros entre chamadas de progress()/cancel
+CSV_FIELDS = LOG_FIELDS + ("COUNTRY", "CONT", "CQZ", "ITUZ", "STX", "SRX", "COMMENT")
+EXTENSIONS = {".adi": "adif", ".adif": "adif", ".csv": "csv", ".cbr": "cabrillo", ".log": "cabrillo"}
+
+# Cabrillo: frequência em kHz no HF; acima de 30 MHz, a designação da banda
+CABRILLO_BANDS = {"6M": "50", "4M": "70", "2M": "144", "1.25M": "222", "70CM": "432", "33CM": "902", "23CM": "1.2G"}
+BAND_KHZ = {"160M": 1800, "80M": 3500, "60M": 5351, "40M": 7000, "30M": 10100, "20M": 14000,
+            "17M": 18068, "15M": 21000, "12M": 24890, "10M": 28000}
+MULTI_TX = {"TWO", "UNLIMITED"}   # CATEGORY-TRANSMITTER com coluna de transmissor no QSO:
+CABRILLO_MODES = {"CW": "CW", "SSB": "PH", "USB": "PH", "LSB": "PH", "AM": "PH", "FM": "FM", "RTTY": "RY"}
+
+
+def record_filter(date_from="", date_to="", band="", call=""):
+    """Predicado rec -> bool para o intervalo de datas (inclusive; aceita
+    AAAA-MM-DD ou AAAAMMDD), a banda ("TODAS" ou vazio: qualquer uma) e o
+    indicativo (exato ou com curingas * e ?; vários separados por vírgula).
+    Retorna None se não há filtro."""
+    date_from, date_to = date_from.replace("-", "").strip(), date_to.replace("-", "").strip()
+    band = band.strip().upper()
+    if band == "TODAS": band = ""
+    pats = [c.strip().upper() for c in call.split(",") if c.strip()]
+    exact = {p for p in pats if not any(ch in p for ch in "*?[")}
+    wild = re.compile("|".join(fnmatch.translate(p) for p in pats if p not in exact)) if len(exact) < len(pats) else None
+    if not (date_from or date_to or band or pats): return None
+
+    def keep(rec):
+        date = rec.get("QSO_DATE", "")
+        if date_from and date < date_from: return False
+        if date_to and date > date_to: return False
+        if band and rec.get("BAND", "").upper() != band: return False
+        if pats:
+            c = rec.get("CALL", "").strip().upper()
+            if c not in exact and not (wild and wild.match(c)): return False
+        return True
+    return keep
+
+
+# ================== FORMATOS ==================
+class AdifExport:
+    """ADIF com os campos originais de cada registro."""
+    newline = None
+
+    def __init__(self, out, **options):
+        self.out = out
+
+    def begin(self):
+        self.out.write(ADIF_HEADER)
+
+    def write(self, rec):
+        self.out.write(format_record(rec))
+
+    def end(self, count):
+        pass
+
+
+class CsvExport:
+    """CSV com cabeçalho; `fields` escolhe as colunas (padrão CSV_FIELDS)."""
+    newline = ""
+
+    def __init__(self, out, fields=CSV_FIELDS, **options):
+        self.fields = tuple(fields)
+        self.writer = csv.writer(out)
+
+    def begin(self):
+        self.writer.writerow(self.fields)
+
+    def write(self, rec):
+        get = rec.get
+        self.writer.writerow([get(f, "") for f in self.fields])
+
+    def end(self, count):
+        pass
+
+
+class CabrilloExport:
+    """Cabrillo 3.0. O cabeçalho sai antes dos QSOs (o arquivo é gravado em
+    fluxo), então vem das opções e não do conteúdo do log: call, name,
+    grid, contest, band (CATEGORY-BAND), transmitter (CATEGORY-TRANSMITTER;
+    só TWO/UNLIMITED levam o ID do transmissor em cada QSO) e exchange
+    (troca enviada quando o registro não tem STX/STX_STRING)."""
+    newline = None
+
+    def __init__(self, out, call="", name="", grid="", contest="", band="", exchange="", transmitter="ONE", **options):
+        self.out = out
+        self.call = call.upper()
+        self.name = name
+        self.grid = grid.upper()
+        self.contest = contest.upper()
+        self.band = band.strip().upper()
+        self.exchange = exchange.upper()
+        self.transmitter = (transmitter or "ONE").upper()
+        self.tx_id = " 0" if self.transmitter in MULTI_TX else ""
+
+    def begin(self):
+        band = self.band if self.band and self.band != "TODAS" else "ALL"
+        lines = ["START-OF-LOG: 3.0", f"CALLSIGN: {self.call}", f"CONTEST: {self.contest}",
+                 "CATEGORY-OPERATOR: SINGLE-OP", f"CATEGORY-TRANSMITTER: {self.transmitter}",
+                 f"CATEGORY-BAND: {band}", "CATEGORY-MODE: CW",
+                 "CATEGORY-POWER: HIGH", f"GRID-LOCATOR: {self.grid}", f"NAME: {self.name}",
+                 "CREATED-BY: PP2LA CW Interface"]
+        self.out.write("\n".join(lines) + "\n")
+
+    def write(self, rec):
+        self.out.write(self.qso_line(rec))
+
+    def end(self, count):
+        self.out.write("END-OF-LOG:\n")
+
+    def qso_line(self, rec):
+        get = rec.get
+        band = get("BAND", "").upper()
+        mhz = freq_mhz(get("FREQ", ""), band)
+        freq = CABRILLO_BANDS.get(band) or str(round(mhz * 1000) if mhz is not None else BAND_KHZ.get(band, 0))
+        mode = CABRILLO_MODES.get(get("MODE", "").upper(), "DG")
+        date = get("QSO_DATE", "")
+        t = get("TIME_ON", "")[:4]
+        sent = get("STX_STRING") or get("STX") or self.exchange
+        rcvd = get("SRX_STRING") or get("SRX", "")
+        return (f"QSO: {freq:>5} {mode} {date[:4]}-{date[4:6]}-{date[6:8]} {t:4} "
+                f"{(get('STATION_CALLSIGN') or self.call):13} {get('RST_SENT', ''):3} {sent:6} "
+                f"{get('CALL', '').upper():13} {get('RST_RCVD', ''):3} {rcvd:6}{self.tx_id}".rstrip() + "\n")
+
+
+FORMATS = {"adif": AdifExport, "csv": CsvExport, "cabrillo": CabrilloExport}
+
+
+def format_for(path):
+    """Formato pela extensão do arquivo (padrão: ADIF)."""
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "adif")
+
+
+def export_log(src, dest, fmt=None, keep=None, progress=None, cancel=None, **options):
+    """Grava em `dest` os QSOs de `src` aceitos por `keep` (ver
+    record_filter), no formato `fmt` (padrão: pela extensão de `dest`).
+
+    A saída vai para um .tmp e só substitui `dest` no fim (em erro ou
+    cancelamento, o .tmp é apagado). `progress(f)`
+    recebe a fração lida do ADIF; `cancel` (ex.: threading.Event) é
+    consultado no mesmo ritmo e, se ligado, interrompe sem gravar nada.
+    Retorna (exportados, lidos) ou None se cancelado."""
+    cls = FORMATS[fmt or format_for(dest)]
+    total = os.path.getsize(src) or 1
+    tmp = dest + ".tmp"
+    exported = scanned = 0
+    cancelled = False
+    try:
+        with open(src, "rb") as f, open(tmp, "w", encoding="utf-8", newline=cls.newline) as out:
+            w = cls(out, **options)
+            w.begin()
+            for _, end, rec in iter_records(f):
+                scanned += 1
+                if scanned % PROGRESS_EVERY == 0:
+                    if cancel is not None and cancel.is_set():
+                        cancelled = True; break
+                    if progress: progress(end / total)
+                if not rec.get("CALL", "").strip(): continue
+                if keep is not None and not keep(rec): continue
+                w.write(rec)
+                exported += 1
+            else:
+                w.end(exported)
+    except BaseException:
+        # registro ruim, disco cheio, Ctrl+C: não deixa o .tmp para trás
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    if cancelled:
+        os.remove(tmp)
+        return None
+    os.replace(tmp, dest)
+    if progress: progress(1.0)
+    return exported, scanned
+
+
+# ================== AUTOTESTE ==================
+def run_selftest():
+    """Grava QSOs como o painel grava (qso_fields, kHz -> MHz) e um registro
+    antigo em kHz, exporta em Cabrillo e confere frequência e cabeçalho.
+    Retorna a lista de falhas (vazia se tudo certo)."""
+    cases = [(qso_fields("PY2XX", "20241026", "1200", "40M", "7000", "CW", "599", "599", "GG54"), "7000"),
+             (qso_fields("K1ABC", "20241026", "1201", "20M", "14025,5", "CW", "599", "599", "GG54"), "14026"),
+             (qso_fields("DL1AA", "20241026", "1202", "6M", "50090", "CW", "599", "599", "GG54"), "50"),
+             ({"CALL": "JA1ZZ", "QSO_DATE": "20241026", "TIME_ON": "1203", "BAND": "15M", "FREQ": "21030", "MODE": "CW"}, "21030")]
+    failures = []
+    with tempfile.TemporaryDirectory() as d:
+        src, dest = os.path.join(d, "log.adi"), os.path.join(d, "log.cbr")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write(ADIF_HEADER + "".join(format_record(rec) for rec, _ in cases))
+        export_log(src, dest, call="PP2LA", band="20m")
+        with open(dest, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    if "CATEGORY-BAND: 20M" not in lines: failures.append("CATEGORY-BAND: 20M ausente")
+    qsos = [l.split() for l in lines if l.startswith("QSO:")]
+    for (rec, want), q in zip(cases, qsos):
+        if q[1] != want: failures.append(f"{rec['CALL']}: FREQ {rec.get('FREQ')} -> {q[1]} (esperado {want})")
+    if len(qsos) != len(cases): failures.append(f"{len(qsos)} QSOs exportados de {len(cases)}")
+    return failures
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m cwcore.export", description="Autoteste da exportação")
+    ap.add_argument("--selftest", action="store_true", help="ida e volta: QSO do painel -> ADIF -> Cabrillo")
+    args = ap.parse_args(argv)
+    if not args.selftest: ap.error("use --selftest (a exportação fica em python -m cwcore export)")
+    failures = run_selftest()
+    for f in failures: print("FALHA:", f)
+    if not failures: print("ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+
+from cwcore.macros import DEFAULT_MACROS
+from cwcore.morse import build_frames, compile_timeline, duration_ms
+from cwcore.serial_link import SerialLink
+from cwcore.txqueue import TxScheduler, split_lines
+
+SETTINGS_FILE = "settings.json"
+
+
+def load_settings(path=SETTINGS_FILE):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f: return json.load(f)
+        except Exception: pass
+    return {"callsign": "PP2LA", "name": "LUCAS", "grid": "GH63", "wpm": 20, "macros": DEFAULT_MACROS}
+
+
+def build_payloads(text, wpm, binary=False, weight=50, farnsworth=0):
+    """Bytes a enviar para `text` e a duração estimada em ms: linhas de
+    texto (divididas no limite do firmware) ou, no modo timeline, os quadros
+    binários já compilados."""
+    if binary:
+        return build_frames(text, wpm, weight, farnsworth)
+    return [(line + "\n").encode() for line in split_lines(text)], duration_ms(compile_timeline(text, wpm))
+
+
+class Keyer:
+    """Keyer sem interface gráfica: porta serial, fila de TX e envio.
+
+    Usado pelo app Tk e pela linha de comando (python -m cwcore). poll()
+    drena a serial e devolve os eventos da fila de TX mais as linhas do
+    Arduino como ("line", None, texto). `link` permite trocar a porta por
+    uma RadioLink do gerenciador de vários rádios (cwcore.radios)."""
+
+    def __init__(self, wpm=20, binary=False, weight=50, farnsworth=0, link=None, name=""):
+        self.name = name
+        self.link = link or SerialLink()
+        self.tx = TxScheduler(self.link.write)
+        self.wpm = wpm
+        self.binary = binary
+        self.weight = weight
+        self.farnsworth = farnsworth
+
+    def connect(self, port):
+        self.link.open(port)
+
+    def close(self):
+        self.tx.reset()
+        self.link.close()
+
+    def set_wpm(self, wpm):
+        self.wpm = wpm
+        self.link.write(f"/wpm {wpm}\n".encode())
+
+    def send(self, text, trace=None):
+        payloads, ms = build_payloads(text, self.wpm, self.binary, self.weight, self.farnsworth)
+        return self.tx.submit(text, payloads, ms, trace)
+
+    def abort(self):
+        self.tx.abort()
+
+    def poll(self, meter=None):
+        # `meter` (cwcore.latency.LatencyMeter): mede a espera das linhas na fila do leitor
+        events = []
+        now = time.monotonic()
+        for kind, data, t in self.link.drain():
+            if kind == "line":
+                if meter is not None: meter.record("reader_lag", (now - t) * 1000)
+                events.append(("line", None, data))
+                events += self.tx.on_line(data, t)
+            elif kind == "error":
+                raise IOError(data)
+        return events + self.tx.tick()
+
+    def wait_idle(self, timeout=None, on_event=None):
+        """Bloqueia até a fila de TX esvaziar. Retorna False no timeout."""
+        end = None if timeout is None else time.monotonic() + timeout
+        while len(self.tx):
+            for ev in self.poll():
+                if on_event: on_event(ev)
+            if end is not None and time.monotonic() > end: return False
+            time.sleep(0.01)
+        for ev in self.poll():
+            if on_event: on_event(ev)
+        return True
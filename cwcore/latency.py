@@ -0,0 +1,172 @@
+"""Instrumentação de latência do caminho de manipulação.
+
+Cada mensagem leva um "trace" (dict etapa -> instante) da tecla até o DONE;
+ao terminar, os intervalos vão para histogramas em memória.
+
+    python -m cwcore.latency --simulate    # mede o caminho inteiro contra o simulador
+    python -m cwcore.latency --overhead    # custo de cada medida"""
+import argparse
+import csv
+import json
+import math
+import time
+
+MIN_MS = 0.01          # limite inferior do histograma
+RATIO = 1.04           # largura relativa das faixas (~2% de erro nos percentis)
+MAX_MS = 600000.0
+N_BUCKETS = int(math.log(MAX_MS / MIN_MS) / math.log(RATIO)) + 2
+_INV_LOG = 1 / math.log(RATIO)
+
+# Intervalos medidos: nome, descrição, marca inicial, marca final (None: medido direto)
+STAGES = (
+    ("render", "Tecla -> macro formatada", "hotkey", "render"),
+    ("queue", "Espera na fila de TX", "submit", "write_start"),
+    ("write", "Chamada de escrita na serial", "write_start", "write"),
+    ("io_flush", "Buffer -> porta (laço de E/S)", None, None),
+    ("echo", "Escrita -> eco TX: do Arduino", "write", "echo"),
+    ("keying", "Eco TX: -> DONE (manipulação)", "echo", "done"),
+    ("total", "Tecla -> eco TX: (total)", "start", "echo"),
+    ("reader_lag", "Fila do leitor serial -> interface", None, None),
+    ("tk_after", "Atraso do after() do Tk", None, None),
+)
+STAGE_LABELS = {name: label for name, label, _, _ in STAGES}
+
+
+class Histogram:
+    """Histograma de faixas geométricas: add() é O(1) e a memória é fixa
+    (N_BUCKETS contadores), então pode ficar ligado o concurso inteiro."""
+    __slots__ = ("counts", "n", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.n = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, ms):
+        i = 0 if ms <= MIN_MS else min(N_BUCKETS - 1, int(math.log(ms / MIN_MS) * _INV_LOG) + 1)
+        self.counts[i] += 1
+        self.n += 1
+        self.total += ms
+        if ms < self.min: self.min = ms
+        if ms > self.max: self.max = ms
+
+    def percentile(self, p):
+        if not self.n: return None
+        target = p / 100 * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= target:
+                mid = MIN_MS if i == 0 else MIN_MS * RATIO ** (i - 0.5)
+                return min(self.max, max(self.min, mid))
+        return self.max
+
+    def summary(self):
+        r = lambda v: None if v is None else round(v, 2)
+        return {"n": self.n, "mean": r(self.total / self.n) if self.n else None,
+                "p50": r(self.percentile(50)), "p95": r(self.percentile(95)), "p99": r(self.percentile(99)),
+                "max": r(self.max) if self.n else None}
+
+
+class LatencyMeter:
+    """Histogramas por etapa (STAGES), alimentados pelos traces das
+    mensagens e por medidas diretas (record). Os instantes usam o mesmo
+    relógio da fila de TX e da serial (time.monotonic)."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.hists = {name: Histogram() for name, _, _, _ in STAGES}
+        self.since = time.time()
+
+    def record(self, name, ms):
+        self.hists[name].add(ms)
+
+    def trace(self, **marks):
+        """Novo trace; sem marcas, começa no submit da fila de TX."""
+        return marks
+
+    def finish(self, trace):
+        """Mensagem terminou: registra os intervalos que o trace tem."""
+        if not trace: return
+        trace.setdefault("start", trace.get("hotkey", trace.get("submit")))
+        for name, _, a, b in STAGES:
+            if a is None: continue
+            ta, tb = trace.get(a), trace.get(b)
+            if ta is not None and tb is not None and tb >= ta:
+                self.hists[name].add((tb - ta) * 1000)
+
+    def snapshot(self):
+        return [dict(stage=name, label=label, **self.hists[name].summary()) for name, label, _, _ in STAGES]
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"since": self.since, "unit": "ms", "stages": self.snapshot()}, f, indent=1, ensure_ascii=False)
+
+    def export_csv(self, path):
+        rows = self.snapshot()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))
+            w.writeheader(); w.writerows(rows)
+
+
+# ================== BANCADA ==================
+def run_overhead(n=200000):
+    """Custo (µs) de uma medida direta e de um trace completo."""
+    m = LatencyMeter()
+    t0 = time.perf_counter()
+    for i in range(n): m.record("reader_lag", (i % 1000) * 0.05)
+    rec_us = (time.perf_counter() - t0) / n * 1e6
+    clock = m.clock
+    t0 = time.perf_counter()
+    for _ in range(n // 10):
+        tr = m.trace(hotkey=clock()); tr["render"] = clock(); tr["submit"] = clock()
+        tr["write_start"] = clock(); tr["write"] = clock(); tr["echo"] = clock(); tr["done"] = clock()
+        m.finish(tr)
+    trace_us = (time.perf_counter() - t0) / (n // 10) * 1e6
+    t0 = time.perf_counter()
+    m.snapshot()
+    snap_ms = (time.perf_counter() - t0) * 1000
+    return {"record_us": round(rec_us, 3), "trace_us": round(trace_us, 2), "snapshot_ms": round(snap_ms, 2)}
+
+
+def run_simulated(messages=10, text="CQ TEST PP2LA", wpm=40, speed=8.0):
+    """Caminho inteiro sem Tk: Keyer -> pty -> simulador -> eco/DONE."""
+    from cwcore.keyer import Keyer
+    from cwcore.macros import format_macro
+    from cwcore.simulator import ArduinoSimulator
+
+    sim = ArduinoSimulator(wpm=wpm, speed=speed).start()
+    meter = LatencyMeter()
+    k = Keyer(wpm=wpm)
+    k.connect(sim.port)
+    time.sleep(0.3); k.poll()
+    for _ in range(messages):
+        tr = meter.trace(hotkey=meter.clock())
+        msg = format_macro(text + " {target}", target="PY2XX"); tr["render"] = meter.clock()
+        k.send(msg, trace=tr)
+        end = time.monotonic() + 10
+        while len(k.tx) and time.monotonic() < end:
+            for kind, item, info in k.poll(meter):
+                if kind in ("done", "timeout", "error") and item is not None: meter.finish(item.trace)
+            time.sleep(0.001)
+    k.close(); sim.stop()
+    return {s["stage"]: {key: s[key] for key in ("n", "p50", "p95", "p99")} for s in meter.snapshot() if s["n"]}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m cwcore.latency", description="Latência do caminho de manipulação")
+    ap.add_argument("--simulate", action="store_true", help="mede contra o simulador (Linux/macOS)")
+    ap.add_argument("--overhead", action="store_true", help="custo da instrumentação")
+    args = ap.parse_args(argv)
+    if args.overhead or not args.simulate: print(json.dumps(run_overhead()))
+    if args.simulate: print(json.dumps(run_simulated(), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
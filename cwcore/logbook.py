@@ -0,0 +1,169 @@
+import bisect
+import json
+import os
+
+from cwcore.adif import iter_records
+
+# Campos exibidos no LOGBOOK (mesma ordem das colunas da Treeview)
+LOG_FIELDS = ("QSO_DATE", "TIME_ON", "CALL", "BAND", "FREQ", "MODE", "RST_SENT", "RST_RCVD", "MY_GRIDSQUARE")
+COL_DATE, COL_TIME, COL_CALL, COL_BAND, COL_FREQ, COL_MODE = 0, 1, 2, 3, 4, 5
+
+INDEX_VERSION = 2
+META_SIZE = 255  # cabeçalho de tamanho fixo, regravado no lugar a cada atualização
+SIG_BYTES = 64   # bytes finais usados para detectar se o arquivo foi reescrito
+
+
+class LogbookIndex:
+    """Índice persistente do logbook ADIF (arquivo .idx ao lado do .adi).
+
+    Guarda o offset em bytes e os campos de cada registro. Ao atualizar,
+    compara tamanho/mtime do ADIF e só processa o trecho novo no final."""
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self.offsets = []
+        self.rows = []
+        self.by_band = {}
+        self.parsed = 0      # offset logo após o último <EOR> processado
+        self.size = -1
+        self.mtime = -1
+        self.sig = ""
+        self.loaded = False
+        self._idx_end = 0
+
+    # --- API ---
+    def refresh(self):
+        """Sincroniza com o ADIF. Retorna quantas linhas antigas continuam
+        válidas: as novas são rows[retorno:]. Retorno 0 com linhas já
+        exibidas significa que o índice foi reconstruído."""
+        if not self.loaded:
+            self._load_sidecar()
+            self.loaded = True
+
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            had = len(self.rows)
+            self._reset()
+            if had: self._remove_sidecar()
+            return 0
+
+        if st.st_size == self.size and st.st_mtime_ns == self.mtime:
+            return len(self.rows)
+
+        start = len(self.rows)
+        if st.st_size < self.parsed or not self._tail_matches():
+            self._reset(); start = 0
+
+        added = self._parse_from(self.parsed)
+        self.size, self.mtime = st.st_size, st.st_mtime_ns
+        self._save_sidecar(added, rewrite=(start == 0))
+        return start
+
+    def band_rows(self, band):
+        if not band or band.upper() == "TODAS":
+            return range(len(self.rows))
+        return self.by_band.get(band.upper(), [])
+
+    # --- Parsing ---
+    def _reset(self):
+        self.offsets, self.rows, self.by_band = [], [], {}
+        self.parsed, self.size, self.mtime = 0, -1, -1
+
+    def _add(self, offset, row):
+        self.by_band.setdefault(row[COL_BAND].upper(), []).append(len(self.rows))
+        self.offsets.append(offset)
+        self.rows.append(row)
+
+    def _parse_from(self, pos):
+        added = []
+        with open(self.path, "rb") as f:
+            for start, end, rec in iter_records(f, pos):
+                self.parsed = end
+                row = [rec.get(k, "").strip() for k in LOG_FIELDS]
+                if row[COL_CALL]:
+                    self._add(start, row)
+                    added.append(len(self.rows) - 1)
+        return added
+
+    def _tail_sig(self, f, end):
+        a = max(0, end - SIG_BYTES)
+        f.seek(a)
+        return f.read(end - a).hex()
+
+    def _tail_matches(self):
+        if self.parsed == 0: return True
+        try:
+            with open(self.path, "rb") as f:
+                return self._tail_sig(f, self.parsed) == self.sig
+        except OSError:
+            return False
+
+    # --- Arquivo .idx ---
+    # Linha 1: JSON de metadados com tamanho fixo; demais: um registro por linha.
+    def _meta_line(self):
+        with open(self.path, "rb") as f:
+            self.sig = self._tail_sig(f, self.parsed)
+        meta = {"v": INDEX_VERSION, "size": self.size, "mtime": self.mtime,
+                "parsed": self.parsed, "count": len(self.rows), "sig": self.sig}
+        return json.dumps(meta).encode().ljust(META_SIZE) + b"\n"
+
+    def _load_sidecar(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                meta = json.loads(f.readline())
+                if meta.get("v") != INDEX_VERSION: return
+                count = meta["count"]
+                lines = [next(f) for _ in range(count)]
+                idx_end = f.tell()
+        except (OSError, ValueError, KeyError, StopIteration):
+            return
+        entries = json.loads(b"[" + b",".join(lines) + b"]")
+        for e in entries:
+            self._add(e[0], e[1:])
+        self.parsed, self.size, self.mtime, self.sig = meta["parsed"], meta["size"], meta["mtime"], meta["sig"]
+        self._idx_end = idx_end
+
+    def _save_sidecar(self, added, rewrite):
+        try:
+            if rewrite or not os.path.exists(self.index_path):
+                tmp = self.index_path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(self._meta_line())
+                    for i in range(len(self.rows)):
+                        f.write(self._entry(i))
+                    self._idx_end = f.tell()
+                os.replace(tmp, self.index_path)
+                return
+            # Anexa as linhas novas e só depois regrava o cabeçalho: se cair no
+            # meio, o "count" antigo faz as linhas extras serem ignoradas.
+            with open(self.index_path, "r+b") as f:
+                f.seek(self._idx_end)
+                f.truncate()
+                for i in added:
+                    f.write(self._entry(i))
+                self._idx_end = f.tell()
+                f.seek(0)
+                f.write(self._meta_line())
+        except OSError:
+            pass  # o índice é só um cache; o ADIF continua sendo a fonte
+
+    def _entry(self, i):
+        return json.dumps([self.offsets[i]] + list(self.rows[i]), ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def _remove_sidecar(self):
+        try: os.remove(self.index_path)
+        except OSError: pass
+
+
+def insert_sorted(keys, new, key):
+    """Acrescenta `new` à lista `keys`, já ordenada por `key`. Poucas chaves
+    novas (os QSOs recém-gravados) entram por busca binária, sem calcular
+    `key` da lista inteira como um sort() faria; muitas, com sort()."""
+    new = list(new)
+    if len(new) * 32 > len(keys):
+        keys.extend(new); keys.sort(key=key)
+        return
+    for item in new:
+        bisect.insort(keys, item, key=key)
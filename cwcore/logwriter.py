@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+import time
+
+from cwcore.adif import ADIF_HEADER, format_record, qso_key, read_records
+
+FSYNC_POLICIES = ("always", "batch", "interval", "never")
+BATCH_DELAY = 0.05     # s; espera por mais QSOs antes de gravar o lote
+RETRY_DELAY = 2.0      # s; nova tentativa após falha de escrita (ex.: rede caiu)
+
+
+class LogWriter:
+    """Grava os QSOs no logbook numa thread própria.
+
+    submit() anota o registro num journal local (um ADIF pequeno) e volta
+    na hora; a thread grava em lotes no logbook e só esvazia o journal
+    depois que o lote está no disco, conforme a política de fsync:
+      "always"   fsync do journal a cada QSO e do logbook a cada lote
+      "batch"    fsync do logbook a cada lote (padrão)
+      "interval" fsync do logbook no máximo a cada `fsync_interval` s
+      "never"    deixa para o sistema operacional
+    Se o programa cair antes da gravação, start() separa o journal antigo
+    (.old) e recover() o reaplica sem duplicar o que já chegou ao logbook;
+    recover() pode rodar depois, em segundo plano, com o gravador ativo. Eventos para a interface, como no
+    SerialLink: ("written", n, instante) e ("error", mensagem, instante)."""
+
+    def __init__(self, path, journal_path=None, fsync="batch", fsync_interval=5.0):
+        if fsync not in FSYNC_POLICIES: fsync = "batch"
+        self.path = path
+        self.journal_path = journal_path or path + ".journal"
+        self.old_path = self.journal_path + ".old"
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()     # escrita no logbook (a importação também usa)
+        self.events = queue.Queue()
+        self._queue = queue.Queue()
+        self._jlock = threading.Lock()
+        self._journal = None
+        self._inflight = 0
+        self._synced_at = time.monotonic()
+        self._thread = None
+
+    @property
+    def backlog(self):
+        # QSOs aceitos que ainda não estão no logbook
+        return self._queue.qsize() + self._inflight
+
+    def start(self):
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path):
+            # QSOs de uma execução anterior: ficam no .old até o recover()
+            if os.path.exists(self.old_path):
+                with open(self.journal_path, "r", encoding="utf-8") as src, open(self.old_path, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.old_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        with self._jlock:
+            self._journal.write(record); self._journal.flush()
+            if self.fsync == "always": os.fsync(self._journal.fileno())
+            self._queue.put(record)
+
+    def drain(self, limit=50):
+        out = []
+        try:
+            while len(out) < limit:
+                out.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return out
+
+    def close(self, timeout=5.0):
+        if self._thread is None: return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def recover(self, known_rows):
+        """Reaplica no logbook os QSOs do journal antigo que não chegaram a
+        ele. `known_rows`: (call, data, hora, banda, modo) já no logbook.
+        Chamar depois de start(). Retorna quantos foram recuperados."""
+        if not os.path.exists(self.old_path): return 0
+        known = {qso_key(*r) for r in known_rows}
+        missing = []
+        for _, _, rec in read_records(self.old_path):
+            key = qso_key(rec.get("CALL", ""), rec.get("QSO_DATE", ""), rec.get("TIME_ON", ""),
+                          rec.get("BAND", ""), rec.get("MODE", ""))
+            if rec.get("CALL") and key not in known:
+                known.add(key); missing.append(format_record(rec))
+        if missing:
+            self._append(missing)
+            self._sync_logbook_file()
+        os.remove(self.old_path)
+        return len(missing)
+
+    # --- Thread de gravação ---
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch = []
+            while item is not None:
+                batch.append(item)
+                try: item = self._queue.get(timeout=BATCH_DELAY)
+                except queue.Empty: break
+            stop = item is None
+            self._inflight = len(batch)
+            while batch:
+                try:
+                    self._append(batch)
+                    break
+                except Exception as e:
+                    self.events.put(("error", f"Falha ao gravar {self.path}: {e}", time.monotonic()))
+                    if stop: return  # o journal guarda os QSOs para a próxima execução
+                    time.sleep(RETRY_DELAY)
+            self._inflight = 0
+            if batch: self.events.put(("written", len(batch), time.monotonic()))
+            self._maybe_truncate(force=stop)
+        with self._jlock:
+            self._journal.close()
+
+    def _append(self, records):
+        with self.lock:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if new_file: f.write(ADIF_HEADER)
+                f.write("".join(records))
+                f.flush()
+                if self.fsync in ("always", "batch"):
+                    os.fsync(f.fileno()); self._synced_at = time.monotonic()
+
+    def _sync_logbook_file(self):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            os.fsync(f.fileno())
+        self._synced_at = time.monotonic()
+
+    def _maybe_truncate(self, force=False):
+        # O journal só é esvaziado quando o logbook já está seguro no disco
+        if self.fsync == "interval":
+            if not force and time.monotonic() - self._synced_at < self.fsync_interval: return
+            try: self._sync_logbook_file()
+            except Exception: return
+        with self._jlock:
+            if self._queue.qsize(): return
+            self._journal.seek(0); self._journal.truncate()
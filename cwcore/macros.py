@@ -0,0 +1,119 @@
+import functools
+import string
+
+# --- Macros Padrão ---
+DEFAULT_MACROS = [
+    {"label": "F1 CQ", "template": "CQ CQ CQ DE {call} {call} {grid} K"},
+    {"label": "F2 ANS", "template": "{target} DE {call} {call} KN"},
+    {"label": "F3 RST", "template": "{target} DE {call} R RST {rst} {rst} BK"},
+    {"label": "F4 TU", "template": "TU FB QSO 73 SK E E"},
+    {"label": "F5 NAME", "template": "NAME {name} {name} BK"},
+    {"label": "F6 QTH", "template": "QTH {grid} {grid} BK"},
+    {"label": "F7 QRZ?", "template": "QRZ? DE {call}"},
+    {"label": "F8 QRL?", "template": "QRL? DE {call}"},
+    {"label": "F9 AGN?", "template": "AGN? AGN?"},
+    {"label": "F10 HW?", "template": "HW? BK"},
+    {"label": "F11 CALL", "template": "{call} {call}"},
+    {"label": "F12 73", "template": "73 TU"},
+]
+
+
+# Variáveis aceitas nos templates ({nr}: número de série do concurso; {cut}:
+# o mesmo com números cortados; {last}: último indicativo logado)
+MACRO_FIELDS = ("call", "name", "grid", "target", "rst", "nr", "cut", "last")
+NR_DIGITS = 3
+CUT_DIGITS = "09"      # algarismos cortados por padrão: 0 -> T, 9 -> N
+_CUT = dict(zip("0123456789", "TAUV4E6BDN"))
+_FORMATTER = string.Formatter()
+
+
+def formatted_rst(rst):
+    rst = rst.strip().upper()
+    return "5NN" if rst == "599" else rst
+
+
+def cut_numbers(text, digits=CUT_DIGITS):
+    """Troca os algarismos de `digits` pelas letras do corte (9 -> N...)."""
+    return text.translate({ord(d): _CUT[d] for d in digits if d in _CUT})
+
+
+def macro_values(call="", name="", grid="", target="", rst="599", nr=1, last="", cut_digits=CUT_DIGITS):
+    """Valores das variáveis, já normalizados para o envio."""
+    serial = f"{int(nr):0{NR_DIGITS}d}"
+    return {"call": call.upper().strip(), "name": name.upper().strip(), "grid": grid.upper().strip(),
+            "target": target.upper().strip() or "DX", "rst": formatted_rst(rst),
+            "nr": serial, "cut": cut_numbers(serial, cut_digits), "last": last.upper().strip()}
+
+
+class MacroTemplate:
+    """Template de macro analisado uma vez. Variável desconhecida, chave
+    sem par ou formato inválido dão ValueError aqui (ao salvar a macro), e
+    não no meio de um QSO.
+
+    render() e payloads() guardam o último resultado e só refazem o
+    trabalho quando muda o valor de uma variável que o template usa."""
+    __slots__ = ("template", "fields", "_parts", "_key", "_text", "_encoded")
+
+    def __init__(self, template):
+        self.template = template
+        parts, fields = [], []
+        try:
+            parsed = list(_FORMATTER.parse(template))
+        except ValueError as e:
+            raise ValueError(f"template inválido: {e}") from None
+        for literal, field, spec, conv in parsed:
+            if literal: parts.append(literal)
+            if field is None: continue
+            if field not in MACRO_FIELDS: raise ValueError(f"variável desconhecida: {{{field}}}")
+            if conv or "{" in spec: raise ValueError(f"formato não suportado em {{{field}}}")
+            try: format("", spec)
+            except ValueError as e: raise ValueError(f"formato inválido em {{{field}:{spec}}}: {e}") from None
+            parts.append((field, spec))
+            if field not in fields: fields.append(field)
+        self._parts = tuple(parts)
+        self.fields = tuple(fields)
+        self._key = None
+        self._text = ""
+        self._encoded = {}
+
+    def render(self, values):
+        key = tuple(values[f] for f in self.fields)
+        if key != self._key:
+            self._text = "".join(p if isinstance(p, str) else format(values[p[0]], p[1]) for p in self._parts)
+            self._key = key
+            self._encoded.clear()
+        return self._text
+
+    def payloads(self, values, wpm, binary=False, weight=50, farnsworth=0):
+        """(texto, payloads, ms) prontos para TxScheduler.submit: com os
+        mesmos valores e a mesma velocidade, são os bytes da vez anterior."""
+        text = self.render(values)
+        enc = (wpm, binary, weight, farnsworth)
+        cached = self._encoded.get(enc)
+        if cached is None:
+            from cwcore.keyer import build_payloads  # o keyer importa este módulo
+            payloads, ms = build_payloads(text, wpm, binary, weight, farnsworth)
+            if len(self._encoded) >= 8: self._encoded.clear()
+            cached = self._encoded[enc] = (tuple(payloads), ms)
+        return (text,) + cached
+
+
+@functools.lru_cache(maxsize=256)
+def compile_macro(template):
+    return MacroTemplate(template)
+
+
+def compile_macros(macros):
+    """Compila as macros do settings. Retorna (templates, erros):
+    templates[i] é None se a macro i é inválida, e erros[i] diz o motivo."""
+    templates, errors = [], {}
+    for i, m in enumerate(macros):
+        try:
+            templates.append(compile_macro(m.get("template", "")))
+        except ValueError as e:
+            templates.append(None); errors[i] = str(e)
+    return templates, errors
+
+
+def format_macro(template, call="", name="", grid="", target="", rst="599", nr=1, last=""):
+    return compile_macro(template).render(macro_values(call, name, grid, target, rst, nr, last))
@@ -0,0 +1,194 @@
+import re
+
+# Tabela Morse (a do firmware mais pontuação ITU)
+MORSE_TABLE = {
+    'A': ".-", 'B': "-...", 'C': "-.-.", 'D': "-..", 'E': ".", 'F': "..-.", 'G': "--.", 'H': "....",
+    'I': "..", 'J': ".---", 'K': "-.-", 'L': ".-..", 'M': "--", 'N': "-.", 'O': "---", 'P': ".--.",
+    'Q': "--.-", 'R': ".-.", 'S': "...", 'T': "-", 'U': "..-", 'V': "...-", 'W': ".--", 'X': "-..-",
+    'Y': "-.--", 'Z': "--..",
+    '0': "-----", '1': ".----", '2': "..---", '3': "...--", '4': "....-", '5': ".....",
+    '6': "-....", '7': "--...", '8': "---..", '9': "----.",
+    '.': ".-.-.-", ',': "--..--", '?': "..--..", '/': "-..-.", '=': "-...-",
+    '+': ".-.-.", '-': "-....-", '@': ".--.-.", "'": ".----.", '!': "-.-.--", '(': "-.--.",
+    ')': "-.--.-", '&': ".-...", ':': "---...", ';': "-.-.-.", '"': ".-..-.", '$': "...-..-",
+    '_': "..--.-",
+}
+
+# Prosinais, escritos entre < > no texto (ex.: "73 <SK>"): as letras são
+# emendadas sem espaço entre caracteres.
+PROSIGNS = {
+    "AR": ".-.-.", "AS": ".-...", "BK": "-...-.-", "BT": "-...-", "CL": "-.-..-..",
+    "CT": "-.-.-", "HH": "........", "KN": "-.--.", "SK": "...-.-", "SN": "...-.", "SOS": "...---...",
+}
+
+_TOKEN_RE = re.compile(r"<([A-Z]+)>|(\s+)|(.)", re.DOTALL)
+
+_LETTER_RE = re.compile(r"<[A-Za-z]+>|.", re.DOTALL)  # um caractere ou um prosinal
+MAX_RUN_MS = 0x3FFF  # maior duração de um trecho; pausas maiores viram vários trechos
+
+
+def unit_ms(wpm):
+    # Mesmo cálculo do firmware: UNIT = 1200 / wpm (divisão inteira)
+    return 1200 // max(1, int(wpm))
+
+
+def tokenize(text):
+    """Divide o texto em padrões Morse, None (espaço entre palavras) e
+    caracteres desconhecidos (str de tamanho 1 fora da tabela)."""
+    out = []
+    for m in _TOKEN_RE.finditer(text.upper()):
+        pro, space, ch = m.groups()
+        if pro is not None:
+            if pro in PROSIGNS: out.append(PROSIGNS[pro])
+            else: out.extend(MORSE_TABLE.get(c, c) for c in pro)
+        elif space is not None:
+            out.append(None)
+        elif ch in MORSE_TABLE:
+            out.append(MORSE_TABLE[ch])
+        else:
+            out.append(("?", ch))
+    return out
+
+
+def unknown_chars(text):
+    return sorted({t[1] for t in tokenize(text) if isinstance(t, tuple)})
+
+
+def _spacing(wpm, weight, farnsworth):
+    # (ponto, traço, pausa entre elementos, extra entre letras, extra entre palavras) em ms
+    u = unit_ms(wpm)
+    delta = round(u * (weight - 50) / 50)
+    delta = max(-(u - 1), min(delta, u - 1))
+
+    # espaços extras (além da pausa de 1U do último elemento)
+    letter_extra, word_extra = 2 * u, 6 * u
+    if farnsworth and 0 < farnsworth < wpm:
+        ta = (60000 * wpm - 37200 * farnsworth) / (wpm * farnsworth)  # ms por palavra
+        letter_extra = round(3 * ta / 19) - u
+        word_extra = round(7 * ta / 19) - u
+    return u + delta, 3 * u + delta, u - delta, letter_extra, word_extra
+
+
+def compile_timeline(text, wpm, weight=50, farnsworth=0):
+    """Compila o texto numa linha do tempo [(ligado, ms), ...].
+
+    Com weight=50 e sem Farnsworth, a temporização é idêntica à do
+    CWarduino.ino: ponto 1U, traço 3U, 1U entre elementos, 3U entre letras,
+    7U entre palavras e 1U de pausa final antes do DONE. `weight` (%)
+    alonga os elementos às custas da pausa seguinte; `farnsworth` (WPM
+    efetivo, menor que `wpm`) alonga só os espaços entre letras/palavras."""
+    dit_on, dah_on, gap, letter_extra, word_extra = _spacing(wpm, weight, farnsworth)
+    runs = []
+
+    def emit(on, ms):
+        if ms <= 0: return
+        if runs and runs[-1][0] == on: runs[-1][1] += ms
+        else: runs.append([on, ms])
+
+    tokens = [t for t in tokenize(text) if not isinstance(t, tuple)]
+    for i, tok in enumerate(tokens):
+        if tok is None:
+            emit(False, word_extra)
+            continue
+        for el in tok:
+            emit(True, dit_on if el == "." else dah_on)
+            emit(False, gap)
+        if i + 1 < len(tokens) and tokens[i + 1] is not None:
+            emit(False, letter_extra)
+    return [(on, ms) for on, ms in runs]
+
+
+def duration_ms(timeline):
+    return sum(ms for _, ms in timeline)
+
+
+# ================== PROTOCOLO BINÁRIO ==================
+# Quadro: SOF (0xFE) | tamanho (uint16 LE) | payload | CRC-8 (poly 0x07) do payload.
+# Payload: um varint LEB128 por trecho, com valor (ms << 1) | ligado.
+FRAME_SOF = 0xFE
+MAX_PAYLOAD = 192  # cabe com folga no buffer do firmware (Uno: 2 KB de RAM)
+
+
+def crc8(data):
+    crc = 0
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def _varint(v):
+    out = bytearray()
+    while True:
+        b = v & 0x7F
+        v >>= 7
+        if v: out.append(b | 0x80)
+        else:
+            out.append(b); return bytes(out)
+
+
+def encode_runs(timeline):
+    out = bytearray()
+    for on, ms in timeline:
+        while ms > 0:
+            part = min(ms, MAX_RUN_MS)
+            out += _varint((part << 1) | (1 if on else 0))
+            ms -= part
+    return bytes(out)
+
+
+def decode_runs(payload):
+    runs, v, shift = [], 0, 0
+    for b in payload:
+        v |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            runs.append((bool(v & 1), v >> 1)); v, shift = 0, 0
+    return runs
+
+
+def frame(payload):
+    if len(payload) > 0xFFFF: raise ValueError("payload grande demais")
+    return bytes([FRAME_SOF]) + len(payload).to_bytes(2, "little") + payload + bytes([crc8(payload)])
+
+
+def build_frames(text, wpm, weight=50, farnsworth=0):
+    """Compila o texto em quadros de no máximo MAX_PAYLOAD bytes, quebrando
+    entre palavras. Uma palavra que não cabe num quadro é quebrada entre
+    letras, e o espaço entre letras vai no início do quadro seguinte.
+    Retorna (quadros, duração total em ms)."""
+    letter_extra = _spacing(wpm, weight, farnsworth)[3]
+    frames, total = [], 0
+    chunk, cont = [], False   # cont: o quadro continua uma palavra já começada
+
+    def timeline(words_):
+        tl = compile_timeline(" ".join(words_), wpm, weight, farnsworth)
+        return [(False, letter_extra)] + tl if cont and letter_extra > 0 else tl
+
+    def fits(words_):
+        return len(encode_runs(timeline(words_))) <= MAX_PAYLOAD
+
+    def flush(words_):
+        nonlocal total
+        tl = timeline(words_)
+        total += duration_ms(tl)
+        frames.append(frame(encode_runs(tl)))
+
+    for w in text.split(" "):
+        if fits(chunk + [w]):
+            chunk.append(w); continue
+        if chunk:
+            flush(chunk + [""])  # espaço de palavra no fim do quadro
+            chunk, cont = [], False
+        if fits([w]):
+            chunk = [w]; continue
+        piece = ""
+        for letter in _LETTER_RE.findall(w):
+            if piece and not fits([piece + letter]):
+                flush([piece])
+                piece, cont = "", True
+            piece += letter
+        chunk = [piece]
+    if chunk: flush(chunk)
+    return frames, total
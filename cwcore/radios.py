@@ -0,0 +1,258 @@
+import os
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from cwcore.keyer import Keyer
+from cwcore.serial_link import BAUDRATE
+
+IO_POLL_S = 0.005   # s; nova tentativa de escrita pendente nas portas sem select() (Windows)
+READ_BLOCK_S = 0.25 # s; timeout da leitura bloqueante dessas portas (só para notar o fechamento)
+
+
+class RadioLink:
+    """Porta serial de um rádio, com a mesma interface do SerialLink
+    (open/close/write/drain/events), mas sem thread própria: a leitura e a
+    escrita são feitas pelo laço de E/S do RadioManager.
+
+    write() só coloca os bytes no buffer de saída e acorda o laço, que os
+    escreve sem bloquear; um rádio travado (cabo, controle de fluxo) não
+    segura a interface nem os outros rádios."""
+
+    def __init__(self, manager, baudrate=BAUDRATE):
+        self.manager = manager
+        self.baudrate = baudrate
+        self.ser = None
+        self.port = None
+        self.events = queue.Queue()
+        self.outbuf = bytearray()
+        self.inbuf = b""
+        self.lock = threading.Lock()
+        self.want_write = False
+        self.fd = None      # descritor selecionável (None: porta varrida)
+        self.pending_since = None
+        self.flush_lags = deque(maxlen=1000)  # s entre write() e os bytes saírem para a porta
+
+    @property
+    def is_open(self):
+        return self.ser is not None
+
+    @property
+    def pending_out(self):
+        return len(self.outbuf)
+
+    def open(self, port):
+        import serial
+        # timeouts 0: leitura e escrita não bloqueiam; write() retorna o que coube
+        self.ser = serial.Serial(port, self.baudrate, timeout=0, write_timeout=0)
+        self.port = port
+        self.outbuf.clear(); self.inbuf = b""
+        self.manager._attach(self)
+
+    def close(self):
+        ser, self.ser = self.ser, None
+        if ser is None: return
+        self.manager._detach(self, ser)
+
+    def write(self, data):
+        if self.ser is None: raise IOError("porta não conectada")
+        with self.lock:
+            if not self.outbuf: self.pending_since = time.monotonic()
+            self.outbuf += data
+        self.manager._wake()
+
+    def drain(self, limit=200):
+        out = []
+        try:
+            while len(out) < limit:
+                out.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return out
+
+    # --- Chamados pelo laço de E/S ---
+    def _read(self, ser):
+        data = ser.read(max(1, ser.in_waiting))
+        if not data: return
+        lines = (self.inbuf + data).split(b"\n")
+        self.inbuf = lines.pop()
+        now = time.monotonic()
+        for raw in lines:
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if line: self.events.put(("line", line, now))
+
+    def _flush(self, ser):
+        with self.lock:
+            if not self.outbuf: return False
+            if self.fd is None:
+                n = ser.write(bytes(self.outbuf)) or 0
+            else:
+                # direto no descritor: o write() do pyserial fica em laço com EAGAIN
+                try: n = os.write(self.fd, self.outbuf)
+                except BlockingIOError: n = 0
+            del self.outbuf[:n]
+            if not self.outbuf and self.pending_since is not None:
+                self.flush_lags.append(time.monotonic() - self.pending_since); self.pending_since = None
+            return bool(self.outbuf)
+
+    def _fail(self, ser, e):
+        if self.ser is ser:
+            self.ser = None
+            self.events.put(("error", f"Porta {self.port} perdida: {e}", time.monotonic()))
+        self.events.put(("closed", None, time.monotonic()))
+
+
+class RadioManager:
+    """Vários keyers (um Arduino por rádio, SO2R) num único laço de E/S.
+
+    Cada rádio é um Keyer com a própria porta, WPM e fila de TX; todas as
+    portas são atendidas por uma só thread com selectors. No Windows, onde
+    select() não aceita portas seriais, cada porta tem uma thread de leitura
+    bloqueante (parada até chegar um byte) e a escrita continua no laço.
+    `focus` é o rádio que recebe o texto livre e as macros sem rádio
+    definido."""
+
+    def __init__(self, names=("R1", "R2"), wpm=20):
+        self.keyers = {}    # nome -> Keyer, na ordem da interface
+        self.focus = None
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False); self._wake_w.setblocking(False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._ops = queue.Queue()       # registros/remoções feitos pelo próprio laço
+        self._links = {}                # RadioLink -> Serial em uso pelo laço
+        self._polled = set()            # links sem fileno() selecionável (thread de leitura)
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        for name in names: self.add(name, wpm)
+
+    def add(self, name, wpm=20):
+        k = Keyer(wpm=wpm, link=RadioLink(self), name=name)
+        self.keyers[name] = k
+        if self.focus is None: self.focus = name
+        return k
+
+    def get(self, name=None):
+        """Keyer do rádio `name` (ou o do foco, se None ou desconhecido)."""
+        return self.keyers.get(name) or self.keyers[self.focus]
+
+    @property
+    def current(self):
+        return self.keyers[self.focus]
+
+    def set_focus(self, name):
+        if name in self.keyers: self.focus = name
+        return self.current
+
+    def connected(self):
+        return [k for k in self.keyers.values() if k.link.is_open]
+
+    def close(self):
+        for k in self.keyers.values(): k.close()
+        self._stop = True
+        self._wake()
+        self._thread.join(timeout=1.0)
+
+    # --- Laço de E/S ---
+    def _wake(self):
+        try: self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError): pass  # já há um despertar pendente
+
+    def _attach(self, link):
+        self._ops.put(("add", link, link.ser)); self._wake()
+
+    def _detach(self, link, ser):
+        self._ops.put(("del", link, ser)); self._wake()
+
+    def _apply_ops(self):
+        while True:
+            try: op, link, ser = self._ops.get_nowait()
+            except queue.Empty: return
+            if op == "add":
+                self._links[link] = ser
+                link.want_write = False
+                try:
+                    self._sel.register(ser.fileno(), selectors.EVENT_READ, link)
+                    link.fd = ser.fileno()
+                except (AttributeError, ValueError, OSError):
+                    link.fd = None
+                    self._polled.add(link)
+                    ser.timeout = READ_BLOCK_S
+                    threading.Thread(target=self._reader, args=(link, ser), daemon=True).start()
+            elif op == "fail":
+                # a thread de leitura já avisou o link (_fail)
+                self._drop(link, ser)
+                try: ser.close()
+                except Exception: pass
+            else:
+                self._drop(link, ser)
+                try: ser.close()
+                except Exception: pass
+                link.events.put(("closed", None, time.monotonic()))
+
+    def _drop(self, link, ser):
+        if self._links.get(link) is not ser: return
+        del self._links[link]
+        self._polled.discard(link)
+        try: self._sel.unregister(ser.fileno())
+        except (AttributeError, KeyError, ValueError, OSError): pass  # porta varrida: sem fileno()
+
+    def _service(self, link, ser, readable, writable):
+        try:
+            if readable: link._read(ser)
+            more = link._flush(ser) if writable or link.outbuf else False
+        except Exception as e:
+            self._drop(link, ser)
+            try: ser.close()
+            except Exception: pass
+            return link._fail(ser, e)
+        if link not in self._polled and link in self._links:
+            # só pede EVENT_WRITE enquanto houver bytes presos no buffer de saída
+            if more != link.want_write:
+                link.want_write = more
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if more else 0)
+                try: self._sel.modify(ser.fileno(), events, link)
+                except (KeyError, ValueError, OSError): pass
+
+    def _reader(self, link, ser):
+        # Porta sem select(): read() bloqueia até o primeiro byte (ou
+        # READ_BLOCK_S); sai quando o laço solta a porta
+        while not self._stop and self._links.get(link) is ser:
+            try:
+                link._read(ser)
+            except Exception as e:
+                if self._stop or self._links.get(link) is not ser: return  # fechada por nós
+                self._ops.put(("fail", link, ser)); self._wake()
+                return link._fail(ser, e)
+
+    def _run(self):
+        while not self._stop:
+            # sem select() nas portas varridas, só a escrita presa pede nova tentativa
+            timeout = IO_POLL_S if any(link.outbuf for link in self._polled) else None
+            ready = self._sel.select(timeout)
+            self._apply_ops()
+            served = set()
+            for key, mask in ready:
+                if key.data is None:
+                    try:
+                        while self._wake_r.recv(512): pass
+                    except (BlockingIOError, OSError): pass
+                    continue
+                link = key.data
+                ser = self._links.get(link)
+                if ser is None: continue
+                served.add(link)
+                self._service(link, ser, mask & selectors.EVENT_READ, mask & selectors.EVENT_WRITE)
+            for link, ser in list(self._links.items()):
+                # escritas novas (acordadas pelo write()) e pendentes nas portas varridas
+                if link not in served and link.outbuf: self._service(link, ser, False, True)
+        for link, ser in list(self._links.items()):
+            self._drop(link, ser)
+            try: ser.close()
+            except Exception: pass
+        self._sel.close()
+        self._wake_r.close(); self._wake_w.close()
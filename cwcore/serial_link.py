@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+
+BAUDRATE = 9600
+READ_TIMEOUT = 0.25  # s; o leitor bloqueia em readline() até uma linha ou este tempo
+
+
+class SerialLink:
+    """Conexão serial com o keyer e uma thread leitora bloqueante.
+
+    O leitor não faz polling: espera em readline() com timeout e coloca os
+    eventos numa fila thread-safe, que a interface drena em lotes:
+      ("line", texto, instante)  linha recebida do Arduino
+      ("error", mensagem, instante)  falha de leitura/escrita (ex.: cabo removido)
+      ("closed", None, instante)  o leitor terminou"""
+
+    def __init__(self, baudrate=BAUDRATE, read_timeout=READ_TIMEOUT):
+        self.baudrate = baudrate
+        self.read_timeout = read_timeout
+        self.ser = None
+        self.port = None
+        self.events = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_open(self):
+        return self.ser is not None
+
+    def open(self, port):
+        import serial
+        self.attach(serial.Serial(port, self.baudrate, timeout=self.read_timeout), port)
+
+    def attach(self, ser, port=None):
+        """Usa uma porta já aberta: qualquer objeto com readline() (bloqueando
+        até `read_timeout`), write() e close(), como a porta falsa da bancada
+        (cwcore.bench)."""
+        self.ser = ser
+        self.port = port or getattr(ser, "port", None)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._reader, args=(self.ser,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        ser, self.ser = self.ser, None
+        if ser is not None:
+            try: ser.close()
+            except Exception: pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def write(self, data):
+        if self.ser is None: raise IOError("porta não conectada")
+        try:
+            self.ser.write(data)
+        except Exception as e:
+            self.events.put(("error", f"Falha ao escrever em {self.port}: {e}", time.monotonic()))
+            raise
+
+    def _reader(self, ser):
+        pending = b""
+        while not self._stop.is_set():
+            try:
+                chunk = ser.readline()
+            except Exception as e:
+                if not self._stop.is_set():
+                    self.events.put(("error", f"Porta {self.port} perdida: {e}", time.monotonic()))
+                break
+            if not chunk: continue
+            pending += chunk
+            if not pending.endswith(b"\n"): continue  # timeout no meio da linha
+            line = pending.decode("utf-8", errors="ignore").strip()
+            pending = b""
+            if line: self.events.put(("line", line, time.monotonic()))
+        self.events.put(("closed", None, time.monotonic()))
+
+    def drain(self, limit=200):
+        out = []
+        try:
+            while len(out) < limit:
+                out.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return out
+
+
+def list_ports():
+    import serial.tools.list_ports
+    return [p.device for p in serial.tools.list_ports.comports()]
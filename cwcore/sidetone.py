@@ -0,0 +1,172 @@
+"""Sidetone: transforma texto/macros em áudio com a temporização do keyer.
+
+Precisa do NumPy (opcional para o resto do programa: pip install numpy).
+
+    python -m cwcore.sidetone "CQ TEST DE PP2LA K" -o cq.wav --wpm 25
+    python -m cwcore.sidetone --bulk textos.txt --outdir treino/   # um WAV por linha
+    python -m cwcore.sidetone --bench                              # mede 1 h de CW"""
+import argparse
+import json
+import math
+import os
+import time
+import wave
+
+import numpy as np
+
+from cwcore.morse import compile_timeline, duration_ms
+
+SAMPLE_RATE = 16000
+TONE_HZ = 700
+RISE_MS = 5.0        # subida/descida em cosseno levantado (sem cliques)
+VOLUME = 0.5
+CHUNK_S = 60         # áudio longo é gerado e gravado em blocos deste tamanho
+
+
+class Sidetone:
+    """Gera o áudio de uma linha do tempo [(ligado, ms), ...].
+
+    As fronteiras de cada trecho são arredondadas a partir do tempo
+    acumulado, então o áudio não escorrega em relação ao firmware mesmo em
+    horas de CW. Cada elemento ligado é um bloco pronto (tom × envelope),
+    guardado por tamanho em amostras: só existem alguns (ponto, traço e a
+    variação de ±1 amostra), e eles são copiados em lote para o buffer de
+    saída com indexação do NumPy, sem laço por amostra."""
+
+    def __init__(self, rate=SAMPLE_RATE, freq=TONE_HZ, rise_ms=RISE_MS, volume=VOLUME):
+        self.rate = rate
+        self.freq = freq
+        self.rise_ms = rise_ms
+        self.volume = volume
+        self._blocks = {}
+
+    def element(self, n):
+        """Bloco int16 de um elemento ligado com `n` amostras."""
+        block = self._blocks.get(n)
+        if block is None:
+            t = np.arange(n)
+            wave_ = np.sin(2 * np.pi * self.freq / self.rate * t)
+            rise = min(int(round(self.rise_ms * self.rate / 1000)), n // 2)
+            if rise:
+                edge = 0.5 - 0.5 * np.cos(np.pi * np.arange(rise) / rise)
+                wave_[:rise] *= edge
+                wave_[n - rise:] *= edge[::-1]
+            block = self._blocks[n] = (wave_ * self.volume * 32767).astype(np.int16)
+        return block
+
+    def render(self, runs, start_ms=0.0):
+        """Amostras int16 (mono) da linha do tempo. `start_ms`: onde ela
+        começa num áudio maior (blocks()), para arredondar igual."""
+        if not runs: return np.zeros(0, dtype=np.int16)
+        ms = np.fromiter((m for _, m in runs), dtype=np.float64, count=len(runs))
+        on = np.fromiter((o for o, _ in runs), dtype=bool, count=len(runs))
+        bounds = np.rint((start_ms + np.concatenate(([0.0], np.cumsum(ms)))) * (self.rate / 1000)).astype(np.int64)
+        bounds -= bounds[0]
+        out = np.zeros(int(bounds[-1]), dtype=np.int16)
+        starts = bounds[:-1][on]
+        lens = np.diff(bounds)[on]
+        for n in np.unique(lens):
+            if n <= 0: continue
+            n = int(n)
+            block = self.element(n)
+            at = starts[lens == n]
+            step = max(1, (1 << 20) // n)  # limita o índice temporário a ~1 M de amostras
+            for i in range(0, len(at), step):
+                out[at[i:i + step, None] + np.arange(n)] = block
+        return out
+
+    def blocks(self, runs, chunk_s=CHUNK_S):
+        """Gera o áudio em pedaços de cerca de `chunk_s` segundos (para
+        arquivos longos sem montar tudo na memória). Juntos, os pedaços são
+        idênticos, amostra a amostra, a render(runs)."""
+        start_ms, part, part_ms = 0.0, [], 0.0
+        for run in runs:
+            part.append(run); part_ms += run[1]
+            if part_ms >= chunk_s * 1000:
+                yield self.render(part, start_ms)
+                start_ms += part_ms; part, part_ms = [], 0.0
+        if part: yield self.render(part, start_ms)
+
+    def stream(self, runs, callback, frames=1024):
+        """Entrega o áudio a `callback(amostras_int16)` em blocos de
+        `frames` amostras (ex.: o callback de uma biblioteca de áudio)."""
+        rest = np.zeros(0, dtype=np.int16)
+        for audio in self.blocks(runs):
+            audio = np.concatenate((rest, audio)) if len(rest) else audio
+            full = len(audio) - len(audio) % frames
+            for i in range(0, full, frames): callback(audio[i:i + frames])
+            rest = audio[full:]
+        if len(rest): callback(np.concatenate((rest, np.zeros(frames - len(rest), dtype=np.int16))))
+
+    def write_wav(self, path, runs):
+        """Grava um WAV mono 16 bits. Retorna a duração em segundos."""
+        n = 0
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1); w.setsampwidth(2); w.setframerate(self.rate)
+            for audio in self.blocks(runs):
+                w.writeframes(audio.astype("<i2", copy=False).tobytes()); n += len(audio)
+        return n / self.rate
+
+
+def text_runs(text, wpm, weight=50, farnsworth=0):
+    return compile_timeline(text, wpm, weight, farnsworth)
+
+
+def render_text(text, wpm=20, weight=50, farnsworth=0, **kw):
+    return Sidetone(**kw).render(text_runs(text, wpm, weight, farnsworth))
+
+
+def run_bench(minutes=60, wpm=25, rate=SAMPLE_RATE):
+    """Tempo para gerar `minutes` minutos de CW (texto de concurso repetido)."""
+    unit = compile_timeline("CQ TEST DE PP2LA PP2LA TEST ", wpm)
+    reps = math.ceil(minutes * 60000 / duration_ms(unit))
+    runs = unit * reps
+    tone = Sidetone(rate=rate)
+    t0 = time.perf_counter()
+    audio = tone.render(runs)
+    render_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    joined = np.concatenate(list(tone.blocks(runs)))
+    blocks_s = time.perf_counter() - t0
+    return {"audio_s": round(len(audio) / rate, 1), "runs": len(runs), "rate": rate,
+            "render_s": round(render_s, 3), "blocks_s": round(blocks_s, 3),
+            "blocks_identical": bool(np.array_equal(joined, audio))}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m cwcore.sidetone", description="Gera o áudio (WAV) de textos em CW")
+    ap.add_argument("text", nargs="*")
+    ap.add_argument("-o", "--output", default="cw.wav")
+    ap.add_argument("--bulk", help="arquivo de texto: um WAV por linha não vazia")
+    ap.add_argument("--outdir", default=".")
+    ap.add_argument("--wpm", type=int, default=20)
+    ap.add_argument("--weight", type=int, default=50)
+    ap.add_argument("--farnsworth", type=int, default=0)
+    ap.add_argument("--freq", type=float, default=TONE_HZ)
+    ap.add_argument("--rate", type=int, default=SAMPLE_RATE)
+    ap.add_argument("--rise", type=float, default=RISE_MS, help="ms de subida/descida")
+    ap.add_argument("--bench", action="store_true", help="mede a geração de 1 h de CW e sai")
+    args = ap.parse_args(argv)
+
+    if args.bench:
+        print(json.dumps(run_bench(wpm=args.wpm, rate=args.rate)))
+        return 0
+    tone = Sidetone(args.rate, args.freq, args.rise)
+    if args.bulk:
+        os.makedirs(args.outdir, exist_ok=True)
+        with open(args.bulk, "r", encoding="utf-8") as f:
+            lines = [l.strip() for l in f if l.strip()]
+        for i, line in enumerate(lines, 1):
+            path = os.path.join(args.outdir, f"{i:04d}.wav")
+            secs = tone.write_wav(path, text_runs(line, args.wpm, args.weight, args.farnsworth))
+            print(f"{path}: {secs:.1f} s  {line}")
+        return 0
+    if not args.text: ap.error("informe o texto ou --bulk")
+    text = " ".join(args.text)
+    secs = tone.write_wav(args.output, text_runs(text, args.wpm, args.weight, args.farnsworth))
+    print(f"{args.output}: {secs:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
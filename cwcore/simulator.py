@@ -0,0 +1,509 @@
+"""Simulador do CWarduino.ino num pseudo-terminal (Linux/macOS).
+
+Uso:
+    python -m cwcore.simulator            # cria a porta e mostra o caminho
+    python -m cwcore.simulator --bench    # mede vazão e latência até o DONE
+    python -m cwcore.simulator --abort-bench  # mede ESC -> relé solto
+    python -m cwcore.simulator --radios 2     # duas portas, para testar SO2R
+    python -m cwcore.simulator --so2r-bench   # dois rádios em paralelo, um travado
+
+No app, digite o caminho mostrado (ex.: /dev/pts/3) na caixa de porta e
+clique em Conectar."""
+import argparse
+import json
+import os
+import pty
+import threading
+import time
+import tty
+from collections import deque
+
+from cwcore.morse import MORSE_TABLE, crc8, decode_runs, unit_ms
+
+RX_BUFFER = 64           # buffer de recepção do HardwareSerial do Uno
+BYTE_TIME = 10 / 9600    # 9600 baud, 8N1
+STREAM_TIMEOUT = 1.0     # quadro incompleto é descartado após este tempo
+FRAME_SOF = 0xFE
+ABORT_BYTE = 0x18
+MAX_FRAME = 256
+TX_SIZE = 128            # fila de caracteres do firmware
+LINE_MAX = 95
+MARK_FRAME = "\x01"
+
+# Estados do manipulador e da recepção, como no CWarduino.ino
+K_IDLE, K_ON, K_GAP, K_SPACE, K_RUN = range(5)
+RX_LINE, RX_LEN0, RX_LEN1, RX_DATA, RX_CRC, RX_SKIP = range(6)
+
+
+def firmware_chars(text, wpm):
+    """Trechos que o firmware gera para cada caractere de `text` de uma linha
+    só (inclusive o descarte silencioso de caracteres fora da tabela)."""
+    u = unit_ms(wpm)
+    for i, c in enumerate(text):
+        if c == " ":
+            yield [(False, 6 * u)]; continue
+        pattern = MORSE_TABLE.get(c.upper())
+        if pattern is None:
+            yield []; continue
+        runs = []
+        for el in pattern:
+            runs.append((True, u if el == "." else 3 * u))
+            runs.append((False, u))
+        if i < len(text) - 1 and text[i + 1] != " ":
+            runs.append((False, 2 * u))
+        yield runs
+
+
+def firmware_timeline(text, wpm):
+    return [run for runs in firmware_chars(text, wpm) for run in runs]
+
+
+class ArduinoSimulator:
+    def __init__(self, wpm=20, speed=1.0):
+        self.wpm = wpm
+        self.speed = speed       # >1 acelera o tempo de manipulação (testes)
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.rx = bytearray()
+        self.cond = threading.Condition()
+        self.overflows = 0       # bytes perdidos com o buffer cheio
+        self.rx_bytes = 0
+        self.key_down = False
+        self.key_events = []     # (instante, ligado)
+        self.lines_out = []      # (instante, linha) enviadas ao PC
+        self.running = False
+        # estado do firmware
+        self.t0 = time.monotonic()
+        self.unit = unit_ms(wpm)
+        self.pending_wpm = 0
+        self.txbuf = deque()
+        self.kstate = K_IDLE
+        self.next_at = 0.0
+        self.pattern, self.el = None, 0
+        self.letter_gap_due = False
+        self.char_end_at = 0.0
+        self.frame, self.frame_queued, self.runs = b"", False, []
+        self.rx_state, self.rx_len, self.rx_data = RX_LINE, 0, bytearray()
+        self.rx_frame_at = 0.0
+        self.rx_skip = 0
+        self.line = bytearray()
+        self.line_long = False
+
+    # --- Ciclo de vida ---
+    def start(self):
+        self.running = True
+        for target in (self._uart, self._firmware):
+            threading.Thread(target=target, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.cond: self.cond.notify_all()
+        for fd in (self.master, self.slave):
+            try: os.close(fd)
+            except OSError: pass
+
+    # --- UART: entrega os bytes no ritmo de 9600 baud ao buffer de 64 bytes ---
+    def _uart(self):
+        next_t = time.monotonic()
+        while self.running:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            if not data: break
+            for b in data:
+                next_t = max(next_t, time.monotonic()) + BYTE_TIME
+                delay = next_t - time.monotonic()
+                if delay > 0: time.sleep(delay)
+                with self.cond:
+                    self.rx_bytes += 1
+                    if len(self.rx) >= RX_BUFFER:
+                        self.overflows += 1
+                    else:
+                        self.rx.append(b); self.cond.notify()
+
+    # --- Relé ---
+    def _set_key(self, on):
+        if on != self.key_down:
+            self.key_down = on
+            self.key_events.append((time.monotonic(), on))
+
+    def _millis(self):
+        # relógio do firmware, acelerado por `speed`
+        return (time.monotonic() - self.t0) * 1000 * self.speed
+
+    def _println(self, text):
+        self.lines_out.append((time.monotonic(), text))
+        try: os.write(self.master, (text + "\r\n").encode())
+        except OSError: pass
+
+    # --- loop() do firmware: lê a serial e avança a máquina de estados ---
+    def _firmware(self):
+        self.t0 = time.monotonic()
+        self._update_speed(self.wpm)
+        while self.running:
+            with self.cond:
+                data = bytes(self.rx); self.rx.clear()
+            for b in data: self._handle_byte(b)
+            if self.rx_state != RX_LINE and time.monotonic() - self.rx_frame_at > STREAM_TIMEOUT:
+                if self.rx_state != RX_SKIP: self._println("ERR: FRAME")
+                self.rx_state = RX_LINE
+            self._update_keyer()
+            # dorme até o próximo byte ou o fim do estado atual (sem girar em falso)
+            with self.cond:
+                if self.rx or not self.running: continue
+                wait = 0.1 if self.kstate == K_IDLE else (self.next_at - self._millis()) / 1000 / self.speed
+                if wait > 0: self.cond.wait(min(wait, 0.1))
+
+    def _update_speed(self, wpm):
+        self.wpm = wpm
+        self.unit = unit_ms(wpm)
+        self._println(f"INFO: Velocidade ajustada para {wpm} WPM")
+
+    def _report_status(self):
+        state = "IDLE" if self.kstate == K_IDLE else "KEYING"
+        self._println(f"STATUS: {state} WPM={self.wpm} FILA={len(self.txbuf)}")
+
+    def _set_idle(self):
+        was_keying = self.kstate != K_IDLE
+        self._set_key(False)
+        self.kstate = K_IDLE
+        self.pattern = None
+        if was_keying: self._report_status()
+
+    def _abort(self):
+        self._set_key(False)
+        self.txbuf.clear()
+        self.frame_queued = False
+        self.letter_gap_due = False
+        self._println("ABORT")
+        self._set_idle()
+
+    def _key_element(self, now):
+        el = self.pattern[self.el]; self.el += 1
+        self._set_key(True)
+        self.kstate = K_ON
+        self.next_at = now + (3 * self.unit if el == "-" else self.unit)
+
+    def _next_run(self, now):
+        if not self.runs: return False
+        on, ms = self.runs.pop(0)
+        self._set_key(on)
+        self.kstate = K_RUN
+        self.next_at = now + ms
+        return True
+
+    def _start_next(self, now):
+        # limite de caractere: aplica /wpm pendente e pega o próximo da fila
+        if self.pending_wpm:
+            self._update_speed(self.pending_wpm); self.pending_wpm = 0
+        while self.txbuf:
+            c = self.txbuf[0]
+            if c == "\n":
+                self.txbuf.popleft(); self._println("DONE"); continue
+            if c == " ":
+                self.txbuf.popleft(); self.letter_gap_due = False
+                self.kstate = K_SPACE; self.next_at = now + 6 * self.unit
+                return
+            if c == MARK_FRAME:
+                self.txbuf.popleft()
+                self.runs = decode_runs(self.frame)
+                if self.frame_queued and self._next_run(now): return
+                self.frame_queued = False; self._println("DONE"); continue
+            pattern = MORSE_TABLE.get(c.upper())
+            if pattern is None:
+                self.txbuf.popleft(); continue
+            if self.letter_gap_due:
+                self.letter_gap_due = False
+                start = self.char_end_at + 2 * self.unit
+                if now < start:
+                    self.kstate = K_SPACE; self.next_at = start
+                    return
+            self.txbuf.popleft()
+            self.pattern, self.el = pattern, 0
+            self._key_element(now)
+            return
+        self._set_idle()
+
+    def _update_keyer(self):
+        now = self._millis()
+        if self.kstate == K_IDLE:
+            if self.txbuf:
+                self._start_next(now)
+                if self.kstate != K_IDLE: self._report_status()
+            return
+        if now < self.next_at: return
+        now = self.next_at  # não acumula o atraso do loop()
+        if self.kstate == K_ON:
+            self._set_key(False)
+            self.kstate = K_GAP; self.next_at = now + self.unit
+        elif self.kstate == K_GAP:
+            if self.el < len(self.pattern):
+                self._key_element(now); return
+            self.pattern = None
+            self.letter_gap_due = True; self.char_end_at = now
+            self._start_next(now)
+        elif self.kstate == K_RUN:
+            if self._next_run(now): return
+            self._set_key(False)
+            self.frame_queued = False; self._println("DONE")
+            self._start_next(now)
+        elif self.kstate == K_SPACE:
+            self._start_next(now)
+
+    # --- Entrada serial byte a byte ---
+    def _handle_line(self):
+        raw = self.line.decode("utf-8", errors="ignore")
+        self.line.clear()
+        if self.line_long:
+            self.line_long = False; return self._println("ERR: LONG")
+        if raw.startswith("~"):
+            # texto contínuo: sem eco e sem strip
+            if len(raw) > TX_SIZE - 1 - len(self.txbuf): return self._println("ERR: FULL")
+            self.txbuf.extend(raw[1:]); self.txbuf.append("\n")
+            return
+        line = raw.strip()
+        if not line: return
+        if line.startswith("/wpm"):
+            try: val = int(line[5:].strip() or 0)
+            except ValueError: val = 0
+            if val <= 0: return
+            if self.kstate == K_IDLE: self._update_speed(val)
+            else: self.pending_wpm = val
+        elif line.startswith("/status"):
+            self._report_status()
+        else:
+            if len(line) + 1 > TX_SIZE - 1 - len(self.txbuf):
+                return self._println("ERR: FULL")
+            self._println(f"TX: {line}")
+            self.txbuf.extend(line); self.txbuf.append("\n")
+
+    def _handle_byte(self, b):
+        if b == ABORT_BYTE and self.rx_state == RX_LINE:
+            self.line.clear(); self.line_long = False; return self._abort()
+        if self.rx_state == RX_LINE:
+            if b == FRAME_SOF and not self.line:
+                self.rx_state = RX_LEN0; self.rx_frame_at = time.monotonic()
+            elif b == ord("\n"): self._handle_line()
+            elif b == ord("\r"): pass
+            elif len(self.line) < LINE_MAX: self.line.append(b)
+            else: self.line_long = True
+        elif self.rx_state == RX_LEN0:
+            self.rx_len = b; self.rx_state = RX_LEN1
+        elif self.rx_state == RX_LEN1:
+            self.rx_len |= b << 8
+            self.rx_data = bytearray()
+            if self.rx_len > MAX_FRAME or self.frame_queued:
+                self._println("ERR: BUSY" if self.frame_queued else "ERR: FRAME")
+                self.rx_skip = self.rx_len + 1; self.rx_state = RX_SKIP  # payload e CRC
+            else:
+                self.rx_state = RX_DATA if self.rx_len else RX_CRC
+        elif self.rx_state == RX_DATA:
+            self.rx_data.append(b)
+            if len(self.rx_data) >= self.rx_len: self.rx_state = RX_CRC
+        elif self.rx_state == RX_CRC:
+            self.rx_state = RX_LINE
+            if b != crc8(self.rx_data): return self._println("ERR: CRC")
+            if len(self.txbuf) >= TX_SIZE - 1: return self._println("ERR: FULL")
+            self.frame = bytes(self.rx_data); self.frame_queued = True
+            self._println(f"TX: BIN {len(self.frame)}")
+            self.txbuf.append(MARK_FRAME)
+        elif self.rx_state == RX_SKIP:
+            self.rx_skip -= 1
+            if not self.rx_skip: self.rx_state = RX_LINE
+
+
+# ================== BANCADA ==================
+def run_bench(messages=10, text="CQ TEST DE PP2LA K", wpm=40, speed=1.0, gated=False):
+    """Envia `messages` mensagens pelo SerialLink e mede o tempo até cada DONE.
+
+    Sem `gated`, escreve tudo de uma vez: o firmware enfileira até 128
+    caracteres e responde "ERR: FULL" ao que não couber. Com `gated`, só
+    envia a próxima mensagem após o DONE da anterior."""
+    from cwcore.morse import duration_ms
+    from cwcore.serial_link import SerialLink
+
+    sim = ArduinoSimulator(wpm=wpm, speed=speed).start()
+    link = SerialLink()
+    link.open(sim.port)
+    time.sleep(0.3); link.drain()
+    link.write(f"/wpm {wpm}\n".encode())
+    time.sleep(0.3); link.drain()
+
+    payload = (text + "\n").encode()
+    expected_ms = duration_ms(firmware_timeline(text, wpm)) / speed
+    sent_at, done_at = [], []
+    t0 = time.monotonic()
+
+    def wait_done(deadline):
+        n = len(done_at)
+        while time.monotonic() < deadline:
+            done_at.extend(t for kind, data, t in link.drain() if kind == "line" and data == "DONE")
+            if len(done_at) > n: return True
+            time.sleep(0.005)
+        return False
+
+    budget = (expected_ms / 1000 + 1.5) * messages + 3
+    if gated:
+        for _ in range(messages):
+            sent_at.append(time.monotonic()); link.write(payload)
+            if not wait_done(time.monotonic() + expected_ms / 1000 + 3): break
+    else:
+        for _ in range(messages):
+            sent_at.append(time.monotonic()); link.write(payload)
+        end = time.monotonic() + budget
+        while len(done_at) < messages and wait_done(end): pass
+
+    elapsed = time.monotonic() - t0
+    link.close(); sim.stop()
+    lat = [d - s for s, d in zip(sent_at, done_at)]
+    keyed = len(done_at) * len(text)
+    return {
+        "mode": "gated" if gated else "burst",
+        "wpm": wpm, "speed": speed, "messages": messages,
+        "completed": len(done_at),
+        "rx_bytes": sim.rx_bytes, "overflow_bytes": sim.overflows,
+        "expected_ms_per_message": round(expected_ms, 1),
+        "done_latency_ms": {
+            "first": round(lat[0] * 1000, 1) if lat else None,
+            "max": round(max(lat) * 1000, 1) if lat else None,
+        },
+        "completion_overhead_ms": round((lat[0] * 1000 - expected_ms), 1) if lat else None,
+        "throughput_chars_per_s": round(keyed / elapsed, 2) if elapsed else 0,
+    }
+
+
+def run_abort_bench(trials=5, text="CQ CQ CQ DE PP2LA PP2LA PP2LA K", wpm=20, speed=1.0):
+    """Mede o tempo entre o ESC (byte CAN escrito) e o relé solto / "ABORT"."""
+    import random
+    from cwcore.serial_link import SerialLink
+    from cwcore.txqueue import ABORT_BYTE as CAN
+
+    sim = ArduinoSimulator(wpm=wpm, speed=speed).start()
+    link = SerialLink()
+    link.open(sim.port)
+    time.sleep(0.3); link.drain()
+    key_up, confirm = [], []
+    for _ in range(trials):
+        link.write((text + "\n").encode())
+        time.sleep(random.uniform(0.5, 1.5) / speed)
+        t_abort = time.monotonic()
+        link.write(CAN)
+        end = t_abort + 5
+        got = None
+        while time.monotonic() < end and got is None:
+            for kind, data, t in link.drain():
+                if kind == "line" and data == "ABORT": got = t
+            time.sleep(0.002)
+        if got is None: continue
+        confirm.append(got - t_abort)
+        # último key-up antes da confirmação: depois dele o relé não fecha mais
+        last_off = max((t for t, on in sim.key_events if not on and t <= got), default=t_abort)
+        key_up.append(max(0.0, last_off - t_abort))
+        time.sleep(0.2); link.drain()
+    link.close(); sim.stop()
+    ms = lambda v: round(v * 1000, 1)
+    return {
+        "wpm": wpm, "trials": trials, "confirmed": len(confirm),
+        "key_up_ms": {"mean": ms(sum(key_up) / len(key_up)) if key_up else None, "max": ms(max(key_up)) if key_up else None},
+        "abort_reply_ms": {"mean": ms(sum(confirm) / len(confirm)) if confirm else None, "max": ms(max(confirm)) if confirm else None},
+    }
+
+
+def run_so2r_bench(messages=3, text="CQ TEST DE PP2LA K", wpm=40, speed=1.0):
+    """Dois rádios num RadioManager: mede o DONE de cada um transmitindo ao
+    mesmo tempo e, depois, o do rádio 2 enquanto a porta do rádio 1 está
+    travada (ninguém lê o outro lado, o buffer do sistema enche)."""
+    from cwcore.morse import duration_ms
+    from cwcore.radios import RadioManager
+
+    expected = duration_ms(firmware_timeline(text, wpm)) / speed / 1000
+    sims = [ArduinoSimulator(wpm=wpm, speed=speed).start() for _ in range(2)]
+    mgr = RadioManager(("R1", "R2"), wpm)
+    keyers = list(mgr.keyers.values())
+    for k, sim in zip(keyers, sims): k.connect(sim.port)
+    time.sleep(0.3)
+    for k in keyers: k.poll(); k.set_wpm(wpm)
+    time.sleep(0.3)
+    for k in keyers: k.poll()
+
+    def run(active):
+        t0 = time.monotonic()
+        done = {k.name: [] for k in active}
+        for k in active:
+            for _ in range(messages): k.send(text)
+        end = t0 + (expected + 3) * messages
+        while time.monotonic() < end and any(len(done[k.name]) < messages for k in active):
+            for k in active:
+                done[k.name] += [time.monotonic() - t0 for kind, _, _ in k.poll() if kind == "done"]
+            time.sleep(0.002)
+        return {name: [round(t * 1000, 1) for t in ts] for name, ts in done.items()}
+
+    parallel = run(keyers)
+
+    # rádio 1 numa porta que ninguém lê: as escritas ficam presas no buffer dele
+    stuck_master, stuck_slave = pty.openpty()
+    tty.setraw(stuck_slave)
+    keyers[0].close(); time.sleep(0.05)
+    keyers[0].connect(os.ttyname(stuck_slave))
+    flood = b"X" * 4096
+    t_flood = time.monotonic()
+    for _ in range(64): keyers[0].link.write(flood)
+    flood_ms = (time.monotonic() - t_flood) * 1000
+    stalled = run(keyers[1:])
+    stuck_bytes = keyers[0].link.pending_out
+
+    mgr.close()
+    for sim in sims: sim.stop()
+    for fd in (stuck_master, stuck_slave): os.close(fd)
+    return {
+        "wpm": wpm, "messages": messages, "expected_ms_per_message": round(expected * 1000, 1),
+        "parallel_done_ms": parallel,
+        "with_stalled_r1": {"r2_done_ms": stalled["R2"], "r1_bytes_stuck": stuck_bytes,
+                            "flood_write_ms": round(flood_ms, 2)},
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Simulador do keyer CWarduino.ino")
+    ap.add_argument("--wpm", type=int, default=20)
+    ap.add_argument("--speed", type=float, default=1.0, help="fator de aceleração do tempo de manipulação")
+    ap.add_argument("--bench", action="store_true", help="roda a bancada de vazão/latência e sai")
+    ap.add_argument("--messages", type=int, default=10)
+    ap.add_argument("--abort-bench", action="store_true", help="mede a latência do ESC até o relé soltar")
+    ap.add_argument("--so2r-bench", action="store_true", help="dois rádios ao mesmo tempo, um deles travado")
+    ap.add_argument("--radios", type=int, default=1, help="quantos keyers simular (SO2R: 2)")
+    args = ap.parse_args(argv)
+
+    if args.bench:
+        for gated in (False, True):
+            print(json.dumps(run_bench(args.messages, wpm=args.wpm, speed=args.speed, gated=gated)))
+        return
+    if args.abort_bench:
+        print(json.dumps(run_abort_bench(wpm=args.wpm, speed=args.speed)))
+        return
+    if args.so2r_bench:
+        print(json.dumps(run_so2r_bench(wpm=args.wpm, speed=args.speed)))
+        return
+
+    sims = [ArduinoSimulator(wpm=args.wpm, speed=args.speed).start() for _ in range(max(1, args.radios))]
+    for i, sim in enumerate(sims):
+        print(f"Simulador {i + 1} pronto em {sim.port}" + (" (Ctrl+C para sair)" if i == len(sims) - 1 else ""))
+    last = [0] * len(sims)
+    try:
+        while True:
+            time.sleep(0.2)
+            for i, sim in enumerate(sims):
+                tag = f"R{i + 1} " if len(sims) > 1 else ""
+                for t, line in sim.lines_out[last[i]:]: print(f"  {tag}-> {line}")
+                last[i] = len(sim.lines_out)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sim in sims: sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import bisect
+import datetime
+from collections import Counter, deque
+from operator import add, itemgetter
+
+from cwcore.logbook import COL_DATE, COL_TIME, COL_CALL, COL_BAND, COL_MODE
+
+RATE_WINDOW_MIN = 60   # maior janela de taxa; QSOs mais antigos saem da fila
+RECENT_SCAN = 5000     # registros finais examinados para a taxa ao reconstruir
+
+_hour = itemgetter(slice(0, 2))
+
+
+def qso_minute(date, time):
+    """Minuto UTC (desde a época) de QSO_DATE/TIME_ON, ou None se inválido."""
+    try:
+        d = datetime.datetime(int(date[0:4]), int(date[4:6]), int(date[6:8]), int(time[0:2]), int(time[2:4]))
+    except (ValueError, IndexError):
+        return None
+    return int(d.replace(tzinfo=datetime.timezone.utc).timestamp()) // 60
+
+
+def utc_minute():
+    return int(datetime.datetime.now(datetime.timezone.utc).timestamp()) // 60
+
+
+class LogStats:
+    """Estatísticas do logbook mantidas em memória.
+
+    rebuild() processa o log inteiro coluna a coluna (Counter/set sobre
+    map/zip, sem laço Python por registro); add_rows() atualiza os mesmos
+    agregados só com os QSOs novos. `dxcc` é uma função call -> nome da
+    entidade (ou None), consultada uma vez por indicativo distinto."""
+
+    def __init__(self, dxcc=None):
+        self.dxcc = dxcc or (lambda call: None)
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.band_mode = Counter()   # (banda, modo) -> QSOs
+        self.calls = set()
+        self.entities = Counter()    # entidade -> QSOs
+        self.per_hour = Counter()    # "AAAAMMDDHH" -> QSOs
+        self.recent = deque()        # minutos UTC dos QSOs da última hora (ordenados)
+        self.version = 0             # muda a cada atualização (a aba só redesenha se mudou)
+
+    def rebuild(self, rows):
+        self.reset()
+        if not rows: return self
+        dates, times, calls, bands, modes = (list(map(itemgetter(c), rows))
+                                             for c in (COL_DATE, COL_TIME, COL_CALL, COL_BAND, COL_MODE))
+        calls = list(map(str.upper, calls))
+        self.total = len(rows)
+        self.band_mode = Counter(zip(map(str.upper, bands), map(str.upper, modes)))
+        self.per_hour = Counter(map(add, dates, map(_hour, times)))
+        by_call = Counter(calls)
+        self.calls = set(by_call)
+        self.calls.discard("")
+        for call, n in by_call.items():
+            name = self.dxcc(call) if call else None
+            if name: self.entities[name] += n
+        self._rebuild_recent(rows[-RECENT_SCAN:])
+        self.version += 1
+        return self
+
+    def add_rows(self, rows):
+        now = utc_minute()
+        for row in rows:
+            call = row[COL_CALL].upper()
+            self.total += 1
+            self.band_mode[(row[COL_BAND].upper(), row[COL_MODE].upper())] += 1
+            self.per_hour[row[COL_DATE] + row[COL_TIME][:2]] += 1
+            if call:
+                self.calls.add(call)
+                name = self.dxcc(call)
+                if name: self.entities[name] += 1
+            m = qso_minute(row[COL_DATE], row[COL_TIME])
+            if m is not None: self._push_recent(m, now)
+        self.version += 1
+
+    # --- Taxa ---
+    def _rebuild_recent(self, rows):
+        now = utc_minute()
+        mins = (qso_minute(r[COL_DATE], r[COL_TIME]) for r in rows)
+        self.recent = deque(sorted(m for m in mins if m is not None and now - m < RATE_WINDOW_MIN))
+
+    def _push_recent(self, m, now):
+        if now - m >= RATE_WINDOW_MIN: return  # fora da janela (ex.: importado)
+        if not self.recent or m >= self.recent[-1]: self.recent.append(m)
+        else: bisect.insort(self.recent, m)  # fora de ordem, mas dentro da janela
+
+    def rate(self, minutes, now=None):
+        """QSOs nos últimos `minutes` minutos (até RATE_WINDOW_MIN)."""
+        now = utc_minute() if now is None else now
+        while self.recent and now - self.recent[0] >= RATE_WINDOW_MIN:
+            self.recent.popleft()
+        return sum(1 for m in reversed(self.recent) if now - m < minutes)
+
+    # --- Consultas para a interface ---
+    def bands(self):
+        out = Counter()
+        for (band, _), n in self.band_mode.items(): out[band] += n
+        return out
+
+    def modes(self):
+        return sorted({mode for _, mode in self.band_mode})
+
+    def last_hours(self, n=24):
+        """[(hora "AAAA-MM-DD HHh", QSOs)] das `n` horas mais recentes com QSOs."""
+        keys = sorted(self.per_hour)[-n:]
+        return [(f"{k[0:4]}-{k[4:6]}-{k[6:8]} {k[8:10]}h", self.per_hour[k]) for k in reversed(keys)]
@@ -0,0 +1,184 @@
+import time
+from collections import deque
+
+ABORT_BYTE = b"\x18"      # CAN: o firmware para de manipular e responde "ABORT"
+DONE_MARGIN_S = 2.0       # folga sobre a duração estimada antes de desistir do DONE
+ABORT_TIMEOUT_S = 2.0
+STREAM_PREFIX = b"~"      # linha de texto contínuo: sem eco, espaços preservados
+STREAM_WINDOW = 48        # bytes de texto contínuo em trânsito (fila do firmware: 128)
+LINE_MAX = 95             # maior linha aceita pelo firmware (lineBuf[96]); acima: ERR: LONG
+
+
+def split_lines(text, limit=LINE_MAX):
+    """Divide uma mensagem de texto em linhas de até `limit` caracteres, nos
+    espaços quando possível. A primeira é uma linha normal (eco TX:); as
+    demais vão no modo contínuo ("~"), que mantém o espaço da emenda."""
+    lines, rest, room = [], text, limit
+    while len(rest) > room:
+        cut = rest.rfind(" ", 1, room + 1)  # o espaço fica no início da próxima
+        if cut <= 0: cut = room
+        lines.append(rest[:cut]); rest = rest[cut:]
+        room = limit - len(STREAM_PREFIX)
+    lines.append(rest)
+    return lines[:1] + ["~" + l for l in lines[1:]]
+
+
+class TxItem:
+    __slots__ = ("text", "payloads", "est_ms", "sent_at", "trace")
+
+    def __init__(self, text, payloads, est_ms, trace=None):
+        self.text = text
+        self.payloads = list(payloads)  # bytes a escrever, um por DONE (texto: 1; timeline: 1 por quadro)
+        self.est_ms = est_ms
+        self.sent_at = None
+        self.trace = trace  # instantes das etapas (cwcore.latency), ou None
+
+
+class TxScheduler:
+    """Fila de transmissão do lado do PC.
+
+    Libera uma mensagem (ou quadro) por vez e só envia a próxima depois do
+    DONE do firmware, então o buffer de 64 bytes do Arduino nunca enche.
+    Se o DONE não vier (firmware antigo, cabo), a mensagem é liberada após
+    a duração estimada mais DONE_MARGIN_S. Os métodos retornam eventos
+    (tipo, item, info) para a interface:
+      ("sent", item, None), ("done", item, None), ("timeout", item, None),
+      ("error", item, linha ERR do firmware),
+      ("abort", None, latência em s ou None se o firmware não confirmou),
+      ("streamed", None, None) quando um pedaço de texto contínuo termina.
+
+    No modo contínuo (stream) os pedaços digitados não esperam DONE um do
+    outro: vão direto ao firmware enquanto couberem em STREAM_WINDOW, e as
+    mensagens normais esperam o texto contínuo em trânsito terminar."""
+
+    def __init__(self, write, clock=time.monotonic):
+        self.write = write
+        self.clock = clock
+        self.pending = deque()
+        self.current = None
+        self.deadline = 0.0
+        self.abort_at = None
+        self.stream_hold = deque()   # (bytes, ms) ainda não enviados
+        self.streaming = deque()     # tamanhos dos pedaços aguardando DONE
+        self.stream_bytes = 0
+        self.stream_deadline = 0.0
+
+    def __len__(self):
+        stream = 1 if (self.streaming or self.stream_hold) else 0
+        return len(self.pending) + (1 if self.current else 0) + stream
+
+    @property
+    def busy(self):
+        return self.current is not None
+
+    def submit(self, text, payloads, est_ms, trace=None):
+        if trace is not None: trace["submit"] = self.clock()
+        self.pending.append(TxItem(text, payloads, est_ms, trace))
+        return self.pump()
+
+    def stream(self, text, est_ms):
+        # texto colado pode passar de uma linha do firmware: vai em pedaços
+        data = text.encode()
+        step = LINE_MAX - len(STREAM_PREFIX)
+        for i in range(0, len(data) or 1, step):
+            part = data[i:i + step]
+            share = est_ms * len(part) / len(data) if data else est_ms
+            self.stream_hold.append((STREAM_PREFIX + part + b"\n", share))
+        self._flush_stream()
+
+    def _flush_stream(self):
+        while self.stream_hold and self.current is None and not self.pending:
+            data, est_ms = self.stream_hold[0]
+            if self.streaming and self.stream_bytes + len(data) > STREAM_WINDOW: break
+            try:
+                self.write(data)
+            except Exception:
+                self.stream_hold.clear(); return
+            self.stream_hold.popleft()
+            self.streaming.append(len(data)); self.stream_bytes += len(data)
+            self.stream_deadline = max(self.stream_deadline, self.clock()) + est_ms / 1000
+
+    def pump(self):
+        if self.current is not None or self.streaming: return []
+        if not self.pending:
+            self._flush_stream(); return []
+        item = self.pending.popleft()
+        self.current = item
+        item.sent_at = self.clock()
+        self.deadline = item.sent_at + item.est_ms / 1000 + DONE_MARGIN_S
+        if item.trace is not None: item.trace["write_start"] = item.sent_at
+        try:
+            self.write(item.payloads.pop(0))
+        except Exception:
+            self.current = None; self.pending.clear()
+            return []
+        if item.trace is not None: item.trace["write"] = self.clock()
+        return [("sent", item, None)]
+
+    def on_line(self, line, at=None):
+        # `at`: instante em que o leitor recebeu a linha (para o trace de latência)
+        if line in ("DONE", "ERR: FULL") and self.streaming:
+            # o firmware responde na ordem: texto contínuo enviado antes do item atual
+            self.stream_bytes -= self.streaming.popleft()
+            self._flush_stream()
+            return [("streamed", None, None)] + self.pump()
+        if line.startswith("TX:") and self.current is not None:
+            # eco do firmware: a mensagem chegou e foi enfileirada para manipular
+            trace = self.current.trace
+            if trace is not None and "echo" not in trace: trace["echo"] = at or self.clock()
+            return []
+        if line == "DONE" and self.current is not None:
+            item = self.current
+            if item.payloads:
+                # próximo quadro da mesma mensagem
+                try: self.write(item.payloads.pop(0))
+                except Exception: self.current = None; return []
+                return []
+            self.current = None
+            if item.trace is not None: item.trace["done"] = at or self.clock()
+            return [("done", item, None)] + self.pump()
+        if line.startswith("ERR:") and self.current is not None:
+            # firmware recusou (fila cheia, CRC): não virá DONE para este item
+            item, self.current = self.current, None
+            return [("error", item, line)] + self.pump()
+        if line == "ABORT" and self.abort_at is not None:
+            latency = self.clock() - self.abort_at
+            self.abort_at = None
+            return [("abort", None, latency)]
+        return []
+
+    def abort(self):
+        """ESC: esvazia a fila do PC e manda o firmware soltar o relé."""
+        self.reset()
+        self.abort_at = self.clock()
+        try: self.write(ABORT_BYTE)
+        except Exception: pass
+
+    def tick(self):
+        # Chamado periodicamente pela interface: trata DONE/ABORT que não vieram
+        now = self.clock()
+        events = []
+        if self.abort_at is not None and now - self.abort_at > ABORT_TIMEOUT_S:
+            self.abort_at = None
+            events.append(("abort", None, None))
+        if self.streaming and now > self.stream_deadline + DONE_MARGIN_S:
+            # firmware sem modo contínuo (ou DONE perdido): libera a janela
+            self.streaming.clear(); self.stream_bytes = 0
+            self._flush_stream()
+            events += self.pump()
+        if self.current is not None and now > self.deadline:
+            item, self.current = self.current, None
+            events.append(("timeout", item, None))
+            events += self.pump()
+        return events
+
+    def reset(self):
+        self.pending.clear()
+        self.current = None
+        self.abort_at = None
+        self.stream_hold.clear(); self.streaming.clear()
+        self.stream_bytes = 0
+
+    def preview(self, n=3):
+        items = ([self.current] if self.current else []) + list(self.pending)
+        return [i.text for i in items[:n]]
@@ -0,0 +1,65 @@
+from bisect import bisect_left, insort
+
+
+class WorkedEntry:
+    __slots__ = ("bands", "modes", "pairs")
+
+    def __init__(self):
+        self.bands = set()
+        self.modes = set()
+        self.pairs = set()   # (banda, modo)
+
+
+class WorkedIndex:
+    """Índice em memória de indicativos já trabalhados.
+
+    Montado uma vez a partir do logbook e atualizado a cada QSO; as consultas
+    (exata e por prefixo) não tocam no arquivo. Adicionar o mesmo QSO duas
+    vezes não tem efeito."""
+
+    def __init__(self):
+        self.calls = {}
+        self.sorted_calls = []
+
+    def build(self, qsos):
+        # qsos: iterável de (call, banda, modo)
+        self.calls = {}
+        for call, band, mode in qsos:
+            call = call.strip().upper()
+            if call: self._entry(call).pairs.add((band.upper(), mode.upper()))
+        for e in self.calls.values():
+            e.bands = {b for b, _ in e.pairs}
+            e.modes = {m for _, m in e.pairs}
+        self.sorted_calls = sorted(self.calls)
+
+    def add(self, call, band, mode):
+        call = call.strip().upper()
+        if not call: return
+        new = call not in self.calls
+        e = self._entry(call)
+        band, mode = band.upper(), mode.upper()
+        e.pairs.add((band, mode)); e.bands.add(band); e.modes.add(mode)
+        if new: insort(self.sorted_calls, call)
+
+    def _entry(self, call):
+        e = self.calls.get(call)
+        if e is None:
+            e = self.calls[call] = WorkedEntry()
+        return e
+
+    def get(self, call):
+        return self.calls.get(call.strip().upper())
+
+    def is_dupe(self, call, band, mode):
+        e = self.get(call)
+        return e is not None and (band.upper(), mode.upper()) in e.pairs
+
+    def prefix(self, prefix, limit=8):
+        prefix = prefix.strip().upper()
+        if not prefix: return []
+        out = []
+        calls = self.sorted_calls
+        i = bisect_left(calls, prefix)
+        while i < len(calls) and len(out) < limit and calls[i].startswith(prefix):
+            out.append(calls[i]); i += 1
+        return out